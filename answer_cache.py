@@ -0,0 +1,48 @@
+import re
+import hashlib
+import threading
+import unicodedata
+from config import *
+from cache import TTLCache, MISSING
+
+class AnswerCache:
+    """같은 (모델, 프롬프트, 질문)에 대한 첫 질문 답변 캐시. 대화 맥락이 없는 첫 질문만 대상이며,
+    적중하면 Dify 호출 없이 저장된 답변을 보여주고 절약한 토큰 수를 집계합니다."""
+
+    def __init__(self, maxsize=answer_cache_size, ttl=answer_cache_ttl):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.lock = threading.Lock()
+        self.stored = 0
+        self.tokens_saved = 0
+
+    @staticmethod
+    def normalize(text):
+        """대소문자, 전각/반각, 공백 차이를 무시"""
+        text = unicodedata.normalize("NFKC", text or "").casefold()
+        return re.sub(r"\s+", " ", text).strip()
+
+    def key(self, model, prompt, query):
+        raw = "\x1f".join(self.normalize(part) for part in (model, prompt, query))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """저장된 답변 (없으면 None)"""
+        entry = self.cache.get(key)
+        if entry is MISSING:
+            return None
+        answer, tokens = entry
+        with self.lock:
+            self.tokens_saved += tokens
+        return answer
+
+    def set(self, key, answer, tokens=0):
+        if answer:
+            self.cache.set(key, (answer, tokens or 0))
+            with self.lock:
+                self.stored += 1
+
+    def stats(self):
+        stats = self.cache.stats()
+        with self.lock:
+            stats.update(stored=self.stored, tokens_saved=self.tokens_saved)
+        return stats
@@ -0,0 +1,64 @@
+"""
+실험적 ASGI 진입점 (AsyncApp, uvicorn 워커 프로세스 여러 개). 운영 환경에서는 wsgi.py(gunicorn)를 사용하세요.
+
+    uvicorn asgi:create_app --factory --workers 4 --port 3000
+
+/slack/events는 Bolt의 AsyncSlackRequestHandler가 처리하고, /healthz, /readyz, /metrics를 함께 제공합니다.
+종료(lifespan shutdown) 시 진행 중인 답변을 기다린 뒤 종료합니다.
+스레드별 순서 보장, 중단 반응 등 동기 서버에만 있는 기능은 async_slack_dify_bot.AsyncSlackBotServer를 참고하세요.
+"""
+import json
+import asyncio
+from slack_bolt.adapter.asgi.async_handler import AsyncSlackRequestHandler
+
+from config import *
+from utils import debug_print
+from metrics import CONTENT_TYPE_LATEST, render_metrics
+
+class AsgiApp:
+    def __init__(self):
+        from async_slack_dify_bot import AsyncSlackBotServer
+        self.server = AsyncSlackBotServer()
+        self.handler = AsyncSlackRequestHandler(self.server.bot.bolt_app, path="/slack/events")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http" and scope["method"] == "GET" and scope["path"] in ("/healthz", "/readyz", "/metrics"):
+            await self._handle_probe(scope["path"], send)
+        else:
+            await self.handler(scope, receive, send)
+
+    async def _handle_probe(self, path, send):
+        if path == "/metrics":
+            await self._send(send, 200, render_metrics(), CONTENT_TYPE_LATEST)
+            return
+        if path == "/healthz":
+            ready, body = True, {"status": "ok"}
+        else:
+            ready, checks = await asyncio.to_thread(self.server.check_readiness)
+            body = {"status": "ok" if ready else "unavailable", **checks}
+        await self._send(send, 200 if ready else 503, json.dumps(body).encode(), "application/json")
+
+    @staticmethod
+    async def _send(send, status, body, content_type):
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                try:
+                    await self.server.bot.drain(shutdown_drain_timeout)
+                except Exception as e:
+                    debug_print(f"Error while draining: {e}")
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+def create_app():
+    """워커 프로세스마다 AsyncSlackBotServer를 생성 (uvicorn --factory)"""
+    return AsgiApp()
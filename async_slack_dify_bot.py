@@ -0,0 +1,433 @@
+import re
+import json
+import time
+import asyncio
+from slack_bolt.async_app import AsyncApp
+from slack_sdk.web.async_client import AsyncWebClient
+
+from config import *
+from utils import debug_print, logger, run_checks
+from dify_process import AsyncDifyClient, DifyClient
+from slack_process import AsyncSlackProcess
+from slack_updater import AsyncSlackUpdateScheduler
+from slack_renderer import AsyncStreamRenderer
+from db_handler import ConversationDB, UserDB, EventDB
+from slack_modals import ModalBuilder
+from sse_parser import AnswerBuffer
+from event_router import classify_event, MESSAGE_EVENT_TYPES, THREAD_REPLY
+from metrics import DIFY_STREAMS_IN_FLIGHT, observe_stream
+from slack_dify_bot import default_llm_model, default_prompt, available_models, stream_deadline
+
+class AsyncSlackBotServer:
+    """AsyncApp(aiohttp) 기반 서버 (실험적). 하나의 이벤트 루프에서 다수의 LLM 스트림을 처리합니다.
+    답변 표시(StreamRenderer, 업데이트 스케줄러)와 스트림 제한 시간은 동기 서버와 같지만,
+    스레드별 순서 보장(ThreadScheduler), 중단 반응, 답변 캐시, 작업 큐는 아직 동기 서버(wsgi.py)에만 있습니다."""
+    def __init__(self):
+        self.conv_db = ConversationDB(
+            host=redis_host,
+            port=redis_port,
+            db=redis_conv_db,
+            pw=redis_password
+        )
+        self.user_db = UserDB(
+            host=redis_host,
+            port=redis_port,
+            db=redis_user_db,
+            pw=redis_password
+        )
+        self.event_db = EventDB(
+            host=redis_host,
+            port=redis_port,
+            db=redis_conv_db,
+            pw=redis_password
+        )
+        self.bot = AsyncSlackBot(self.user_db, self.conv_db, self.event_db)
+        debug_print(f"AsyncSlackBot created")
+
+    def check_readiness(self):
+        """Redis와 Dify 연결 확인 (동기 호출이므로 이벤트 루프 밖에서 실행)"""
+        # 점검을 동시에 실행해 /readyz 응답을 health_check_timeout 안으로 제한
+        checks = run_checks({
+            "redis_conv": self.conv_db.ping,
+            "redis_user": self.user_db.ping,
+            "dify": DifyClient().ping,
+        })
+        checks = {
+            "redis": checks["redis_conv"] and checks["redis_user"],
+            # 로컬 저장소가 있으면 Redis 장애 중에도 답변 가능
+            "redis_fallback": self.conv_db.fallback is not None and self.user_db.fallback is not None,
+            "dify": checks["dify"],
+            "draining": self.bot.draining,
+        }
+        redis_ok = checks["redis"] or checks["redis_fallback"]
+        return redis_ok and checks["dify"] and not checks["draining"], checks
+
+    def run(self, port=web_port):
+        """개발용 서버. 운영 환경에서는 wsgi.py(gunicorn)를 실행 (asgi.py는 실험적)"""
+        self.bot.bolt_app.start(port=int(port), path="/slack/events")
+
+def create_async_bolt_app():
+    """AsyncApp 생성 (프로세스당 한 번만 호출)"""
+    if slack_base_url:
+        return AsyncApp(
+            client=AsyncWebClient(token=slack_OAuth_token, base_url=slack_base_url),
+            signing_secret=slack_signing_secret
+        )
+    return AsyncApp(
+        token=slack_OAuth_token,
+        signing_secret=slack_signing_secret
+    )
+
+class AsyncSlackBot:
+    """SlackBot의 asyncio 버전. Redis 호출은 동기 클라이언트이므로 스레드로 위임합니다."""
+
+    def __init__(self, user_db, conv_db, event_db=None):
+        self.bolt_app = create_async_bolt_app()
+
+        self.user_db = user_db
+        self.conv_db = conv_db
+        self.event_db = event_db
+        self.dify_client = AsyncDifyClient()
+        self.slack = AsyncSlackProcess(self.bolt_app)
+        # chat.update와 이어쓰기 메시지는 동기 서버와 같은 방식(합치기, 토큰 버킷, Retry-After)의 asyncio 스케줄러로 전송
+        self.updater = AsyncSlackUpdateScheduler(self.slack)
+        self.modal_builder = ModalBuilder()
+
+        self.typing_dots = ["", ".", "..", "..."]
+        self.available_models = available_models
+
+        # 동시 스트림 수 제한 및 실행 중 태스크 참조 보관
+        self.stream_semaphore = asyncio.Semaphore(async_max_streams)
+        self.tasks = set()
+        self.draining = False
+
+        self.bolt_app.event(MESSAGE_EVENT_TYPES)(self.handle_event)
+        self.bolt_app.command("/bot-settings")(self.handle_settings_command)
+        self.bolt_app.action("model_select")(self.handle_model_select)
+        self.bolt_app.action("prompt_edit")(self.handle_prompt_edit)
+        self.bolt_app.action("prompt_input")(self.handle_prompt_input)
+        self.bolt_app.action("open_prompt_modal")(self.handle_open_prompt_modal)
+        self.bolt_app.view("prompt_edit_modal")(self.handle_prompt_submit)
+        self.bolt_app.view("main_settings_modal")(self.handle_settings_submit)
+
+    async def handle_event(self, event, say, context):
+        """멘션, DM, 봇이 답변 중인 스레드의 답글을 분류해 한 번만 처리"""
+        route = classify_event(event, context.bot_user_id)
+        if route is None:
+            return
+        if route == THREAD_REPLY:
+            if not slack_thread_replies:
+                return
+            if not await asyncio.to_thread(self.conv_db.get_conversation, event['channel'], event['thread_ts']):
+                return
+        await self._process_message(event, say)
+
+    async def _process_message(self, event, say):
+        """메시지 처리 로직. 중복 확인과 임시 메시지 전송만 하고 나머지는 별도 태스크에서 처리"""
+        if event.get('bot_id'):
+            return
+
+        channel_id = event['channel']
+        thread_ts = event.get('thread_ts', event['ts'])
+        try:
+            # 재전송이나 같은 메시지의 app_mention/message 이벤트는 한 번만 처리
+            event_key = event.get('client_msg_id') or f"{channel_id}:{event['ts']}"
+            if self.event_db is not None and not await asyncio.to_thread(self.event_db.mark_seen, event_key):
+                return
+
+            response = await say(
+                text="잠시만 기다려주세요...🤔",
+                thread_ts=thread_ts
+            )
+            tmp_ts = response['ts']
+
+            # 응답 스트림은 별도 태스크로 실행 (리스너는 즉시 반환)
+            task = asyncio.create_task(self._handle_conversation(event, tmp_ts, channel_id, thread_ts))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+        except Exception as e:
+            debug_print(f"Error in async message processing: {e}")
+            await self.slack.post_message(channel_id, "처리 중 오류가 발생했습니다.", thread_ts)
+
+    async def _handle_conversation(self, event, tmp_ts, channel_id, thread_ts):
+        renderer = AsyncStreamRenderer(self.updater, channel_id, thread_ts, tmp_ts)
+        async with self.stream_semaphore:
+            claimed = False
+            try:
+                user_query = re.sub(r'^<@[^>]+>\s*', '', event['text'])
+                user_id = event.get('user')
+
+                # conversation_id가 없으면 첫 질문 스트림에서 받아 저장 (지연 바인딩)
+                user_model, user_prompt, conversation_id = await asyncio.to_thread(
+                    self.user_db.load_user_context, user_id, channel_id, str(thread_ts), self.conv_db
+                )
+
+                if not user_model or not user_prompt:
+                    await asyncio.to_thread(self.user_db.set_defaults, user_id, default_llm_model, default_prompt)
+                    user_model = user_model or default_llm_model
+                    user_prompt = user_prompt or default_prompt
+
+                user_input = f"Model:{user_model} Prompt:{user_prompt} Query:{user_query}"
+
+                if not conversation_id:
+                    # 같은 새 스레드에 동시에 도착한 메시지 중 하나만 새 conversation을 생성
+                    claimed = await asyncio.to_thread(self.conv_db.claim_conversation, channel_id, str(thread_ts))
+                    if not claimed:
+                        conversation_id = await self._wait_for_conversation(channel_id, str(thread_ts))
+                await self._process_dify_response(user_input, user_id or '', channel_id, tmp_ts, conversation_id, thread_ts, renderer)
+            except Exception as e:
+                debug_print(f"Error in async conversation handling: {e}")
+                # 이미 고정된 앞부분은 두고 마지막 메시지에 오류 표시
+                await renderer.fail("처리 중 오류가 발생했습니다.")
+            finally:
+                if claimed:
+                    await asyncio.to_thread(self.conv_db.release_conversation_claim, channel_id, str(thread_ts))
+
+    async def _wait_for_conversation(self, channel_id, thread_ts, timeout=30, interval=0.2):
+        """다른 요청이 생성 중인 conversation ID 대기 (이벤트 루프를 막지 않도록 폴링)"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            conversation_id = await asyncio.to_thread(self.conv_db.get_conversation, channel_id, thread_ts)
+            if conversation_id:
+                return conversation_id
+            await asyncio.sleep(interval)
+        return ""
+
+    async def _show_waiting_animation(self, channel_id, tmp_ts):
+        """첫 토큰이 도착해 태스크가 취소될 때까지 대기 애니메이션 표시"""
+        idx = 0
+        while True:
+            current_text = f"잠시만 기다려주세요{self.typing_dots[idx]}..🤔⏳"
+            # 스케줄러가 메시지별 간격과 속도 제한에 맞춰 최신 텍스트만 전송
+            self.updater.submit(channel_id, tmp_ts, current_text)
+            idx = (idx + 1) % len(self.typing_dots)
+            await asyncio.sleep(0.5)
+
+    async def _stop_waiting_animation(self, waiting_task):
+        if not waiting_task.done():
+            waiting_task.cancel()
+            try:
+                await waiting_task
+            except asyncio.CancelledError:
+                pass
+
+    async def _process_dify_response(self, user_query, user_id, channel_id, tmp_ts, conversation_id, thread_ts, renderer):
+        answer = AnswerBuffer()
+        last_update_time = 0        # 첫 토큰은 업데이트 간격을 기다리지 않고 바로 표시
+        update_interval = slack_update_interval
+        is_complete = False
+        error = None
+        cancelled = None
+        task_id = None
+
+        # Dify 스트림과 대기 애니메이션을 동시에 진행
+        started_at = time.monotonic()
+        first_token_at = None
+        last_event_at = started_at
+        waiting_task = asyncio.create_task(self._show_waiting_animation(channel_id, tmp_ts))
+        stream = self.dify_client.chat_messages_stream(user_query, user_id, conversation_id)
+        DIFY_STREAMS_IN_FLIGHT.inc()
+        try:
+            while True:
+                # 동기 서버의 감시 스레드와 같은 제한 시간(전체, 첫 토큰, 유휴)을 다음 이벤트 대기에 적용
+                deadline, reason = stream_deadline(started_at, first_token_at, last_event_at)
+                try:
+                    event = await asyncio.wait_for(anext(stream), max(deadline - time.monotonic(), 0))
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    # 대기 중이던 읽기가 취소되면서 응답이 닫힘 (커넥션 반환)
+                    cancelled = reason
+                    break
+                last_event_at = time.monotonic()
+                if not conversation_id and event.conversation_id:
+                    conversation_id = event.conversation_id
+                    await asyncio.to_thread(self.conv_db.save_conversation, channel_id, str(thread_ts), conversation_id)
+                    debug_print(f"Bound new conversation: {conversation_id} for thread: {thread_ts}")
+                if event.task_id:
+                    task_id = event.task_id
+                if event.is_answer():
+                    if first_token_at is None:
+                        # 첫 토큰 도착: 대기 애니메이션 중지
+                        first_token_at = time.monotonic()
+                        await self._stop_waiting_animation(waiting_task)
+                    answer.append(event.answer)
+                    renderer.append(event.answer)
+                    current_time = time.time()
+                    if current_time - last_update_time >= update_interval:
+                        await renderer.update()
+                        last_update_time = current_time
+                elif event.type == 'message_replace':
+                    answer.replace(event.answer)
+                    await renderer.replace(event.answer)
+                    await renderer.update()
+                elif event.type == 'message_end':
+                    is_complete = True
+                elif event.type == 'error':
+                    error = event.data.get('message') or event.data.get('code') or 'unknown error'
+        finally:
+            DIFY_STREAMS_IN_FLIGHT.dec()
+            await self._stop_waiting_animation(waiting_task)
+            await stream.aclose()
+
+        if cancelled:
+            debug_print(f"Cancelled async stream {channel_id}/{thread_ts} (task: {task_id}): {cancelled}")
+            if task_id:
+                # Dify가 생성을 계속하지 않도록 중지 요청 (답변 표시는 기다리지 않음)
+                stop_task = asyncio.create_task(self.dify_client.stop_message(task_id, user_id))
+                self.tasks.add(stop_task)
+                stop_task.add_done_callback(self.tasks.discard)
+
+        accumulated_response = answer.text()
+        # 답변 본문은 renderer가 이미 나눠 표시 중이므로 마지막 메시지에 상태/안내 문구만 덧붙임
+        if cancelled:
+            outcome = "cancelled"
+            suffix = f"\n⏹️ {cancelled}"
+        elif error:
+            outcome = "error"
+            suffix = f"\n⚠️ 응답 생성 중 오류가 발생했습니다: {error}"
+        elif is_complete:
+            outcome = "complete"
+            suffix = ""
+        else:
+            outcome = "incomplete"
+            suffix = " ⏳ ..."
+        logger.log_llm_response({
+            "event": "message_end" if is_complete else "",
+            "task_id": task_id,
+            "conversation_id": conversation_id,
+            "answer": accumulated_response,
+        })
+        suffix += "\n더 필요하신 부분이 있으면 말씀해주세요."
+        await renderer.finish(suffix)
+        logger.log_llm_timing(
+            channel_id,
+            tmp_ts,
+            time_to_first_token=first_token_at - started_at if first_token_at else None,
+            time_to_complete=time.monotonic() - started_at,
+        )
+        observe_stream(started_at, first_token_at, outcome)
+
+    async def drain(self, timeout=shutdown_drain_timeout):
+        """종료 전 진행 중인 답변 태스크를 기다리고, timeout이 지나면 취소"""
+        self.draining = True
+        deadline = time.monotonic() + timeout
+        pending = set()
+        # 답변 태스크가 끝나며 추가한 태스크(Dify 중지 요청)도 기다림
+        while self.tasks and not pending:
+            _, pending = await asyncio.wait(set(self.tasks), timeout=max(deadline - time.monotonic(), 0))
+        for task in pending:
+            task.cancel()
+        debug_print(f"Drained async streams, cancelled: {len(pending)}")
+        await self.dify_client.close()
+
+    async def handle_settings_command(self, ack, body, client):
+        """메인 설정 모달"""
+        await ack()
+        try:
+            user_id = body['user_id']
+            current_model, current_prompt = await asyncio.to_thread(self.user_db.get_user_settings, user_id)
+            current_model = current_model or default_llm_model
+            current_prompt = current_prompt or default_prompt
+
+            metadata = {
+                "current_model": current_model,
+                "current_prompt": current_prompt
+            }
+            blocks = self.modal_builder.create_main_modal_blocks(current_model, current_prompt, self.available_models)
+            view_config = self.modal_builder.get_modal_config("main_settings", blocks, metadata)
+
+            await client.views_open(trigger_id=body["trigger_id"], view=view_config)
+        except Exception as e:
+            debug_print(f"Error in async handle_settings_command: {e}")
+
+    async def handle_model_select(self, ack, body, client):
+        """모델 선택 처리"""
+        await ack()
+        try:
+            metadata = json.loads(body['view']['private_metadata'])
+            metadata['current_model'] = body['actions'][0]['selected_option']['value']
+
+            blocks = self.modal_builder.create_main_modal_blocks(
+                metadata['current_model'], metadata['current_prompt'], self.available_models
+            )
+            view_config = self.modal_builder.get_modal_config("main_settings", blocks, metadata)
+
+            await client.views_update(view_id=body['view']['id'], view=view_config)
+        except Exception as e:
+            debug_print(f"Error in async handle_model_select: {e}")
+
+    async def handle_prompt_edit(self, ack, body, client):
+        """프롬프트 수정 버튼 처리"""
+        await ack()
+        try:
+            user_id = body['user']['id']
+            blocks = body['view']['blocks']
+            prompt_block = next((block for block in blocks if block.get('block_id') == 'prompt_input'), None)
+            if prompt_block:
+                await asyncio.to_thread(self.user_db.set_user_prompt, user_id, prompt_block['element']['value'])
+                await client.views_update(
+                    view_id=body['view']['id'],
+                    view={
+                        "type": "modal",
+                        "callback_id": "settings_modal",
+                        "title": {"type": "plain_text", "text": "Bot 설정"},
+                        "blocks": blocks,
+                        "submit": {"type": "plain_text", "text": "저장"}
+                    }
+                )
+        except Exception as e:
+            debug_print(f"Error in async handle_prompt_edit: {e}")
+
+    async def handle_prompt_input(self, ack, body, client):
+        """프롬프트 입력 필드 변경 처리"""
+        await ack()
+        try:
+            await asyncio.to_thread(self.user_db.set_user_prompt, body['user']['id'], body['actions'][0]['value'])
+        except Exception as e:
+            debug_print(f"Error in async handle_prompt_input: {e}")
+
+    async def handle_open_prompt_modal(self, ack, body, client):
+        """프롬프트 수정 모달 열기"""
+        await ack()
+        try:
+            metadata = json.loads(body['view']['private_metadata'])
+            blocks = self.modal_builder.create_prompt_modal_blocks(metadata['current_prompt'])
+            view_config = self.modal_builder.get_modal_config("prompt_edit", blocks, metadata)
+
+            await client.views_push(trigger_id=body['trigger_id'], view=view_config)
+        except Exception as e:
+            debug_print(f"Error in async handle_open_prompt_modal: {e}")
+
+    async def handle_prompt_submit(self, ack, body, client):
+        """프롬프트 수정 완료 처리"""
+        await ack()
+        try:
+            metadata = json.loads(body['view']['private_metadata'])
+            metadata['current_prompt'] = body['view']['state']['values']['prompt_input_block']['prompt_input']['value']
+
+            blocks = self.modal_builder.create_main_modal_blocks(
+                metadata['current_model'], metadata['current_prompt'], self.available_models
+            )
+            view_config = self.modal_builder.get_modal_config("main_settings", blocks, metadata)
+
+            await client.views_update(view_id=body['view']['previous_view_id'], view=view_config)
+        except Exception as e:
+            debug_print(f"Error in async handle_prompt_submit: {e}")
+
+    async def handle_settings_submit(self, ack, body, client):
+        """최종 설정 저장"""
+        await ack()
+        try:
+            user_id = body['user']['id']
+            metadata = json.loads(body['view']['private_metadata'])
+
+            await asyncio.to_thread(self.user_db.set_user_model, user_id, metadata['current_model'])
+            await asyncio.to_thread(self.user_db.set_user_prompt, user_id, metadata['current_prompt'])
+        except Exception as e:
+            debug_print(f"Error in async handle_settings_submit: {e}")
+
+if __name__ == '__main__':
+    server = AsyncSlackBotServer()
+    server.run()
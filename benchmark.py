@@ -0,0 +1,373 @@
+"""
+로컬 성능 측정 스크립트
+
+    python benchmark.py                # 전체 실행
+    python benchmark.py dispatch       # 이름에 'dispatch'가 포함된 벤치마크만 실행
+
+외부 Slack/Dify/Redis 없이 실행되도록 Slack Web API는 로컬 스텁 서버(slack_base_url)로 대체합니다.
+"""
+import os
+import sys
+import json
+import time
+import hmac
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _StubSlackAPI(BaseHTTPRequestHandler):
+    """auth.test 등 모든 Web API 호출에 ok 응답"""
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        body = json.dumps({"ok": True, "user_id": "U000", "team_id": "T000", "bot_id": "B000", "ts": "1.0"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+_stub_server = ThreadingHTTPServer(("127.0.0.1", 0), _StubSlackAPI)
+threading.Thread(target=_stub_server.serve_forever, daemon=True).start()
+
+os.environ['slack_base_url'] = f"http://127.0.0.1:{_stub_server.server_port}/api/"
+os.environ.setdefault('slack_OAuth_token', 'xoxb-benchmark')
+os.environ.setdefault('slack_signing_secret', 'benchmark-secret')
+
+import slack_dify_bot
+
+
+def _signed_headers(body, secret=os.environ['slack_signing_secret']):
+    timestamp = str(int(time.time()))
+    basestring = f"v0:{timestamp}:{body}".encode('utf-8')
+    signature = "v0=" + hmac.new(secret.encode('utf-8'), basestring, hashlib.sha256).hexdigest()
+    return {
+        "X-Slack-Request-Timestamp": timestamp,
+        "X-Slack-Signature": signature,
+        "Content-Type": "application/json",
+    }
+
+def _sample_event_body():
+    # 리스너가 없는 이벤트 타입으로 Slack/Dify 호출 없이 디스패치 비용만 측정
+    return json.dumps({
+        "type": "event_callback",
+        "team_id": "T000",
+        "api_app_id": "A000",
+        "event": {"type": "reaction_removed", "user": "U000", "event_ts": "1.0"},
+        "event_id": "Ev000",
+        "event_time": 1,
+    })
+
+def _report(name, count, elapsed):
+    print(f"{name:<40} {count / elapsed:>12.1f} ops/s  ({elapsed * 1000 / count:.3f} ms/op)")
+
+def bench_dispatch_per_request_bot(count=200):
+    """기존 방식: 이벤트마다 SlackBot(App + 리스너) 생성"""
+    server = slack_dify_bot.SlackBotServer()
+    body = _sample_event_body()
+    with server.app.test_request_context("/slack/events", method="POST", data=body, headers=_signed_headers(body)):
+        from flask import request
+        start = time.perf_counter()
+        for _ in range(count):
+            bot = slack_dify_bot.SlackBot(server.user_db, server.conv_db)
+            bot.handle_request(request)
+        _report("dispatch (bot per request)", count, time.perf_counter() - start)
+
+def bench_dispatch_shared_bot(count=2000):
+    """공유 레지스트리: 프로세스당 SlackBot 한 번 생성"""
+    server = slack_dify_bot.SlackBotServer()
+    client = server.app.test_client()
+    body = _sample_event_body()
+    start = time.perf_counter()
+    for _ in range(count):
+        client.post("/slack/events", data=body, headers=_signed_headers(body))
+    _report("dispatch (shared bot)", count, time.perf_counter() - start)
+
+def _mention_event_body(ts):
+    return json.dumps({
+        "type": "event_callback",
+        "team_id": "T000",
+        "api_app_id": "A000",
+        "event": {"type": "app_mention", "user": "U001", "text": "<@U000> hi", "channel": "C000",
+                  "ts": ts, "client_msg_id": f"msg-{ts}", "event_ts": ts},
+        "event_id": f"Ev{ts}",
+        "event_time": 1,
+    })
+
+def bench_ack_latency(count=300):
+    """Slack 응답(ack) 지연 백분위수: 새 이벤트 vs 재전송(중복 제거)"""
+    from db_handler import UserDB, ConversationDB, EventDB
+    server = slack_dify_bot.SlackBotServer()
+    pool = _redis_pool(4)
+    server.bot.user_db = _redis_db(UserDB, pool)
+    server.bot.conv_db = _redis_db(ConversationDB, pool)
+    server.bot.event_db = _redis_db(EventDB, pool)
+    # ack 이후의 Dify 호출은 측정 대상이 아니므로 생략
+    server.bot._handle_conversation = lambda *args: None
+    client = server.app.test_client()
+
+    for name, bodies in (
+        ("new events", [_mention_event_body(f"{i}.0") for i in range(count)]),
+        ("retries", [_mention_event_body("0.0")] * count),
+    ):
+        server.ack_latency = slack_dify_bot.LatencyTracker()
+        start = time.perf_counter()
+        for body in bodies:
+            headers = _signed_headers(body)
+            if name == "retries":
+                headers.update({"X-Slack-Retry-Num": "1", "X-Slack-Retry-Reason": "http_timeout"})
+            client.post("/slack/events", data=body, headers=headers)
+        _report(f"ack ({name})", count, time.perf_counter() - start)
+        print("    " + server._format_latency())
+
+def _recorded_events():
+    """Slack이 실제로 보내는 형식의 이벤트 녹화본과 기대 처리 횟수 (메시지 ts별)"""
+    def envelope(event_id, event, retry=False):
+        return json.dumps({"type": "event_callback", "team_id": "T000", "api_app_id": "A000",
+                           "event": event, "event_id": event_id, "event_time": 1}), retry
+    mention = {"user": "U001", "text": "<@U000> 안녕", "channel": "C001", "ts": "10.0",
+               "client_msg_id": "m-10", "channel_type": "channel"}
+    dm = {"type": "message", "user": "U001", "text": "안녕", "channel": "D001", "ts": "20.0",
+          "client_msg_id": "m-20", "channel_type": "im"}
+    return [
+        envelope("Ev10a", dict(mention, type="app_mention")),
+        envelope("Ev10b", dict(mention, type="message")),
+        envelope("Ev20", dm),
+        envelope("Ev20", dm, retry=True),
+        envelope("Ev21", {"type": "message", "subtype": "message_changed", "channel": "D001", "ts": "21.0",
+                          "channel_type": "im", "message": dict(dm, text="수정")}),
+        envelope("Ev22", {"type": "message", "bot_id": "B000", "user": "U000", "text": "답변", "channel": "D001",
+                          "ts": "22.0", "channel_type": "im"}),
+        envelope("Ev30", {"type": "message", "user": "U002", "text": "잡담", "channel": "C001", "ts": "30.0",
+                          "client_msg_id": "m-30", "channel_type": "channel"}),
+        envelope("Ev31", {"type": "message", "user": "U002", "text": "스레드 답글", "channel": "C001", "ts": "31.0",
+                          "thread_ts": "10.0", "client_msg_id": "m-31", "channel_type": "channel"}),
+    ], {"10.0": 1, "20.0": 1, "21.0": 0, "22.0": 0, "30.0": 0, "31.0": 1 if slack_dify_bot.slack_thread_replies else 0}
+
+def bench_event_routing():
+    """녹화된 이벤트를 재생해 메시지별 처리 횟수 확인 (멘션/DM/재전송이 각각 한 번만 처리되는지)"""
+    from collections import Counter
+    from db_handler import UserDB, ConversationDB, EventDB
+    server = slack_dify_bot.SlackBotServer()
+    pool = _redis_pool(5)
+    server.bot.user_db = _redis_db(UserDB, pool)
+    server.bot.conv_db = _redis_db(ConversationDB, pool)
+    server.bot.event_db = _redis_db(EventDB, pool)
+    server.bot.conv_db.save_conversation("C001", "10.0", "conv")
+
+    processed = Counter()
+    server.bot._handle_conversation = lambda event, *args: processed.update([event['ts']])
+    client = server.app.test_client()
+
+    events, expected = _recorded_events()
+    for body, retry in events:
+        headers = _signed_headers(body)
+        if retry:
+            headers.update({"X-Slack-Retry-Num": "1", "X-Slack-Retry-Reason": "http_timeout"})
+        client.post("/slack/events", data=body, headers=headers)
+    time.sleep(1)  # 리스너는 ack 이후 별도 스레드에서 실행
+
+    for ts, count in expected.items():
+        status = "ok" if processed[ts] == count else "MISMATCH"
+        print(f"routing ts={ts:<6} processed={processed[ts]} expected={count}  {status}")
+
+def bench_semantic_cache(entries=100000, lookups=200):
+    """의미 유사 캐시: 10만 항목에서 조회 지연 (임베딩 포함/제외)"""
+    import numpy as np
+    from semantic_cache import SemanticCache
+    cache = SemanticCache(maxsize=entries, path="")
+    rng = np.random.default_rng(0)
+
+    # 해싱 임베딩으로 10만 개를 만드는 시간은 측정 대상이 아니므로 정규화된 임의 벡터로 채움
+    vectors = rng.standard_normal((entries, cache.dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    cache.vectors[:] = vectors
+    cache.scopes[:] = 1
+    cache.created_at[:] = cache.last_used[:] = time.time()
+    cache.entries = [(f"질문 {i}", f"답변 {i}", 10) for i in range(entries)]
+    cache.size = entries
+
+    queries = [f"사내 위키에서 {i}번 문서 위치 알려줘" for i in range(lookups)]
+    start = time.perf_counter()
+    for query in queries:
+        cache.embed(query)
+    embed_elapsed = time.perf_counter() - start
+    _report("semantic cache embed", lookups, embed_elapsed)
+
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        cache.lookup(1, query)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    _report(f"semantic cache lookup ({entries} entries)", lookups, sum(latencies))
+    print(f"    p50={latencies[len(latencies) // 2] * 1000:.2f}ms p99={latencies[int(len(latencies) * 0.99)] * 1000:.2f}ms"
+          f"  index={cache.vectors.nbytes / 2**20:.0f}MiB")
+
+def bench_logging(count=20000):
+    """로그 레코드당 비용: 포맷터별(가운데 정렬 text vs JSON lines), 호출 스레드 기준 동기 vs 큐 기록"""
+    import logging
+    import tempfile
+    import queue
+    from logging.handlers import QueueListener
+    from logger import CenteredLevelFormatter, JsonLinesFormatter, _LazyJson, _DeferredQueueHandler
+
+    data = {"event": "message_end", "task_id": "t", "conversation_id": "c", "answer": "좋은 아침입니다! " * 40}
+    record = logging.LogRecord("bench", logging.INFO, "slack_dify_bot.py", 1, "%s: %s", ("LLM BOT", _LazyJson(data)), None,
+                               func="_process_dify_response")
+    record.category, record.data = "llm_response", data
+    for name, formatter in (
+        ("text (centered)", CenteredLevelFormatter('%(asctime)s | %(levelname)s | %(filename)s :%(lineno)d | %(funcName)s |  %(message)s')),
+        ("json lines", JsonLinesFormatter()),
+    ):
+        start = time.perf_counter()
+        for _ in range(count):
+            formatter.format(record)
+        _report(f"log format {name}", count, time.perf_counter() - start)
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        for mode in ("sync", "async"):
+            bench_logger = logging.getLogger(f"bench-{mode}")
+            bench_logger.propagate = False
+            bench_logger.setLevel(logging.INFO)
+            handler = logging.FileHandler(os.path.join(log_dir, f"{mode}.log"), encoding="utf-8")
+            handler.setFormatter(JsonLinesFormatter())
+            listener = None
+            if mode == "async":
+                log_queue = queue.SimpleQueue()
+                listener = QueueListener(log_queue, handler)
+                listener.start()
+                bench_logger.addHandler(_DeferredQueueHandler(log_queue))
+            else:
+                bench_logger.addHandler(handler)
+            start = time.perf_counter()
+            for _ in range(count):
+                bench_logger.info("%s: %s", "LLM BOT", _LazyJson(data), extra={"category": "llm_response", "data": data})
+            _report(f"log call ({mode}, caller thread)", count, time.perf_counter() - start)
+            if listener:
+                listener.stop()
+            handler.close()
+
+def _recorded_stream(events=40000, chunk_size=4096):
+    """Dify 스트림 녹화본과 같은 형식의 수 MB SSE 바이트를 네트워크 청크 크기로 분할"""
+    lines = [b"event: ping\n\n"]
+    for i in range(events):
+        data = {"event": "message", "task_id": "t", "message_id": "m", "conversation_id": "c",
+                "answer": f"토큰{i} ", "created_at": 1737510408}
+        lines.append(b"data: " + json.dumps(data, ensure_ascii=False).encode("utf-8") + b"\n\n")
+    lines.append(b'data: {"event": "message_end", "conversation_id": "c"}\n\n')
+    raw = b"".join(lines)
+    return [raw[i:i + chunk_size] for i in range(0, len(raw), chunk_size)], len(raw)
+
+def _legacy_iter_lines(chunks):
+    # requests.Response.iter_lines와 동일한 분할 방식
+    pending = None
+    for chunk in chunks:
+        if pending is not None:
+            chunk = pending + chunk
+        lines = chunk.splitlines()
+        pending = lines.pop() if lines and lines[-1] and chunk and lines[-1][-1] == chunk[-1] else None
+        yield from lines
+    if pending is not None:
+        yield pending
+
+def bench_sse_legacy(repeat=3):
+    """기존 방식: 줄 단위 decode + json.loads + 문자열 누적"""
+    chunks, size = _recorded_stream()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        accumulated = ""
+        for line in _legacy_iter_lines(chunks):
+            if not line:
+                continue
+            text = line.decode('utf-8')
+            if text.startswith('data: '):
+                data = json.loads(text[6:])
+                if data.get('event') == 'message':
+                    accumulated += data.get('answer', '')
+    elapsed = time.perf_counter() - start
+    _report(f"sse legacy ({size / 1e6:.1f} MB)", repeat, elapsed)
+    print(f"{'':<40} {size * repeat / elapsed / 1e6:>12.1f} MB/s")
+
+def bench_sse_parser(repeat=3):
+    """SSEParser + AnswerBuffer"""
+    from sse_parser import SSEParser, AnswerBuffer
+    chunks, size = _recorded_stream()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parser = SSEParser()
+        answer = AnswerBuffer()
+        for chunk in chunks:
+            for event in parser.feed(chunk):
+                if event.is_answer():
+                    answer.append(event.answer)
+        parser.close()
+        answer.text()
+    elapsed = time.perf_counter() - start
+    _report(f"sse parser ({size / 1e6:.1f} MB)", repeat, elapsed)
+    print(f"{'':<40} {size * repeat / elapsed / 1e6:>12.1f} MB/s")
+
+def _redis_pool(db):
+    """BENCH_REDIS_PORT의 redis-server, 없으면 왕복마다 BENCH_REDIS_RTT 만큼 지연되는 fakeredis 사용"""
+    import redis
+    port = os.getenv("BENCH_REDIS_PORT")
+    if port:
+        return redis.ConnectionPool(host="127.0.0.1", port=int(port), db=db, decode_responses=True)
+
+    import fakeredis
+    rtt = float(os.getenv("BENCH_REDIS_RTT", 0.0005))
+
+    class LatencyConnection(fakeredis.FakeRedisConnection):
+        def send_packed_command(self, *args, **kwargs):
+            time.sleep(rtt)
+            return super().send_packed_command(*args, **kwargs)
+
+    global _fake_redis_server
+    if "_fake_redis_server" not in globals():
+        _fake_redis_server = fakeredis.FakeServer()
+    return redis.ConnectionPool(connection_class=LatencyConnection, server=_fake_redis_server, db=db, decode_responses=True)
+
+def _redis_db(cls, pool):
+    """Redis 왕복만 측정하도록 로컬 캐시와 장애 대비 저장소 없이 생성"""
+    return cls(connection_pool=pool, local_cache=False, fallback=False)
+
+def bench_redis_user_context(count=1000):
+    """메시지당 사용자 설정/conversation 조회: 기존 순차 호출 vs load_user_context"""
+    from db_handler import UserDB, ConversationDB
+    user_pool = _redis_pool(1)
+    user_db = _redis_db(UserDB, user_pool)
+    conv_db = _redis_db(ConversationDB, _redis_pool(2))
+    shared_conv_db = _redis_db(ConversationDB, user_pool)
+    user_db.set_defaults("U1", "exaone3.5", "You are a helpful assistant.")
+    conv_db.save_conversation("C1", "1.1", "conv")
+    shared_conv_db.save_conversation("C1", "1.1", "conv")
+
+    start = time.perf_counter()
+    for _ in range(count):
+        # 기존: debug_print용 hget 포함 모델/프롬프트 4회 + conversation 1회
+        user_db.redis_client.hget("user:U1", "current_model")
+        user_db.redis_client.hget("user:U1", "current_model")
+        user_db.redis_client.hget("user:U1", "current_prompt")
+        user_db.redis_client.hget("user:U1", "current_prompt")
+        conv_db.get_conversation("C1", "1.1")
+    _report("redis context (sequential, 5 RTT)", count, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(count):
+        user_db.load_user_context("U1", "C1", "1.1", conv_db)
+    _report("redis context (separate DBs, 2 RTT)", count, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(count):
+        user_db.load_user_context("U1", "C1", "1.1", shared_conv_db)
+    _report("redis context (shared DB, 1 RTT)", count, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    selected = sys.argv[1:]
+    for name, func in list(globals().items()):
+        if name.startswith("bench_") and (not selected or any(s in name for s in selected)):
+            func()
@@ -0,0 +1,139 @@
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+import redis
+from utils import debug_print
+
+MISSING = object()
+CACHE_INVALIDATION_CHANNEL = "cache-invalidate"
+
+class TTLCache:
+    """크기 제한(LRU) + TTL 인메모리 캐시 (스레드 안전)"""
+    def __init__(self, maxsize=10000, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=MISSING):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self.data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self.data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = (value, time.monotonic() + self.ttl)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+class CacheInvalidator:
+    """Redis pub/sub으로 프로세스 간 캐시 무효화 전파. 메시지를 보낸 캐시 자신은 무시합니다."""
+    def __init__(self, connection_pool, channel=CACHE_INVALIDATION_CHANNEL):
+        self.redis_client = redis.Redis(connection_pool=connection_pool)
+        self.channel = channel
+        self.origin = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.caches = []
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def register(self, cache):
+        with self.lock:
+            self.caches.append(cache)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._listen, name="cache-invalidator", daemon=True)
+                self.thread.start()
+
+    def _origin_of(self, cache):
+        return f"{self.origin}:{id(cache)}"
+
+    def publish(self, key, cache):
+        try:
+            self.redis_client.publish(self.channel, f"{self._origin_of(cache)}|{key}")
+        except Exception as e:
+            debug_print(f"Cache invalidation publish error: {e}")
+
+    def _listen(self):
+        backoff = 1
+        while True:
+            try:
+                pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # (재)연결 동안 놓친 무효화가 있을 수 있으므로 비움
+                self._clear_all()
+                backoff = 1
+                # listen()은 소켓 읽기 타임아웃(redis_socket_timeout)에 걸리므로 짧게 나눠 대기
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is None:
+                        continue
+                    origin, _, key = str(message.get('data', '')).partition("|")
+                    for cache in list(self.caches):
+                        if self._origin_of(cache) != origin:
+                            cache.delete(key)
+            except Exception as e:
+                debug_print(f"Cache invalidation listener error: {e}")
+                self._clear_all()
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+    def _clear_all(self):
+        for cache in list(self.caches):
+            cache.clear()
+
+_invalidators = {}
+_invalidators_lock = threading.Lock()
+
+def reset_cache_invalidators():
+    """fork 이후 자식 프로세스에서 부모의 구독 스레드(자식에는 없음)를 참조하지 않도록 초기화"""
+    with _invalidators_lock:
+        _invalidators.clear()
+
+def get_cache_invalidator(connection_pool):
+    """Redis 서버별 무효화 구독자 (pub/sub은 DB와 무관하므로 host/port 단위로 하나)"""
+    kwargs = connection_pool.connection_kwargs
+    key = (kwargs.get('host'), str(kwargs.get('port')))
+    with _invalidators_lock:
+        invalidator = _invalidators.get(key)
+        if invalidator is None:
+            invalidator = _invalidators[key] = CacheInvalidator(connection_pool)
+        return invalidator
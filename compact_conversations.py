@@ -0,0 +1,43 @@
+"""
+conversation 매핑 키 정리 도구
+
+    python compact_conversations.py                  # 만료가 없는 conv:* 키에 conv_ttl 적용
+    python compact_conversations.py --delete-legacy  # 채널 없는 구버전 conv:{thread_ts} 키는 삭제
+    python compact_conversations.py --dry-run        # 변경 없이 개수만 확인
+
+SCAN으로 배치 단위 순회하므로 KEYS와 달리 Redis를 오래 막지 않습니다.
+구버전 키는 채널 정보가 없어 새 키로 옮길 수 없으며, 봇이 조회할 때 채널을 알게 되면 자동으로 옮겨집니다.
+"""
+import argparse
+from config import *
+from db_handler import ConversationDB
+
+
+def main():
+    parser = argparse.ArgumentParser(description="conversation 매핑 키 만료/정리")
+    parser.add_argument("--batch-size", type=int, default=1000, help="SCAN COUNT (배치당 키 수)")
+    parser.add_argument("--pause", type=float, default=0.01, help="배치 사이 대기 시간(초)")
+    parser.add_argument("--ttl", type=int, default=conv_ttl, help="적용할 만료 시간(초)")
+    parser.add_argument("--delete-legacy", action="store_true", help="구버전 conv:{thread_ts} 키 삭제")
+    parser.add_argument("--dry-run", action="store_true", help="변경 없이 통계만 출력")
+    args = parser.parse_args()
+
+    conv_db = ConversationDB(
+        host=redis_host,
+        port=redis_port,
+        db=redis_conv_db,
+        pw=redis_password,
+        ttl=args.ttl,
+    )
+
+    stats = {}
+    for stats in conv_db.compact(args.batch_size, args.pause, args.delete_legacy, args.dry_run):
+        print(f"\rscanned={stats['scanned']} legacy={stats['legacy']} "
+              f"expired={stats['expired']} deleted={stats['deleted']}", end="", flush=True)
+    print()
+    if args.dry_run:
+        print("dry run: 변경 사항 없음")
+
+
+if __name__ == "__main__":
+    main()
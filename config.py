@@ -12,6 +12,15 @@ debug = os.getenv('debug_mode', 'False').lower() in ('true', '1', 't')
 # Dify variables
 dify_api_key = os.getenv('dify_api_key')
 dify_base_url = os.getenv('dify_base_url')
+dify_http_pool_size = int(os.getenv('dify_http_pool_size', 32))
+dify_http_keepalive = os.getenv('dify_http_keepalive', 'True').lower() in ('true', '1', 't')
+dify_http_retries = int(os.getenv('dify_http_retries', 3))
+dify_http_backoff = float(os.getenv('dify_http_backoff', 0.3))
+dify_connect_timeout = float(os.getenv('dify_connect_timeout', 5))
+dify_read_timeout = float(os.getenv('dify_read_timeout', 120))
+dify_first_token_timeout = float(os.getenv('dify_first_token_timeout', 60))  # 첫 답변 토큰까지
+dify_idle_timeout = float(os.getenv('dify_idle_timeout', 60))  # 스트림 이벤트 사이
+dify_total_timeout = float(os.getenv('dify_total_timeout', 300))  # 요청 전체
 
 # Slack variables
 slack_base_url = os.getenv('slack_base_url')
@@ -19,6 +28,17 @@ slack_web_hook = os.getenv('slack_web_hook')
 slack_signing_secret = os.getenv('slack_signing_secret')
 slack_app_token = os.getenv('slack_app_token')
 slack_OAuth_token = os.getenv('slack_OAuth_token')
+socket_mode_connections = int(os.getenv('socket_mode_connections', 2))  # Socket Mode 동시 연결 수 (Slack 최대 10)
+socket_mode_concurrency = int(os.getenv('socket_mode_concurrency', 10))  # 연결당 이벤트 처리 스레드 수
+slack_update_interval = float(os.getenv('slack_update_interval', 0.9))
+slack_update_workspace_rate = float(os.getenv('slack_update_workspace_rate', 2.0))
+slack_update_workspace_burst = int(os.getenv('slack_update_workspace_burst', 20))
+slack_update_channel_rate = float(os.getenv('slack_update_channel_rate', 1.0))
+slack_update_channel_burst = int(os.getenv('slack_update_channel_burst', 3))
+slack_update_senders = int(os.getenv('slack_update_senders', 4))
+slack_message_max_chars = int(os.getenv('slack_message_max_chars', 3500))
+slack_thread_replies = os.getenv('slack_thread_replies', 'False').lower() in ('true', '1', 't')  # 봇이 대화 중인 스레드는 멘션 없이도 답변
+slack_stop_reactions = os.getenv('slack_stop_reactions', 'octagonal_sign,x,black_square_for_stop').split(',')  # 답변 중단 반응
 
 # Redis variables
 redis_host = os.getenv('redis_host')
@@ -26,5 +46,57 @@ redis_port = os.getenv('redis_port')
 redis_conv_db = os.getenv('redis_conv_db')
 redis_user_db = os.getenv('redis_user_db')
 redis_password = os.getenv('redis_password')
+redis_max_connections = int(os.getenv('redis_max_connections', 50))
+redis_pool_timeout = float(os.getenv('redis_pool_timeout', 5))
+redis_connect_timeout = float(os.getenv('redis_connect_timeout', 1))  # 장애 시 연결 대기 시간을 짧게
+redis_socket_timeout = float(os.getenv('redis_socket_timeout', 5))  # 명령 응답 대기 시간 (멈춘 Redis도 장애로 처리)
+redis_breaker_threshold = int(os.getenv('redis_breaker_threshold', 5))  # 연속 연결 실패 횟수 → 회로 열림
+redis_breaker_reset = float(os.getenv('redis_breaker_reset', 10))  # 회로가 열린 뒤 다시 시도할 때까지(초)
+fallback_store_path = os.getenv('fallback_store_path', '')  # Redis 장애 대비 로컬 저장소 (예: ./data/fallback.sqlite3), 비우면 사용하지 않음
+fallback_mirror_interval = float(os.getenv('fallback_mirror_interval', 3600))  # Redis에서 읽은 같은 값을 로컬 저장소에 다시 쓰는(만료 연장) 최소 간격(초)
+fallback_reconcile_interval = float(os.getenv('fallback_reconcile_interval', 2))  # 밀린 쓰기를 Redis에 반영하는 주기(초)
+conv_ttl = int(os.getenv('conv_ttl', 60 * 60 * 24 * 30))  # 마지막 조회 후 30일
+conv_legacy_fallback = os.getenv('conv_legacy_fallback', 'True').lower() in ('true', '1', 't')
+event_dedup_ttl = int(os.getenv('event_dedup_ttl', 600))  # Slack 재전송은 수 분 이내
+
+# Local cache variables (UserDB / ConversationDB 읽기 캐시)
+local_cache_enabled = os.getenv('local_cache_enabled', 'True').lower() in ('true', '1', 't')
+local_cache_size = int(os.getenv('local_cache_size', 10000))
+local_cache_ttl = float(os.getenv('local_cache_ttl', 300))
+answer_cache_enabled = os.getenv('answer_cache_enabled', 'False').lower() in ('true', '1', 't')  # 첫 질문 답변 캐시
+answer_cache_size = int(os.getenv('answer_cache_size', 1000))
+answer_cache_ttl = int(os.getenv('answer_cache_ttl', 600))  # 시세 등 시간에 민감한 질문이 있으므로 짧게
+answer_cache_exclude_channels = [c for c in os.getenv('answer_cache_exclude_channels', '').split(',') if c]
+semantic_cache_enabled = os.getenv('semantic_cache_enabled', 'False').lower() in ('true', '1', 't')  # 비슷한 첫 질문 답변 캐시
+semantic_cache_threshold = float(os.getenv('semantic_cache_threshold', 0.9))  # 코사인 유사도
+semantic_cache_size = int(os.getenv('semantic_cache_size', 10000))
+semantic_cache_ttl = int(os.getenv('semantic_cache_ttl', 3600))
+semantic_cache_dim = int(os.getenv('semantic_cache_dim', 256))
+semantic_cache_embedder = os.getenv('semantic_cache_embedder', '')  # "모듈:함수", 비우면 해싱 임베딩
+semantic_cache_path = os.getenv('semantic_cache_path', '')  # 비우면 저장하지 않음
+semantic_cache_save_interval = float(os.getenv('semantic_cache_save_interval', 300))
+
+# Worker pool variables
+worker_max_concurrency = int(os.getenv('worker_max_concurrency', 16))
+worker_queue_size = int(os.getenv('worker_queue_size', 64))
+thread_coalesce_window = float(os.getenv('thread_coalesce_window', 1.5))  # 답변 중 도착한 후속 메시지를 모으는 시간(초)
+thread_max_follow_ups = int(os.getenv('thread_max_follow_ups', 5))  # 답변 중인 스레드당 모아 둘 후속 메시지 수 (넘으면 거절)
+thread_cancel_stale = os.getenv('thread_cancel_stale', 'False').lower() in ('true', '1', 't')  # 새 메시지가 오면 이전 답변 중단
+job_queue_enabled = os.getenv('job_queue_enabled', 'False').lower() in ('true', '1', 't')  # True면 대화 처리를 slack_worker.py로 분리
+job_queue_name = os.getenv('job_queue_name', 'slack:jobs')
+job_queue_shards = int(os.getenv('job_queue_shards', 32))
+job_lease_ttl = float(os.getenv('job_lease_ttl', 30))
+job_poll_interval = float(os.getenv('job_poll_interval', 0.2))
+
+# Observability variables
+metrics_enabled = os.getenv('metrics_enabled', 'True').lower() in ('true', '1', 't')  # prometheus_client가 설치된 경우 /metrics
+otel_enabled = os.getenv('otel_enabled', 'False').lower() in ('true', '1', 't')  # opentelemetry가 설치된 경우 span 기록
+
+# Production server variables (wsgi.py / asgi.py)
+shutdown_drain_timeout = float(os.getenv('shutdown_drain_timeout', 60))  # 종료 시 진행 중인 답변을 기다리는 최대 시간(초)
+health_check_timeout = float(os.getenv('health_check_timeout', 2))  # /readyz의 Redis/Dify 확인 제한 시간(초)
+
+# Async server variables
+async_max_streams = int(os.getenv('async_max_streams', 1000))
 
 logger = CustomLogger("chat_log")
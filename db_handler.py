@@ -1,64 +1,545 @@
+import time
+import threading
 import redis
+from redis.utils import str_if_bytes
+from config import redis_max_connections, redis_pool_timeout, local_cache_enabled, local_cache_size, local_cache_ttl
+from config import health_check_timeout, redis_connect_timeout, redis_socket_timeout, redis_breaker_threshold, redis_breaker_reset
+from config import conv_ttl, conv_legacy_fallback, event_dedup_ttl, fallback_mirror_interval
 from utils import debug_print
+from cache import TTLCache, MISSING, get_cache_invalidator
+from fallback_store import get_fallback_store
+from metrics import REDIS_SECONDS, REDIS_FALLBACK_TOTAL, REDIS_DROPPED_WRITES_TOTAL, REDIS_CIRCUIT_OPEN
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_connection_pool(host='localhost', port=6379, db=0, pw='your_strong_password'):
+    """(host, port, db)별로 프로세스에서 공유하는 커넥션 풀"""
+    key = (host, str(port), str(db))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = redis.BlockingConnectionPool(
+                host=host,
+                port=port,
+                db=db,
+                password=pw,
+                decode_responses=True,
+                max_connections=redis_max_connections,
+                timeout=redis_pool_timeout,
+                # Redis가 응답하지 않으면 명령이 끝없이 기다리지 않고 실패 → 회로 차단기
+                # (pub/sub 구독은 get_message(timeout)으로 나눠 기다리고, XREADGROUP은 BLOCK 없이 호출)
+                socket_timeout=redis_socket_timeout,
+                socket_connect_timeout=redis_connect_timeout
+            )
+        return pool
+
+def reset_connection_pools():
+    """fork 이후 자식 프로세스에서 부모의 소켓을 공유하지 않도록 풀 초기화"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.reset()
+
+class CircuitBreaker:
+    """연결 실패가 failure_threshold번 이어지면 회로를 열어 reset_timeout 동안 Redis를 호출하지 않음 (연결 대기 없이 바로 대체 경로).
+    이후 시험 호출 한 번이 성공하면 닫힘"""
+    def __init__(self, failure_threshold=redis_breaker_threshold, reset_timeout=redis_breaker_reset):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self.lock = threading.Lock()
+    
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+    
+    def allow(self):
+        """호출해도 되면 True (열려 있으면 reset_timeout이 지난 뒤 한 호출만 통과)"""
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if not self.trial and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.trial = True
+                return True
+            return False
+    
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.trial = False
+            if self.opened_at is not None:
+                self.opened_at = None
+                REDIS_CIRCUIT_OPEN.dec()
+                debug_print("Redis circuit closed")
+    
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial = False
+            if self.opened_at is not None:
+                # 시험 호출 실패: 다시 reset_timeout 동안 대기
+                self.opened_at = time.monotonic()
+            elif self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                REDIS_CIRCUIT_OPEN.inc()
+                debug_print(f"Redis circuit opened after {self.failures} failures (retry in {self.reset_timeout}s)")
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_circuit_breaker(connection_pool):
+    """Redis 서버별 회로 차단기 (장애는 DB와 무관하므로 host/port 단위로 하나)"""
+    kwargs = connection_pool.connection_kwargs
+    key = (kwargs.get('host'), str(kwargs.get('port')))
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = _breakers[key] = CircuitBreaker()
+        return breaker
 
 class RedisBase:
     """Redis 연결을 위한 기본 클래스"""
-    def __init__(self, host='localhost', port=6379, db=0, pw='your_strong_password'):
-        self.redis_client = redis.Redis(
-            host=host,
-            port=port,
-            db=db,
-            password=pw,
-            decode_responses=True
-        )
+    # True면 Redis 장애 중 로컬 저장소(fallback_store)에서 읽고, 쓰기는 쌓아 두었다가 복구 후 반영
+    use_fallback = False
+    
+    def __init__(self, host='localhost', port=6379, db=0, pw='your_strong_password',
+                 connection_pool=None, local_cache=local_cache_enabled, fallback=True):
+        """connection_pool이 주어지면 host/port/db 대신 사용 (테스트, 벤치마크의 fakeredis 등)"""
+        if connection_pool is not None:
+            db = connection_pool.connection_kwargs.get('db', db)
+        self.db = str(db)
+        self.connection_pool = connection_pool or get_connection_pool(host, port, db, pw)
+        self.redis_client = redis.Redis(connection_pool=self.connection_pool)
         debug_print(f"Redis connected - Host: {host}, Port: {port}, DB: {db}")
+        
+        self.breaker = get_circuit_breaker(self.connection_pool)
+        self.fallback = get_fallback_store() if self.use_fallback and fallback else None
+        self.mirrored = None
+        if self.fallback is not None:
+            self.fallback.register(self.db, self.redis_client, self.breaker)
+            # Redis에서 읽은 값을 로컬 저장소에 복사한 기록 (같은 값이면 mirror_interval 동안 다시 쓰지 않음)
+            self.mirrored = TTLCache(maxsize=local_cache_size, ttl=fallback_mirror_interval)
+        
+        # 읽기 캐시: 쓰기 시 pub/sub으로 다른 프로세스의 캐시도 무효화
+        self.cache = None
+        self.invalidator = None
+        if local_cache:
+            self.cache = TTLCache(maxsize=local_cache_size, ttl=local_cache_ttl)
+            self.invalidator = get_cache_invalidator(self.connection_pool)
+            self.invalidator.register(self.cache)
+    
+    def _cache_get(self, key):
+        return self.cache.get(key) if self.cache is not None else MISSING
+    
+    def _cache_set(self, key, value):
+        if self.cache is not None and value is not None:
+            self.cache.set(key, value)
+    
+    def _invalidate(self, key, publish=True):
+        """로컬 캐시 삭제 후 다른 프로세스에 무효화 전파 (회로가 열려 있으면 전파 생략)"""
+        if self.cache is not None:
+            self.cache.delete(key)
+            if publish and not self.breaker.is_open:
+                self.invalidator.publish(key, self.cache)
+    
+    def _call(self, operation, call, fallback=None):
+        """Redis 호출. 회로가 열려 있거나 연결에 실패하면 fallback()의 결과 (없으면 None)"""
+        if self.breaker.allow():
+            try:
+                with REDIS_SECONDS.labels(operation).time():
+                    result = call()
+            except (redis.ConnectionError, redis.TimeoutError) as e:
+                self.breaker.record_failure()
+                debug_print(f"Redis {operation} unavailable: {e}")
+            except Exception:
+                # 서버는 응답했으므로 연결 실패로 보지 않음
+                self.breaker.record_success()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+        REDIS_FALLBACK_TOTAL.labels(operation).inc()
+        return fallback() if fallback is not None else None
+    
+    def _write(self, operation, call, op, key, value=None, ttl=None):
+        """Redis 쓰기. 실패하면 로컬 저장소에 쌓아 두고 복구 후 반영 (write-behind).
+        아직 반영되지 않은 쓰기가 있으면 순서를 지키기 위해 새 쓰기도 그 뒤에 쌓음"""
+        if self.fallback is not None:
+            # 부분 쓰기(hset 등)일 수 있으므로 다음 읽기에서 전체 값을 다시 복사
+            self.mirrored.delete(key)
+            if self.fallback.has_pending(self.db):
+                REDIS_FALLBACK_TOTAL.labels(operation).inc()
+                self.fallback.enqueue(self.db, op, key, value, ttl)
+                return
+        written = self._call(operation, lambda: call() or True, lambda: False)
+        if self.fallback is None:
+            if not written:
+                REDIS_DROPPED_WRITES_TOTAL.labels(operation).inc()
+                debug_print(f"Dropped {op} {key}: Redis unavailable and no fallback store configured")
+            return
+        if written:
+            self.fallback.apply(self.db, op, key, value, ttl)
+        else:
+            self.fallback.enqueue(self.db, op, key, value, ttl)
+            debug_print(f"Buffered {op} {key} until Redis recovers")
+    
+    def _remember(self, op, key, value, ttl=None):
+        """Redis에서 읽은 값을 장애 대비 로컬 저장소에 복사 (다른 호스트나 배포 전에 만든 값도 장애 중 사용).
+        Redis 읽기가 만료를 연장하므로 로컬 사본의 만료도 함께 연장하되, 같은 값은 mirror_interval마다 한 번만 씀"""
+        if self.fallback is None or self.mirrored.get(key) == value:
+            return
+        try:
+            self.fallback.apply(self.db, op, key, value, ttl)
+            self.mirrored.set(key, value)
+        except Exception as e:
+            debug_print(f"Fallback store write error: {e}")
+    
+    def _fallback_get(self, key):
+        if self.fallback is None:
+            return None
+        try:
+            return self.fallback.get(self.db, key)
+        except Exception as e:
+            debug_print(f"Fallback store read error: {e}")
+            return None
+    
+    def cache_stats(self):
+        """hit/miss/eviction 통계"""
+        return self.cache.stats() if self.cache is not None else {}
+    
+    def ping(self, timeout=health_check_timeout):
+        """Redis 연결 확인 (readiness 점검용). 풀이 가득 차 있어도 기다리지 않도록 별도 연결로 timeout초 안에 응답해야 성공"""
+        kwargs = dict(self.connection_pool.connection_kwargs, socket_timeout=timeout, socket_connect_timeout=timeout)
+        connection = self.connection_pool.connection_class(**kwargs)
+        try:
+            connection.send_command("PING")
+            return str_if_bytes(connection.read_response()) == "PONG"
+        except Exception as e:
+            debug_print(f"Redis ping error: {e}")
+            return False
+        finally:
+            connection.disconnect()
 
 class ConversationDB(RedisBase):
-    def __init__(self, host='localhost', port=6379, db=15, pw='your_strong_password'):
-        super().__init__(host, port, db, pw)
+    """스레드 → Dify conversation_id 매핑. 키는 conv:{channel}:{thread_ts}이며 조회할 때마다 만료가 연장됩니다."""
+    use_fallback = True
     
-    def save_conversation(self, thread_ts, conversation_id):
+    def __init__(self, host='localhost', port=6379, db=15, pw='your_strong_password', ttl=conv_ttl, **kwargs):
+        super().__init__(host, port, db, pw, **kwargs)
+        self.ttl = ttl
+    
+    @staticmethod
+    def _key(channel_id, thread_ts):
+        return f"conv:{channel_id}:{thread_ts}"
+    
+    def save_conversation(self, channel_id, thread_ts, conversation_id):
         """대화 ID 저장"""
+        key = self._key(channel_id, thread_ts)
         try:
-            self.redis_client.set(f"conv:{thread_ts}", conversation_id)
-            debug_print(f"Saved to Redis - Thread: {thread_ts}, Conversation ID: {conversation_id}")
+            self._write("save_conversation", lambda: self.redis_client.set(key, conversation_id, ex=self.ttl),
+                        "set", key, conversation_id, self.ttl)
+            self._invalidate(key)
+            self._cache_set(key, conversation_id)
+            debug_print(f"Saved to Redis - Thread: {channel_id}/{thread_ts}, Conversation ID: {conversation_id}")
         except Exception as e:
             debug_print(f"Redis save error: {e}")
     
-    def get_conversation(self, thread_ts):
+    def get_conversation(self, channel_id, thread_ts):
         """대화 ID 조회"""
+        key = self._key(channel_id, thread_ts)
+        conversation_id = self._cache_get(key)
+        if conversation_id is not MISSING:
+            return conversation_id
         try:
-            conversation_id = self.redis_client.get(f"conv:{thread_ts}")
-            debug_print(f"Retrieved from Redis - Thread: {thread_ts}, Conversation ID: {conversation_id}")
+            conversation_id = self._call("get_conversation", lambda: self._fetch_conversation(channel_id, thread_ts),
+                                         lambda: self._fallback_get(key))
+            debug_print(f"Retrieved from Redis - Thread: {channel_id}/{thread_ts}, Conversation ID: {conversation_id}")
             return conversation_id
         except Exception as e:
             debug_print(f"Redis get error: {e}")
             return None
     
-    def delete_conversation(self, thread_ts):
+    def _fetch_conversation(self, channel_id, thread_ts, pipe=None):
+        """Redis 조회 (만료 연장 + 구버전 conv:{thread_ts} 키 확인을 한 번에). pipe가 주어지면 명령만 추가"""
+        key = self._key(channel_id, thread_ts)
+        own_pipe = pipe is None
+        if own_pipe:
+            pipe = self.redis_client.pipeline(transaction=False)
+        pipe.get(key)
+        pipe.expire(key, self.ttl)
+        if conv_legacy_fallback:
+            pipe.get(f"conv:{thread_ts}")
+        if own_pipe:
+            return self._resolve_conversation(channel_id, thread_ts, pipe.execute())
+    
+    def _resolve_conversation(self, channel_id, thread_ts, results):
+        """_fetch_conversation 파이프라인 결과 처리. 구버전 키만 있으면 새 키로 옮김"""
+        conversation_id = results[0]
+        if conversation_id is None and len(results) > 2 and results[2]:
+            conversation_id = results[2]
+            self._migrate_legacy(channel_id, thread_ts, conversation_id)
+        self._cache_set(self._key(channel_id, thread_ts), conversation_id)
+        if conversation_id:
+            # _fetch_conversation의 EXPIRE와 같이 로컬 사본의 만료도 연장
+            self._remember("set", self._key(channel_id, thread_ts), conversation_id, self.ttl)
+        return conversation_id
+    
+    def _migrate_legacy(self, channel_id, thread_ts, conversation_id):
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.set(self._key(channel_id, thread_ts), conversation_id, ex=self.ttl)
+            pipe.delete(f"conv:{thread_ts}")
+            pipe.execute()
+            debug_print(f"Migrated legacy conversation key - Thread: {channel_id}/{thread_ts}")
+        except Exception as e:
+            debug_print(f"Redis migrate error: {e}")
+    
+    def claim_conversation(self, channel_id, thread_ts, ttl=60):
+        """새 스레드의 conversation 생성 권한 획득 (SET NX). Redis 장애 중에는 항상 획득"""
+        try:
+            return bool(self._call("claim_conversation",
+                                   lambda: self.redis_client.set(f"conv_lock:{channel_id}:{thread_ts}", "1", nx=True, ex=ttl),
+                                   lambda: True))
+        except Exception as e:
+            debug_print(f"Redis claim error: {e}")
+            return True
+    
+    def release_conversation_claim(self, channel_id, thread_ts):
+        """conversation 생성 권한 반환"""
+        try:
+            self._call("release_conversation_claim", lambda: self.redis_client.delete(f"conv_lock:{channel_id}:{thread_ts}"))
+        except Exception as e:
+            debug_print(f"Redis release error: {e}")
+    
+    def wait_for_conversation(self, channel_id, thread_ts, timeout=30, interval=0.2):
+        """다른 요청이 생성 중인 conversation ID를 대기 (권한이 반환되면 즉시 종료)"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            conversation_id = self.get_conversation(channel_id, thread_ts)
+            if conversation_id:
+                return conversation_id
+            try:
+                if not self._call("wait_for_conversation",
+                                  lambda: self.redis_client.exists(f"conv_lock:{channel_id}:{thread_ts}"), lambda: False):
+                    return self.get_conversation(channel_id, thread_ts)
+            except Exception as e:
+                debug_print(f"Redis wait error: {e}")
+                return None
+            time.sleep(interval)
+        return None
+    
+    def save_cached_exchange(self, channel_id, thread_ts, query, answer):
+        """캐시된 답변으로 응답한 스레드의 질문/답변 (conversation이 없으므로 후속 질문에 맥락으로 함께 전송)"""
+        key = f"cached_exchange:{channel_id}:{thread_ts}"
+        try:
+            self._call("save_cached_exchange",
+                       lambda: self.redis_client.pipeline(transaction=False)
+                       .hset(key, mapping={"query": query, "answer": answer}).expire(key, self.ttl).execute())
+        except Exception as e:
+            debug_print(f"Redis save cached exchange error: {e}")
+    
+    def get_cached_exchange(self, channel_id, thread_ts):
+        """(질문, 답변) 또는 None"""
+        try:
+            exchange = self._call("get_cached_exchange",
+                                  lambda: self.redis_client.hgetall(f"cached_exchange:{channel_id}:{thread_ts}"))
+        except Exception as e:
+            debug_print(f"Redis get cached exchange error: {e}")
+            return None
+        if not exchange:
+            return None
+        return exchange.get("query", ""), exchange.get("answer", "")
+    
+    def delete_conversation(self, channel_id, thread_ts):
         """대화 ID 삭제"""
+        key = self._key(channel_id, thread_ts)
         try:
-            self.redis_client.delete(f"conv:{thread_ts}")
+            self._write("delete_conversation", lambda: self.redis_client.delete(key), "delete", key)
+            self._invalidate(key)
         except Exception as e:
             debug_print(f"Redis delete error: {e}")
+    
+    def compact(self, batch_size=1000, pause=0.01, delete_legacy=False, dry_run=False):
+        """SCAN으로 conv:* 키를 배치 단위로 순회하며 만료가 없는 키에 TTL을 부여 (Redis를 막지 않도록 배치 사이 대기).
+        구버전 conv:{thread_ts} 키는 채널 정보가 없어 새 키로 옮길 수 없으므로 만료시키거나(delete_legacy=True면) 삭제합니다.
+        진행 상황 dict를 배치마다 반환합니다."""
+        stats = {"scanned": 0, "legacy": 0, "expired": 0, "deleted": 0}
+        cursor = 0
+        while True:
+            cursor, keys = self.redis_client.scan(cursor=cursor, match="conv:*", count=batch_size)
+            if keys:
+                pipe = self.redis_client.pipeline(transaction=False)
+                for key in keys:
+                    pipe.ttl(key)
+                ttls = pipe.execute()
+                
+                pipe = self.redis_client.pipeline(transaction=False)
+                for key, key_ttl in zip(keys, ttls):
+                    legacy = key.count(":") == 1
+                    stats["legacy"] += legacy
+                    if legacy and delete_legacy:
+                        pipe.delete(key)
+                        stats["deleted"] += 1
+                    elif key_ttl == -1:
+                        pipe.expire(key, self.ttl)
+                        stats["expired"] += 1
+                if not dry_run:
+                    pipe.execute()
+                stats["scanned"] += len(keys)
+            yield dict(stats)
+            if cursor == 0:
+                break
+            time.sleep(pause)
 
 class UserDB(RedisBase):
-    def __init__(self, host='localhost', port=6379, db=14, pw='your_strong_password'):
-        super().__init__(host, port, db, pw)
+    use_fallback = True
+    
+    def __init__(self, host='localhost', port=6379, db=14, pw='your_strong_password', **kwargs):
+        super().__init__(host, port, db, pw, **kwargs)
 
     def get_current_model(self, user_id):
-        debug_print(f"Retrieved from Redis - User: {user_id}, Model: {self.redis_client.hget(f'user:{user_id}', 'current_model')}")
-        return self.redis_client.hget(f"user:{user_id}", "current_model")
+        model, _ = self.get_user_settings(user_id)
+        return model
 
     def get_current_prompt(self, user_id):
-        debug_print(f"Retrieved from Redis - User: {user_id}, Prompt: {self.redis_client.hget(f'user:{user_id}', 'current_prompt')}")
-        return self.redis_client.hget(f"user:{user_id}", "current_prompt")
+        _, prompt = self.get_user_settings(user_id)
+        return prompt
+    
+    def get_user_settings(self, user_id):
+        """모델과 프롬프트를 HMGET 한 번으로 조회"""
+        settings = self._cache_get(f"user:{user_id}")
+        if settings is not MISSING:
+            return settings
+        model, prompt = self._call("get_user_settings", lambda: self._fetch_user_settings(user_id),
+                                   lambda: self._fallback_user_settings(user_id))
+        debug_print(f"Retrieved from Redis - User: {user_id}, Model: {model}, Prompt: {prompt}")
+        return model, prompt
+    
+    def _fetch_user_settings(self, user_id):
+        settings = self.redis_client.hmget(f"user:{user_id}", "current_model", "current_prompt")
+        self._cache_user_settings(user_id, *settings)
+        return settings
+    
+    def _fallback_user_settings(self, user_id):
+        """Redis 장애 중 로컬 저장소의 마지막 설정 (없으면 None, None → 기본값 사용)"""
+        settings = self._fallback_get(f"user:{user_id}") or {}
+        return settings.get("current_model"), settings.get("current_prompt")
+    
+    def _cache_user_settings(self, user_id, model, prompt):
+        # 둘 다 있는 경우만 캐시 (기본값 저장 전의 빈 값은 캐시하지 않음)
+        if model is not None and prompt is not None:
+            self._cache_set(f"user:{user_id}", (model, prompt))
+            self._remember("hset", f"user:{user_id}", {"current_model": model, "current_prompt": prompt})
+    
+    def load_user_context(self, user_id, channel_id, thread_ts, conv_db):
+        """모델, 프롬프트, conversation_id 조회. 캐시에 없는 항목만 Redis에서 가져오며,
+        두 DB가 같으면 파이프라인 1회, 다르면 DB당 1회 왕복"""
+        try:
+            settings = self._cache_get(f"user:{user_id}")
+            conversation_id = conv_db._cache_get(conv_db._key(channel_id, thread_ts))
+            
+            if settings is MISSING or conversation_id is MISSING:
+                settings, conversation_id = self._call(
+                    "load_user_context",
+                    lambda: self._fetch_user_context(user_id, channel_id, thread_ts, conv_db, settings, conversation_id),
+                    lambda: self._fallback_user_context(user_id, channel_id, thread_ts, conv_db, settings, conversation_id),
+                )
+            
+            model, prompt = settings
+            debug_print(f"Loaded user context - User: {user_id}, Model: {model}, Thread: {channel_id}/{thread_ts}, Conversation ID: {conversation_id}")
+            return model, prompt, conversation_id
+        except Exception as e:
+            debug_print(f"Redis load context error: {e}")
+            return None, None, None
+    
+    def _fetch_user_context(self, user_id, channel_id, thread_ts, conv_db, settings, conversation_id):
+        """캐시에 없는 항목을 Redis에서 조회"""
+        if settings is MISSING and conversation_id is MISSING and conv_db.connection_pool is self.connection_pool:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.hmget(f"user:{user_id}", "current_model", "current_prompt")
+            conv_db._fetch_conversation(channel_id, thread_ts, pipe)
+            results = pipe.execute()
+            self._cache_user_settings(user_id, *results[0])
+            return results[0], conv_db._resolve_conversation(channel_id, thread_ts, results[1:])
+        if settings is MISSING:
+            settings = self._fetch_user_settings(user_id)
+        if conversation_id is MISSING:
+            conversation_id = conv_db._fetch_conversation(channel_id, thread_ts)
+        return settings, conversation_id
+    
+    def _fallback_user_context(self, user_id, channel_id, thread_ts, conv_db, settings, conversation_id):
+        """Redis 장애 중 캐시에 없는 항목을 로컬 저장소에서 조회"""
+        if settings is MISSING:
+            settings = self._fallback_user_settings(user_id)
+        if conversation_id is MISSING:
+            conversation_id = conv_db._fallback_get(conv_db._key(channel_id, thread_ts))
+        return settings, conversation_id
+    
+    def set_defaults(self, user_id, model, prompt):
+        """설정이 없는 항목만 기본값으로 저장 (HSETNX, 파이프라인 1회)"""
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.hsetnx(f"user:{user_id}", "current_model", model)
+            pipe.hsetnx(f"user:{user_id}", "current_prompt", prompt)
+            self._write("set_defaults", pipe.execute, "hsetnx", f"user:{user_id}",
+                        {"current_model": model, "current_prompt": prompt})
+            self._invalidate(f"user:{user_id}", publish=False)
+            debug_print(f"Saved defaults to Redis - User: {user_id}")
+        except Exception as e:
+            debug_print(f"Redis set defaults error: {e}")
     
     def set_user_model(self, user_id, model):
         debug_print(f"Saved to Redis - User: {user_id}, Model: {model}")
-        self.redis_client.hset(f"user:{user_id}", "current_model", model)
+        self._write("set_user_model", lambda: self.redis_client.hset(f"user:{user_id}", "current_model", model),
+                    "hset", f"user:{user_id}", {"current_model": model})
+        self._invalidate(f"user:{user_id}")
         
     def set_user_prompt(self, user_id, prompt):
         debug_print(f"Saved to Redis - User: {user_id}, Prompt: {prompt}")
-        self.redis_client.hset(f"user:{user_id}", "current_prompt", prompt)
+        self._write("set_user_prompt", lambda: self.redis_client.hset(f"user:{user_id}", "current_prompt", prompt),
+                    "hset", f"user:{user_id}", {"current_prompt": prompt})
+        self._invalidate(f"user:{user_id}")
             
+
+class EventDB(RedisBase):
+    """Slack 이벤트 상태: 중복 처리 방지(재전송된 이벤트를 SET NX로 한 번만 처리)와 프로세스 간 답변 중단 요청"""
+    def __init__(self, host='localhost', port=6379, db=15, pw='your_strong_password', ttl=event_dedup_ttl, **kwargs):
+        super().__init__(host, port, db, pw, **kwargs)
+        self.ttl = ttl
+    
+    def mark_seen(self, event_key):
+        """처음 보는 이벤트면 True. Redis 오류 시에는 응답 누락보다 중복이 낫기 때문에 True"""
+        key = f"event:{event_key}"
+        # 같은 프로세스로 온 재전송은 Redis까지 가지 않음
+        if self._cache_get(key) is not MISSING:
+            return False
+        try:
+            first = bool(self._call("mark_seen", lambda: self.redis_client.set(key, "1", nx=True, ex=self.ttl), lambda: True))
+        except Exception as e:
+            debug_print(f"Redis dedup error: {e}")
+            return True
+        self._cache_set(key, True)
+        if not first:
+            debug_print(f"Duplicate event ignored: {event_key}")
+        return first
+    
+    def request_cancel(self, channel_id, message_ts, user_id):
+        """다른 프로세스(워커)에서 실행 중인 답변의 중단 요청 기록"""
+        try:
+            self._call("request_cancel",
+                       lambda: self.redis_client.set(f"stream_cancel:{channel_id}:{message_ts}", user_id or "", ex=self.ttl))
+        except Exception as e:
+            debug_print(f"Redis cancel request error: {e}")
+    
+    def get_cancel_requests(self, messages):
+        """[(channel_id, message_ts), ...]별 중단을 요청한 사용자 (없으면 None). 파이프라인 1회"""
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for channel_id, message_ts in messages:
+                pipe.get(f"stream_cancel:{channel_id}:{message_ts}")
+            return self._call("get_cancel_requests", pipe.execute, lambda: [None] * len(messages))
+        except Exception as e:
+            debug_print(f"Redis cancel lookup error: {e}")
+            return [None] * len(messages)
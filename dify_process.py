@@ -1,10 +1,103 @@
 from config import *
+import socket
+import threading
 import requests
 import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.connection import HTTPConnection
 from utils import get_headers, debug_print
+from sse_parser import SSEParser
 
 # api docs = {dify_base_url}/app/e7882139-3377-41e3-968b-866d89702c1d/develop
 
+_session = None
+_session_lock = threading.Lock()
+
+class KeepAliveHTTPAdapter(HTTPAdapter):
+    """TCP keep-alive 옵션을 적용하는 어댑터"""
+    def init_poolmanager(self, *args, **kwargs):
+        if dify_http_keepalive:
+            kwargs['socket_options'] = HTTPConnection.default_socket_options + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+        super().init_poolmanager(*args, **kwargs)
+
+def _create_session():
+    session = requests.Session()
+    # 재시도는 연결 실패 및 멱등(GET) 요청에만 적용 (POST 응답 재전송으로 인한 중복 생성 방지)
+    retry = Retry(
+        total=dify_http_retries,
+        connect=dify_http_retries,
+        read=dify_http_retries,
+        status=dify_http_retries,
+        backoff_factor=dify_http_backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = KeepAliveHTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=dify_http_pool_size,
+        max_retries=retry,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if not dify_http_keepalive:
+        session.headers["Connection"] = "close"
+    return session
+
+def get_session():
+    """프로세스 공용 Dify HTTP 세션 (커넥션 풀)"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _create_session()
+    return _session
+
+def reset_session():
+    """세션 폐기 (fork 이후 자식 프로세스에서 소켓 공유 방지용)"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+def http_pool_stats():
+    """커넥션 재사용 통계 (요청 수 - 신규 연결 수 = 재사용 횟수)"""
+    stats = {"requests": 0, "connections": 0, "reused": 0}
+    session = _session
+    if session is None:
+        return stats
+    for adapter in set(session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats["requests"] += pool.num_requests
+            stats["connections"] += pool.num_connections
+    stats["reused"] = max(0, stats["requests"] - stats["connections"])
+    return stats
+
+def abort_stream(response):
+    """다른 스레드에서 읽는 중인 스트리밍 응답을 끊음. response.close()는 진행 중인 읽기가 타임아웃될 때까지 막히므로
+    소켓을 shutdown해 읽기가 바로 끝나게 합니다 (커넥션은 읽던 스레드가 close할 때 폐기). 끊었으면 True"""
+    connection = getattr(response.raw, "_connection", None)
+    sock = getattr(connection, "sock", None)
+    if sock is None:
+        return False
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+        return True
+    except OSError as e:
+        debug_print(f"Error aborting Dify stream: {e}")
+        return False
+
+def get_timeout():
+    """(connect, read) 타임아웃. 스트리밍에서는 read가 청크 간 유휴 시간 제한으로 동작"""
+    return (dify_connect_timeout, dify_read_timeout)
+
 class DifyClient:
     def __init__(self, api_key=dify_api_key, base_url=dify_base_url):
         self.api_key = api_key
@@ -35,9 +128,10 @@ class DifyClient:
         api_url = f"{self.base_url}/{end_point}"
         
         try:
-            response = requests.post(
+            response = get_session().post(
                 api_url,
                 headers=self.headers,
+                timeout=get_timeout(),
                 json={
                     "inputs": {},
                     "query": user_query,
@@ -57,8 +151,12 @@ class DifyClient:
             debug_print(f"Error in chat_messages: {e}")
             raise e
     
-    def chat_messages_stream(self, user_query, user_id=''):
+    def chat_messages_stream(self, user_query, user_id='', conversation_id=None):
         '''Send Chat Message with Streaming'''
+        
+        # 공유 클라이언트에서는 요청별 conversation_id를 인자로 전달
+        if conversation_id is None:
+            conversation_id = self.conversation_id
             
         end_point = "v1/chat-messages"
         api_url = f"{self.base_url}/{end_point}"
@@ -71,31 +169,164 @@ class DifyClient:
             "query": user_query,
             "user": user_id,
             "response_mode": "streaming",
-            "conversation_id": self.conversation_id  # conversation_id 추가
+            "conversation_id": conversation_id  # conversation_id 추가
         }
             
         try:
             debug_print(f"Dify stream conversation_id: {data['conversation_id']}")
-            response = requests.post(api_url, headers=headers, json=data, stream=True)
+            response = get_session().post(api_url, headers=headers, json=data, stream=True, timeout=get_timeout())
             return response
             
         except Exception as e:
             debug_print(f"Error in chat_messages_stream: {e}")
             raise e
     
+    def stop_message(self, task_id, user_id):
+        '''Stop Streaming Response (진행 중인 생성 작업 중지)'''
+        end_point = f"v1/chat-messages/{task_id}/stop"
+        api_url = f"{self.base_url}/{end_point}"
+        
+        try:
+            response = get_session().post(
+                api_url,
+                headers=self.headers,
+                json={"user": user_id},
+                timeout=get_timeout()
+            )
+            logger.log_api_status("POST", f"/{end_point}", response)
+            return response.ok
+        except Exception as e:
+            debug_print(f"Error in stop_message: {e}")
+            return False
+    
+    def ping(self, timeout=health_check_timeout):
+        '''Dify API 연결 확인 (readiness 점검용). 5xx나 연결 실패가 아니면 True.
+        공용 세션의 재시도/백오프가 timeout을 늘리지 않도록 재시도 없이 한 번만 요청'''
+        try:
+            response = requests.get(
+                f"{self.base_url}/v1/parameters",
+                headers=self.headers,
+                params={"user": "healthcheck"},
+                timeout=(timeout, timeout)
+            )
+            return response.status_code < 500
+        except Exception as e:
+            debug_print(f"Dify ping error: {e}")
+            return False
+    
     def get_messages(self, user_id):
         '''Get Conversation History Messages'''
         end_point = "v1/messages"
         params = {"user": user_id, "conversation_id": ""}
         api_url = f"{self.base_url}/{end_point}"
         
-        response = requests.get(
+        response = get_session().get(
             api_url,
             headers=self.headers,
-            params=params
+            params=params,
+            timeout=get_timeout()
         )
         response_json = response.json()
         
         logger.log_api_status("GET", f"/{end_point}", response)
         
-        return response, response_json
\ No newline at end of file
+        return response, response_json
+
+
+class AsyncDifyClient:
+    """asyncio 기반 Dify 클라이언트. 하나의 이벤트 루프에서 다수의 스트림을 동시에 처리합니다."""
+    def __init__(self, api_key=dify_api_key, base_url=dify_base_url):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.headers = get_headers(api_key)
+        self.session = None
+        
+    async def _get_session(self):
+        """aiohttp 세션은 이벤트 루프 안에서 생성해야 하므로 최초 호출 시 생성"""
+        if self.session is None or self.session.closed:
+            import aiohttp
+            self.session = aiohttp.ClientSession(headers=self.headers)
+        return self.session
+    
+    async def create_conversation(self, user_id):
+        """새로운 conversation 생성"""
+        response_json = await self.chat_messages(
+            user_query = "Initialize conversation",
+            user_id = user_id,
+            conversation_id = ""
+        )
+        return response_json.get('conversation_id')
+    
+    async def chat_messages(self, user_query, user_id, conversation_id=''):
+        '''Send Chat Message'''
+        end_point = "v1/chat-messages"
+        api_url = f"{self.base_url}/{end_point}"
+        
+        try:
+            session = await self._get_session()
+            async with session.post(
+                api_url,
+                json={
+                    "inputs": {},
+                    "query": user_query,
+                    "response_mode": "blocking",
+                    "user": user_id,
+                    "conversation_id": conversation_id,
+                }
+            ) as response:
+                response_json = await response.json(content_type=None)
+            
+            error = response_json.get('code','') + response_json.get('message','')
+            logger.log_api_status("POST", f"/{end_point}", _AsyncStatus(response.status), error)
+            logger.log_llm_response(response_json)
+            
+            return response_json
+        except Exception as e:
+            debug_print(f"Error in async chat_messages: {e}")
+            raise e
+    
+    async def chat_messages_stream(self, user_query, user_id='', conversation_id=''):
+        '''Send Chat Message with Streaming - SSEEvent를 비동기로 반환'''
+        end_point = "v1/chat-messages"
+        api_url = f"{self.base_url}/{end_point}"
+        
+        data = {
+            "inputs": {},
+            "query": user_query,
+            "user": user_id,
+            "response_mode": "streaming",
+            "conversation_id": conversation_id
+        }
+        
+        debug_print(f"Dify async stream conversation_id: {conversation_id}")
+        session = await self._get_session()
+        async with session.post(api_url, json=data, headers={'Accept': 'text/event-stream'}) as response:
+            logger.log_api_status("POST", f"/{end_point}", _AsyncStatus(response.status))
+            parser = SSEParser()
+            async for chunk in response.content.iter_any():
+                for event in parser.feed(chunk):
+                    yield event
+            for event in parser.close():
+                yield event
+    
+    async def stop_message(self, task_id, user_id):
+        '''Stop Streaming Response (진행 중인 생성 작업 중지)'''
+        end_point = f"v1/chat-messages/{task_id}/stop"
+        try:
+            session = await self._get_session()
+            async with session.post(f"{self.base_url}/{end_point}", json={"user": user_id}) as response:
+                logger.log_api_status("POST", f"/{end_point}", _AsyncStatus(response.status))
+                return response.status < 400
+        except Exception as e:
+            debug_print(f"Error in async stop_message: {e}")
+            return False
+    
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+
+
+class _AsyncStatus:
+    """logger.log_api_status 호환용 (status_code 속성만 사용)"""
+    def __init__(self, status):
+        self.status_code = status
@@ -0,0 +1,31 @@
+import re
+
+# 이벤트 분류 결과 (None이면 무시)
+MENTION = "mention"
+DM = "dm"
+THREAD_REPLY = "thread_reply"
+
+# app_mention과 message 이벤트를 리스너 하나로 받기 위한 이벤트 타입 패턴
+MESSAGE_EVENT_TYPES = re.compile(r"^(app_mention|message)$")
+
+def classify_event(event, bot_user_id=None):
+    """이벤트를 한 번만 분류합니다. 채널 멘션은 app_mention과 message 이벤트가 함께 오므로
+    message 쪽은 무시하고, 봇/서브타입(수정, 삭제, 입장 등) 메시지도 무시합니다."""
+    if event.get('bot_id') or event.get('subtype') or not event.get('user'):
+        return None
+    if bot_user_id and event.get('user') == bot_user_id:
+        return None
+
+    event_type = event.get('type')
+    if event_type == 'app_mention':
+        return MENTION
+    if event_type != 'message':
+        return None
+
+    if event.get('channel_type') == 'im':
+        return DM
+    if bot_user_id and f"<@{bot_user_id}>" in event.get('text', ''):
+        return None  # app_mention 이벤트에서 처리
+    if event.get('thread_ts') and event['thread_ts'] != event.get('ts'):
+        return THREAD_REPLY
+    return None
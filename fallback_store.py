@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import redis
+from config import fallback_store_path, fallback_reconcile_interval
+from utils import debug_print
+
+class FallbackStore:
+    """Redis 장애 대비 로컬 SQLite(WAL) 저장소.
+    Redis에서 읽거나 쓴 conversation 매핑과 사용자 설정의 사본(kv)을 보관해 장애 중 읽기에 사용하고,
+    장애 중의 쓰기는 pending에 순서대로 쌓아 두었다가 Redis가 복구되면 반영합니다(write-behind).
+    같은 파일을 여러 워커 프로세스가 함께 사용할 수 있습니다."""
+
+    def __init__(self, path=fallback_store_path, reconcile_interval=fallback_reconcile_interval):
+        self.path = path
+        self.reconcile_interval = reconcile_interval
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.targets = {}           # Redis DB 번호 -> (redis_client, CircuitBreaker)
+        self.reconciler_pid = None
+        self.replayed = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS kv (db TEXT, key TEXT, value TEXT, expires_at REAL, PRIMARY KEY (db, key))")
+        conn.execute("CREATE TABLE IF NOT EXISTS pending (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                     "db TEXT, op TEXT, key TEXT, value TEXT, ttl INTEGER)")
+        debug_print(f"Fallback store opened: {path}")
+
+    def _conn(self):
+        """스레드별 연결 (fork 이후에는 새로 연결)"""
+        conn = getattr(self.local, "conn", None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    def register(self, db, redis_client, breaker):
+        """복구 시 밀린 쓰기를 반영할 Redis DB 등록 (프로세스당 반영 스레드 하나)"""
+        with self.lock:
+            self.targets[str(db)] = (redis_client, breaker)
+        self._ensure_reconciler()
+
+    def _ensure_reconciler(self):
+        # fork된 자식 프로세스에는 부모의 스레드가 없으므로 다시 시작
+        with self.lock:
+            if self.reconciler_pid != os.getpid():
+                self.reconciler_pid = os.getpid()
+                threading.Thread(target=self._reconcile_loop, name="fallback-reconciler", daemon=True).start()
+
+    def get(self, db, key):
+        """저장된 값 (문자열 또는 해시 dict). 없거나 만료됐으면 None"""
+        row = self._conn().execute("SELECT value, expires_at FROM kv WHERE db = ? AND key = ?", (str(db), key)).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return json.loads(row[0])
+
+    def apply(self, db, op, key, value=None, ttl=None):
+        """로컬 사본만 갱신 (Redis에 반영된 값).
+        op는 set(문자열 값, ttl초 후 만료), hset/hsetnx(해시 필드 dict), delete"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._apply(conn, str(db), op, key, value, ttl)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def enqueue(self, db, op, key, value=None, ttl=None):
+        """로컬 사본을 갱신하고 Redis 복구 후 반영할 쓰기로 기록"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._apply(conn, str(db), op, key, value, ttl)
+            conn.execute("INSERT INTO pending (db, op, key, value, ttl) VALUES (?, ?, ?, ?, ?)",
+                         (str(db), op, key, json.dumps(value), ttl))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._ensure_reconciler()
+
+    def has_pending(self, db):
+        """아직 Redis에 반영하지 않은 쓰기가 있으면 True (그동안의 새 쓰기도 순서를 지키도록 뒤에 쌓음)"""
+        return self._conn().execute("SELECT 1 FROM pending WHERE db = ? LIMIT 1", (str(db),)).fetchone() is not None
+
+    def stats(self):
+        conn = self._conn()
+        return {
+            "entries": conn.execute("SELECT COUNT(*) FROM kv").fetchone()[0],
+            "pending": conn.execute("SELECT COUNT(*) FROM pending").fetchone()[0],
+            "replayed": self.replayed,
+        }
+
+    @staticmethod
+    def _apply(conn, db, op, key, value, ttl):
+        if op == "delete":
+            conn.execute("DELETE FROM kv WHERE db = ? AND key = ?", (db, key))
+            return
+        if op in ("hset", "hsetnx"):
+            row = conn.execute("SELECT value FROM kv WHERE db = ? AND key = ?", (db, key)).fetchone()
+            current = json.loads(row[0]) if row else {}
+            if op == "hset":
+                current.update(value)
+            else:
+                for field, field_value in value.items():
+                    current.setdefault(field, field_value)
+            value = current
+        expires_at = time.time() + ttl if ttl else None
+        conn.execute("INSERT OR REPLACE INTO kv (db, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                     (db, key, json.dumps(value), expires_at))
+
+    def _reconcile_loop(self):
+        while True:
+            time.sleep(self.reconcile_interval)
+            for db, (redis_client, breaker) in list(self.targets.items()):
+                try:
+                    if self.has_pending(db) and breaker.allow():
+                        self._replay(db, redis_client, breaker)
+                except Exception as e:
+                    debug_print(f"Fallback reconcile error (db {db}): {e}")
+
+    def _replay(self, db, redis_client, breaker, batch_size=500):
+        """밀린 쓰기를 순서대로 Redis에 반영. 다른 프로세스와 중복 반영하지 않도록 쓰기 잠금을 잡고 처리"""
+        conn = self._conn()
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute("SELECT id, op, key, value, ttl FROM pending WHERE db = ? ORDER BY id LIMIT ?",
+                                    (db, batch_size)).fetchall()
+                if not rows:
+                    conn.execute("COMMIT")
+                    return
+                pipe = redis_client.pipeline(transaction=False)
+                for _, op, key, value, ttl in rows:
+                    value = json.loads(value)
+                    if op == "set":
+                        pipe.set(key, value, ex=ttl or None)
+                    elif op == "hset":
+                        pipe.hset(key, mapping=value)
+                    elif op == "hsetnx":
+                        for field, field_value in value.items():
+                            pipe.hsetnx(key, field, field_value)
+                    elif op == "delete":
+                        pipe.delete(key)
+                # 개별 명령 오류(잘못된 타입 등)는 재시도해도 같으므로 기록만 하고 넘어감
+                for result in pipe.execute(raise_on_error=False):
+                    if isinstance(result, Exception):
+                        debug_print(f"Fallback replay command error (db {db}): {result}")
+                conn.execute("DELETE FROM pending WHERE db = ? AND id <= ?", (db, rows[-1][0]))
+                conn.execute("COMMIT")
+            except (redis.ConnectionError, redis.TimeoutError) as e:
+                conn.execute("ROLLBACK")
+                breaker.record_failure()
+                debug_print(f"Fallback replay stopped, Redis unavailable (db {db}): {e}")
+                return
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            breaker.record_success()
+            self.replayed += len(rows)
+            debug_print(f"Replayed {len(rows)} buffered writes to Redis (db {db})")
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_fallback_store(path=fallback_store_path):
+    """경로별로 프로세스에서 공유하는 저장소. 경로가 비어 있으면 None"""
+    if not path:
+        return None
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = FallbackStore(path)
+        return store
@@ -0,0 +1,38 @@
+# gunicorn -c gunicorn.conf.py 'wsgi:create_app()'
+# 봇 모듈(config 등)은 마스터에서 import하지 않고 워커에서만 import합니다 (로그/작업 스레드는 fork 후 생성).
+import os
+import shutil
+import multiprocessing
+
+bind = f"0.0.0.0:{os.getenv('web_port', '8000')}"
+workers = int(os.getenv('web_concurrency', multiprocessing.cpu_count()))
+# Slack 요청 처리(ack)는 짧으므로 워커당 스레드로 동시 처리. 답변 스트림은 각 워커의 작업 풀에서 실행
+worker_class = "gthread"
+threads = int(os.getenv('gunicorn_threads', 8))
+preload_app = False
+keepalive = 5
+timeout = 30
+# 종료 시 worker_exit에서 진행 중인 답변을 기다리는 시간보다 길게
+graceful_timeout = float(os.getenv('shutdown_drain_timeout', 60)) + 10
+
+# 워커별 /metrics 값을 합산하기 위한 prometheus_client 다중 프로세스 디렉터리
+prometheus_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/dify_slack_bot_metrics')
+
+def on_starting(server):
+    shutil.rmtree(prometheus_dir, ignore_errors=True)
+    os.makedirs(prometheus_dir, exist_ok=True)
+
+def post_fork(server, worker):
+    from wsgi import reset_after_fork
+    reset_after_fork()
+
+def worker_exit(server, worker):
+    from wsgi import shutdown
+    shutdown()
+
+def child_exit(server, worker):
+    try:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+    except ImportError:
+        pass
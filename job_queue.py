@@ -0,0 +1,325 @@
+import os
+import time
+import zlib
+import socket
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import redis
+from config import *
+from utils import debug_print
+
+class JobQueue:
+    """Redis Streams 기반 대화 작업 큐.
+    작업은 (channel, thread_ts) 해시로 샤드 스트림에 고정되고, 샤드마다 임대(lease)를 가진 워커 하나만 읽습니다.
+    읽은 작업은 스레드 잠금을 얻어야 실행되므로 같은 스레드의 작업은 클러스터 전체에서 순서대로 하나씩 처리됩니다.
+    처리한 작업은 XACK 후 XDEL 하므로 스트림 길이가 곧 남은 작업(대기 + 미확인) 수입니다."""
+
+    def __init__(self, connection_pool, name=job_queue_name, shards=job_queue_shards, group="slack-workers"):
+        self.redis_client = redis.Redis(connection_pool=connection_pool)
+        self.name = name
+        self.shards = shards
+        self.group = group
+
+    def stream(self, shard):
+        return f"{self.name}:{shard}"
+
+    def lease_key(self, shard):
+        return f"{self.name}:{shard}:lease"
+
+    def thread_key(self, thread):
+        channel_id, thread_ts = thread
+        return f"{self.name}:thread:{channel_id}:{thread_ts}"
+
+    def shard_of(self, channel_id, thread_ts):
+        return zlib.crc32(f"{channel_id}:{thread_ts}".encode()) % self.shards
+
+    def enqueue(self, job):
+        """작업 등록 후 (샤드, 메시지 ID) 반환. job은 문자열 값의 dict"""
+        shard = self.shard_of(job['channel'], job['thread_ts'])
+        message_id = self.redis_client.xadd(self.stream(shard), job)
+        debug_print(f"Enqueued job {message_id} to shard {shard}")
+        return shard, message_id
+
+    def ensure_groups(self):
+        """모든 샤드 스트림과 컨슈머 그룹 생성 (이미 있으면 무시)"""
+        for shard in range(self.shards):
+            try:
+                self.redis_client.xgroup_create(self.stream(shard), self.group, id="0", mkstream=True)
+            except redis.ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+
+    def backlog(self):
+        """샤드별 남은 작업 수 (파이프라인 1회)"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        for shard in range(self.shards):
+            pipe.xlen(self.stream(shard))
+        return pipe.execute()
+
+    def acquire(self, shard, owner, ttl):
+        return bool(self.redis_client.set(self.lease_key(shard), owner, nx=True, px=int(ttl * 1000)))
+
+    def renew(self, shard, owner, ttl):
+        """임대 연장. 다른 워커에게 넘어갔으면 False"""
+        return self._if_owner(self.lease_key(shard), owner, lambda pipe, key: pipe.pexpire(key, int(ttl * 1000)))
+
+    def release(self, shard, owner):
+        return self._if_owner(self.lease_key(shard), owner, lambda pipe, key: pipe.delete(key))
+
+    def lock_thread(self, thread, token, ttl):
+        """스레드 잠금. 같은 스레드의 이전 작업이 (다른 워커에서라도) 실행 중이면 False"""
+        return bool(self.redis_client.set(self.thread_key(thread), token, nx=True, px=int(ttl * 1000)))
+
+    def renew_thread(self, thread, token, ttl):
+        return self._if_owner(self.thread_key(thread), token, lambda pipe, key: pipe.pexpire(key, int(ttl * 1000)))
+
+    def unlock_thread(self, thread, token):
+        return self._if_owner(self.thread_key(thread), token, lambda pipe, key: pipe.delete(key))
+
+    def _if_owner(self, key, owner, command):
+        # Lua 없이 WATCH/MULTI로 소유자 확인 후 실행
+        with self.redis_client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                if pipe.get(key) != owner:
+                    pipe.unwatch()
+                    return False
+                pipe.multi()
+                command(pipe, key)
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                return False
+
+    def claim_pending(self, shard, consumer, count=100):
+        """이전 소유 워커가 확인(XACK)하지 못한 작업을 가져옴 (워커 장애 시 재처리, 최소 한 번 전달)"""
+        result = self.redis_client.xautoclaim(
+            self.stream(shard), self.group, consumer, min_idle_time=0, start_id="0-0", count=count
+        )
+        return [(message_id, job) for message_id, job in result[1] if job]
+
+    def is_pending(self, shard, message_id):
+        """아직 처리되지 않은 작업인지 (처리한 작업은 XDEL 되므로 스트림에 없음)"""
+        return bool(self.redis_client.xrange(self.stream(shard), message_id, message_id, count=1))
+
+    def read(self, shard, consumer, count=1):
+        response = self.redis_client.xreadgroup(self.group, consumer, {self.stream(shard): ">"}, count=count)
+        return response[0][1] if response else []
+
+    def ack(self, shard, message_id):
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.xack(self.stream(shard), self.group, message_id)
+        pipe.xdel(self.stream(shard), message_id)
+        pipe.execute()
+
+class JobWorker:
+    """JobQueue 소비자. 작업이 있는 샤드의 임대를 얻어 작업을 읽고, 스레드(channel, thread_ts)별로 줄을 세워
+    서로 다른 스레드의 작업은 동시에 처리합니다. 각 스레드의 맨 앞 작업은 스레드 잠금을 얻고 아직 처리되지 않은
+    경우에만 실행하므로, 임대가 다른 워커로 넘어가 미확인 작업을 다시 가져가도 실행 중인 작업이 중복 실행되지 않습니다.
+    보유 중인 임대와 스레드 잠금은 백그라운드에서 주기적으로 연장합니다."""
+
+    def __init__(self, queue, handler, concurrency=worker_max_concurrency,
+                 lease_ttl=job_lease_ttl, poll_interval=job_poll_interval):
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = concurrency
+        self.lease_ttl = lease_ttl
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+
+        self.held = set()
+        self.waiting = {}           # 스레드 -> deque[(샤드, 메시지 ID, 작업)] (실행 대기, 맨 앞부터 실행)
+        self.running = {}           # 스레드 -> 스레드 잠금 토큰
+        self.known = {}             # 이 워커가 가진(대기 + 실행) 메시지 ID -> 샤드
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.wakeup = threading.Event()
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="job-worker")
+
+        self.processed = 0
+        self.failed = 0
+        self.reclaimed = 0
+
+    def run(self):
+        """stop()이 호출될 때까지 샤드를 확인하며 작업 처리 (블로킹)"""
+        self.queue.ensure_groups()
+        threading.Thread(target=self._heartbeat, name="job-lease-heartbeat", daemon=True).start()
+        debug_print(f"Job worker started: {self.worker_id} ({self.concurrency} threads, {self.queue.shards} shards)")
+        while not self.stopping.is_set():
+            self.wakeup.clear()
+            try:
+                self._dispatch()
+            except Exception as e:
+                debug_print(f"Job dispatch error: {e}")
+            # 작업이 끝나면 같은 스레드의 다음 작업을 바로 시작하도록 깨움
+            self.wakeup.wait(self.poll_interval)
+        # 진행 중인 작업은 끝까지 처리 후 종료 (시작하지 않은 작업은 임대를 넘겨받은 워커가 처리)
+        self.executor.shutdown(wait=True)
+        for shard in list(self.held):
+            self._release(shard)
+        debug_print(f"Job worker stopped: {self.stats()}")
+
+    def stop(self):
+        self.stopping.set()
+        self.wakeup.set()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "held_shards": len(self.held),
+                "running": len(self.running),
+                "waiting": sum(len(jobs) for jobs in self.waiting.values()),
+                "processed": self.processed,
+                "failed": self.failed,
+                "reclaimed": self.reclaimed,
+            }
+
+    def _dispatch(self):
+        for shard, length in enumerate(self.queue.backlog()):
+            with self.lock:
+                # 남은 작업이 모두 이 워커가 가진 것이면 읽을 것이 없음
+                mine = sum(1 for owner_shard in self.known.values() if owner_shard == shard)
+                free = self.concurrency - len(self.known)
+                held = shard in self.held
+            if length > mine and free > 0:
+                if not held:
+                    if not self.queue.acquire(shard, self.worker_id, self.lease_ttl):
+                        continue  # 다른 워커가 읽는 중
+                    with self.lock:
+                        self.held.add(shard)
+                    held = True
+                    # 이전 소유 워커가 확인(XACK)하지 못한 작업 (실행 중이면 스레드 잠금에서 기다림)
+                    jobs = self.queue.claim_pending(shard, self.worker_id)
+                    if jobs:
+                        with self.lock:
+                            self.reclaimed += len(jobs)
+                        debug_print(f"Reclaimed {len(jobs)} pending jobs from shard {shard}")
+                    free -= self._buffer(shard, jobs)
+                if free > 0:
+                    self._buffer(shard, self.queue.read(shard, self.worker_id, count=free))
+            # 실행을 기다리는 작업이 없으면 임대 반환 (실행 중인 작업은 스레드 잠금이 보호)
+            if held and not self._has_waiting(shard):
+                self._release(shard)
+        self._start_ready()
+
+    def _buffer(self, shard, jobs):
+        """읽은 작업을 스레드별 대기열에 추가하고 추가한 수를 반환"""
+        added = 0
+        with self.lock:
+            for message_id, job in jobs:
+                if message_id in self.known:
+                    continue
+                self.known[message_id] = shard
+                self.waiting.setdefault((job['channel'], job['thread_ts']), deque()).append((shard, message_id, job))
+                added += 1
+        return added
+
+    def _has_waiting(self, shard):
+        with self.lock:
+            return any(owner_shard == shard for jobs in self.waiting.values() for owner_shard, _, _ in jobs)
+
+    def _start_ready(self):
+        """실행 중이 아닌 스레드의 맨 앞 작업을 시작"""
+        with self.lock:
+            ready = [(thread, jobs[0]) for thread, jobs in self.waiting.items() if thread not in self.running]
+        for thread, (shard, message_id, job) in ready:
+            token = f"{self.worker_id}:{message_id}"
+            try:
+                if not self.queue.lock_thread(thread, token, self.lease_ttl):
+                    continue  # 같은 스레드의 이전 작업이 실행 중
+                pending = self.queue.is_pending(shard, message_id)
+            except Exception as e:
+                debug_print(f"Job thread lock error: {e}")
+                continue
+            with self.lock:
+                jobs = self.waiting.get(thread)
+                if not jobs or jobs[0][1] != message_id:
+                    pending = False  # 그 사이 임대를 잃어 대기열에서 빠짐
+                else:
+                    jobs.popleft()
+                    if not jobs:
+                        del self.waiting[thread]
+                if pending:
+                    self.running[thread] = token
+                else:
+                    self.known.pop(message_id, None)
+            if not pending:
+                # 다른 워커가 이미 처리한 작업
+                self._unlock(thread, token)
+                continue
+            self.executor.submit(self._run, thread, shard, message_id, job, token)
+
+    def _run(self, thread, shard, message_id, job, token):
+        started = time.monotonic()
+        try:
+            self.handler(job)
+            with self.lock:
+                self.processed += 1
+        except Exception as e:
+            # 핸들러 오류는 사용자에게 이미 안내되므로 재시도하지 않음 (장애로 중단된 작업만 재처리)
+            with self.lock:
+                self.failed += 1
+            debug_print(f"Job handler error: {e}")
+        debug_print(f"Job done in {time.monotonic() - started:.2f}s: {job.get('channel')}/{job.get('thread_ts')}")
+        try:
+            self.queue.ack(shard, message_id)
+        except Exception as e:
+            debug_print(f"Job ack error: {e}")
+        self._unlock(thread, token)
+        with self.lock:
+            self.running.pop(thread, None)
+            self.known.pop(message_id, None)
+        self.wakeup.set()
+
+    def _unlock(self, thread, token):
+        try:
+            self.queue.unlock_thread(thread, token)
+        except Exception as e:
+            debug_print(f"Job thread unlock error: {e}")
+
+    def _release(self, shard):
+        with self.lock:
+            self.held.discard(shard)
+        try:
+            self.queue.release(shard, self.worker_id)
+        except Exception as e:
+            debug_print(f"Job lease release error: {e}")
+
+    def _drop_waiting(self, shard):
+        """임대를 잃은 샤드의 대기 작업을 버림 (새 소유자가 미확인 작업을 이어서 처리)"""
+        with self.lock:
+            for thread, jobs in list(self.waiting.items()):
+                kept = deque()
+                for entry in jobs:
+                    if entry[0] == shard:
+                        self.known.pop(entry[1], None)
+                    else:
+                        kept.append(entry)
+                if kept:
+                    self.waiting[thread] = kept
+                else:
+                    del self.waiting[thread]
+
+    def _heartbeat(self):
+        while not self.stopping.wait(self.lease_ttl / 3):
+            with self.lock:
+                shards = list(self.held)
+                threads = list(self.running.items())
+            for shard in shards:
+                try:
+                    renewed = self.queue.renew(shard, self.worker_id, self.lease_ttl)
+                except Exception as e:
+                    debug_print(f"Job lease renew error: {e}")
+                    continue
+                if not renewed:
+                    debug_print(f"Lost lease for shard {shard}")
+                    with self.lock:
+                        self.held.discard(shard)
+                    self._drop_waiting(shard)
+            for thread, token in threads:
+                try:
+                    if not self.queue.renew_thread(thread, token, self.lease_ttl):
+                        debug_print(f"Lost thread lock for {thread}")
+                except Exception as e:
+                    debug_print(f"Job thread lock renew error: {e}")
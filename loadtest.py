@@ -0,0 +1,569 @@
+"""
+오프라인 부하 테스트
+
+    python loadtest.py                                   # 기본값: 초당 2건, 15초
+    python loadtest.py --rps 10 --duration 30 --threads 50
+    python loadtest.py --output base.json                # 결과 저장
+    python loadtest.py --baseline base.json              # 저장한 결과와 비교
+    python loadtest.py --ingress socket --baseline base.json   # Socket Mode와 HTTP 이벤트 처리 비교
+
+실제 Slack/Dify 대신 별도 프로세스에서 로컬 서버를 실행합니다.
+- 가짜 Dify: 첫 토큰 지연과 초당 토큰 수를 조절할 수 있는 SSE(message/message_end) 스트림
+- 가짜 Slack Web API: chat.update는 Tier 3(워크스페이스 분당 N회), chat.postMessage는 채널당 초당 1회 제한을 넘으면 429
+- 드라이버: 서명한 /slack/events 요청을 지정한 RPS로 SlackBotServer에 전송
+  (--ingress socket이면 가짜 Socket Mode 서버(aiohttp)가 SlackSocketModeServer의 WebSocket 연결로 전달하고 ack까지의 시간을 측정)
+Redis는 --redis-port를 주지 않으면 fakeredis를 사용합니다.
+"""
+import os
+import re
+import sys
+import json
+import time
+import hmac
+import uuid
+import hashlib
+import argparse
+import tempfile
+import threading
+import asyncio
+import itertools
+import multiprocessing
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DRIVER_THREAD_PREFIX = "loadtest-driver"
+END_MARKER = "[end]"
+
+class _Bucket:
+    """초당 rate개, 최대 capacity개 (가짜 Slack의 속도 제한)"""
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def take(self):
+        """토큰을 쓰면 0, 부족하면 Retry-After(초)"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+class _FakeSlack(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    options = None
+    lock = threading.Lock()
+    calls = []              # [시각, 메서드, 상태, ts, 텍스트]
+    buckets = {}
+    ts_counter = [0]
+
+    def _bucket(self, method, channel):
+        if method == "chat.update" and self.options.slack_rpm > 0:
+            key = (method, None)
+            factory = lambda: _Bucket(self.options.slack_rpm / 60, self.options.slack_burst)
+        elif method == "chat.postMessage" and self.options.slack_channel_rps > 0:
+            key = (method, channel)
+            factory = lambda: _Bucket(self.options.slack_channel_rps, 5)
+        else:
+            return None
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = factory()
+        return bucket
+
+    def do_GET(self):
+        if self.path == "/_loadtest/records":
+            with self.lock:
+                self._reply(200, {"calls": list(self.calls)})
+        else:
+            self._reply(404, {"ok": False})
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+        method = self.path.rsplit("/", 1)[-1]
+        try:
+            args = json.loads(raw) if raw.startswith("{") else dict(urllib.parse.parse_qsl(raw))
+        except ValueError:
+            args = {}
+        channel = args.get("channel")
+
+        with self.lock:
+            bucket = self._bucket(method, channel)
+            retry_after = bucket.take() if bucket is not None else 0
+            status = 429 if retry_after else 200
+            if method == "chat.postMessage" and not retry_after:
+                self.ts_counter[0] += 1
+                ts = f"{int(time.time())}.{self.ts_counter[0]:06d}"
+            else:
+                ts = args.get("ts")
+            self.calls.append([time.time(), method, status, ts, args.get("text") or ""])
+
+        if retry_after:
+            self._reply(429, {"ok": False, "error": "ratelimited"}, {"Retry-After": str(max(1, round(retry_after)))})
+        elif method == "apps.connections.open":
+            self._reply(200, {"ok": True, "url": f"ws://127.0.0.1:{self.options.socket_port}/link"})
+        elif method == "auth.test":
+            self._reply(200, {"ok": True, "user_id": "UBOT", "bot_id": "BBOT", "team_id": "T000", "user": "bot"})
+        elif method == "conversations.replies":
+            self._reply(200, {"ok": True, "messages": []})
+        else:
+            self._reply(200, {"ok": True, "channel": channel, "ts": ts, "message": {"text": args.get("text"), "ts": ts}})
+
+    def _reply(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class _FakeDify(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    options = None
+    lock = threading.Lock()
+    stats = {"streams": 0, "completed": 0, "stopped": 0, "in_flight": 0, "peak_in_flight": 0}
+    stopped = set()
+
+    def do_GET(self):
+        if self.path == "/_loadtest/records":
+            with self.lock:
+                body = json.dumps(self.stats).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def do_POST(self):
+        data = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path.endswith("/stop"):
+            with self.lock:
+                self.stats["stopped"] += 1
+                self.stopped.add(self.path.split("/")[-2])
+            body = b'{"result": "success"}'
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        self._stream(data)
+
+    def _stream(self, data):
+        options = self.options
+        task_id = uuid.uuid4().hex
+        conversation_id = data.get("conversation_id") or uuid.uuid4().hex
+        # 질문에 포함된 이벤트 ID를 답변 앞에 붙여 드라이버가 Slack 메시지와 이벤트를 연결
+        event_ids = " ".join(re.findall(r"\[q\d+\]", data.get("query", "")))
+        with self.lock:
+            self.stats["streams"] += 1
+            self.stats["in_flight"] += 1
+            self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self.stats["in_flight"])
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            time.sleep(options.first_token_latency)
+            for i in range(options.tokens):
+                if task_id in self.stopped:
+                    break
+                answer = f"{event_ids} " if i == 0 else f"tok{i} "
+                self._send_event({"event": "message", "task_id": task_id, "conversation_id": conversation_id, "answer": answer})
+                time.sleep(1 / options.token_rate)
+            else:
+                self._send_event({"event": "message", "task_id": task_id, "conversation_id": conversation_id, "answer": END_MARKER})
+                self._send_event({"event": "message_end", "task_id": task_id, "conversation_id": conversation_id,
+                                  "metadata": {"usage": {"total_tokens": options.tokens}}})
+                with self.lock:
+                    self.stats["completed"] += 1
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with self.lock:
+                self.stats["in_flight"] -= 1
+
+    def _send_event(self, payload):
+        chunk = f"data: {json.dumps(payload)}\n\n".encode()
+        self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+class _FakeSocketMode:
+    """가짜 Socket Mode 서버. /_loadtest/dispatch로 받은 이벤트를 열린 WebSocket 연결에 번갈아 보내고
+    envelope 전송부터 ack 수신까지의 시간을 기록"""
+    def __init__(self):
+        from aiohttp import web
+        self.web = web
+        self.connections = []
+        self.next_connection = itertools.count()
+        self.sent = {}      # envelope_id -> 전송 시각
+        self.acks = []
+        self.app = web.Application()
+        self.app.router.add_get("/link", self.handle_link)
+        self.app.router.add_post("/_loadtest/dispatch", self.handle_dispatch)
+        self.app.router.add_get("/_loadtest/records", self.handle_records)
+
+    def start(self):
+        """별도 스레드의 이벤트 루프에서 실행하고 포트 반환"""
+        loop = asyncio.new_event_loop()
+        runner = self.web.AppRunner(self.app)
+        loop.run_until_complete(runner.setup())
+        site = self.web.TCPSite(runner, "127.0.0.1", 0)
+        loop.run_until_complete(site.start())
+        threading.Thread(target=loop.run_forever, daemon=True).start()
+        return runner.addresses[0][1]
+
+    async def handle_link(self, request):
+        ws = self.web.WebSocketResponse(autoping=True)
+        await ws.prepare(request)
+        await ws.send_str(json.dumps({"type": "hello", "num_connections": len(self.connections) + 1,
+                                      "debug_info": {"host": "loadtest"}, "connection_info": {"app_id": "A000"}}))
+        self.connections.append(ws)
+        try:
+            async for message in ws:
+                envelope_id = json.loads(message.data).get("envelope_id")
+                sent_at = self.sent.pop(envelope_id, None)
+                if sent_at is not None:
+                    self.acks.append(time.time() - sent_at)
+        finally:
+            self.connections.remove(ws)
+        return ws
+
+    async def handle_dispatch(self, request):
+        if not self.connections:
+            return self.web.json_response({"ok": False}, status=503)
+        ws = self.connections[next(self.next_connection) % len(self.connections)]
+        envelope_id = uuid.uuid4().hex
+        self.sent[envelope_id] = time.time()
+        await ws.send_str(json.dumps({"envelope_id": envelope_id, "type": "events_api", "accepts_response_payload": False,
+                                      "retry_attempt": 0, "retry_reason": "", "payload": json.loads(await request.text())}))
+        return self.web.json_response({"ok": True})
+
+    async def handle_records(self, request):
+        return self.web.json_response({"connections": len(self.connections), "acks": list(self.acks)})
+
+def _serve_fakes(options, ports):
+    """가짜 Slack/Dify 서버 프로세스 (봇 프로세스의 스레드 수와 CPU 측정에 섞이지 않도록 분리)"""
+    options.socket_port = _FakeSocketMode().start() if options.ingress == "socket" else None
+    _FakeSlack.options = options
+    _FakeDify.options = options
+    servers = []
+    for handler in (_FakeSlack, _FakeDify):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    ports.put([server.server_port for server in servers] + [options.socket_port])
+    threading.Event().wait()
+
+def _configure_environment(options, slack_port, dify_port):
+    """봇 모듈(config)을 import하기 전에 환경 변수 설정"""
+    os.environ["slack_base_url"] = f"http://127.0.0.1:{slack_port}/api/"
+    os.environ["dify_base_url"] = f"http://127.0.0.1:{dify_port}"
+    os.environ.setdefault("dify_api_key", "loadtest")
+    os.environ.setdefault("slack_OAuth_token", "xoxb-loadtest")
+    os.environ.setdefault("slack_signing_secret", "loadtest-secret")
+    # 로그 기록 비용은 따로 측정(benchmark.py)하므로 기본은 끔
+    os.environ.setdefault("log_sample_rates", "slack_event=0,llm_response=0,llm_timing=0,api_status=0")
+    os.environ["redis_host"] = "127.0.0.1"
+    os.environ["redis_port"] = str(options.redis_port or 6379)
+    os.environ.setdefault("redis_conv_db", "15")
+    os.environ.setdefault("redis_user_db", "14")
+    # 이전 실행에서 남은 쓰기가 반영되지 않도록 실행마다 새 로컬 저장소
+    os.environ.setdefault("fallback_store_path", os.path.join(tempfile.mkdtemp(prefix="loadtest-"), "fallback.sqlite3"))
+
+def _install_fake_redis():
+    """db_handler의 공용 커넥션 풀을 fakeredis로 미리 채움"""
+    import redis
+    import fakeredis
+    import db_handler
+    from config import redis_host, redis_port, redis_conv_db, redis_user_db
+
+    server = fakeredis.FakeServer()
+    for db in {redis_conv_db, redis_user_db}:
+        key = (redis_host, str(redis_port), str(db))
+        db_handler._pools[key] = redis.ConnectionPool(
+            connection_class=fakeredis.FakeRedisConnection, server=server, db=int(db), decode_responses=True
+        )
+
+def _signed_headers(body, secret):
+    timestamp = str(int(time.time()))
+    basestring = f"v0:{timestamp}:{body}".encode("utf-8")
+    signature = "v0=" + hmac.new(secret.encode("utf-8"), basestring, hashlib.sha256).hexdigest()
+    return {
+        "X-Slack-Request-Timestamp": timestamp,
+        "X-Slack-Signature": signature,
+        "Content-Type": "application/json",
+    }
+
+def _event_body(index, options, thread_roots):
+    """index번째 이벤트: 앞쪽 --threads개는 새 스레드, 이후는 기존 스레드의 후속 질문"""
+    channel = f"C{index % options.channels:04d}"
+    ts = f"{int(time.time())}.{index:06d}"
+    event = {"type": "app_mention", "user": f"U{index % options.users:04d}", "channel": channel,
+             "text": f"<@UBOT> question [q{index}]", "ts": ts, "event_ts": ts, "client_msg_id": f"loadtest-{index}"}
+    slot = index % options.threads
+    if slot in thread_roots:
+        event["channel"], event["thread_ts"] = thread_roots[slot]
+    else:
+        thread_roots[slot] = (channel, ts)
+    return json.dumps({
+        "type": "event_callback",
+        "team_id": "T000",
+        "api_app_id": "A000",
+        "event": event,
+        "event_id": f"Ev{index:08d}",
+        "event_time": int(time.time()),
+    })
+
+class _ThreadSampler:
+    """봇 프로세스의 스레드 수 최대값 (드라이버 스레드 제외)"""
+    def __init__(self, interval=0.1):
+        self.peak = 0
+        self.running = True
+        self.thread = threading.Thread(target=self._run, args=(interval,), daemon=True)
+        self.thread.start()
+
+    def _run(self, interval):
+        while self.running:
+            count = sum(1 for t in threading.enumerate() if not t.name.startswith(DRIVER_THREAD_PREFIX)) - 1
+            self.peak = max(self.peak, count)
+            time.sleep(interval)
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        return self.peak
+
+def _start_bot_server():
+    """SlackBotServer(Flask)를 로컬 포트에서 실행"""
+    import logging
+    from werkzeug.serving import make_server
+    import slack_dify_bot
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    bot_server = slack_dify_bot.SlackBotServer()
+    http_server = make_server("127.0.0.1", 0, bot_server.app, threaded=True)
+    threading.Thread(target=http_server.serve_forever, name="loadtest-http", daemon=True).start()
+    return bot_server, f"http://127.0.0.1:{http_server.server_port}/slack/events"
+
+def _start_socket_mode_server(options, socket_port):
+    """SlackSocketModeServer를 가짜 Socket Mode 서버에 연결하고 모든 연결이 열릴 때까지 대기"""
+    import slack_socket_mode
+
+    socket_server = slack_socket_mode.SlackSocketModeServer(app_token="xapp-loadtest", connections=options.socket_connections)
+    socket_server.connect()
+    deadline = time.monotonic() + 10
+    while _fetch_records(socket_port)["connections"] < options.socket_connections and time.monotonic() < deadline:
+        time.sleep(0.1)
+    return socket_server, f"http://127.0.0.1:{socket_port}/_loadtest/dispatch"
+
+def _drive(options, url):
+    """--rps로 이벤트 전송. 이벤트별 전송 시각과 ack 지연/상태 반환
+    (Socket Mode는 가짜 서버에 전달만 요청하므로 ack 지연은 가짜 서버의 기록을 사용)"""
+    import requests
+    from config import slack_signing_secret
+
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=options.concurrency))
+    sent = {}
+    acks = []
+    lock = threading.Lock()
+
+    def post(index, body):
+        started = time.time()
+        try:
+            status = session.post(url, data=body, headers=_signed_headers(body, slack_signing_secret), timeout=10).status_code
+        except Exception:
+            status = None
+        with lock:
+            sent[f"[q{index}]"] = started
+            acks.append((time.time() - started, status))
+
+    total = int(options.rps * options.duration)
+    thread_roots = {}
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=options.concurrency, thread_name_prefix=DRIVER_THREAD_PREFIX) as executor:
+        for index in range(total):
+            delay = start + index / options.rps - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(post, index, _event_body(index, options, thread_roots))
+    return sent, acks, time.monotonic() - start
+
+def _fetch_records(port):
+    import requests
+    return requests.get(f"http://127.0.0.1:{port}/_loadtest/records", timeout=10).json()
+
+def _answer_times(calls):
+    """이벤트 ID별 (첫 토큰이 Slack에 표시된 시각, 최종 답변이 표시된 시각)"""
+    first_seen = {}
+    completed = {}
+    for at, method, status, ts, text in calls:
+        if status != 200 or method not in ("chat.update", "chat.postMessage"):
+            continue
+        # 답변 첫머리의 이벤트 ID (후속 질문이 합쳐졌으면 여러 개)
+        for event_id in re.findall(r"\[q\d+\]", text):
+            first_seen.setdefault(event_id, at)
+            if END_MARKER in text and "⏳" not in text:
+                completed.setdefault(event_id, at)
+    return first_seen, completed
+
+def _wait_for_answers(options, slack_port, sent):
+    deadline = time.monotonic() + options.drain_timeout
+    while True:
+        calls = _fetch_records(slack_port)["calls"]
+        _, completed = _answer_times(calls)
+        if len(completed) >= len(sent) or time.monotonic() > deadline:
+            return calls
+        time.sleep(0.5)
+
+def _percentiles(values):
+    from utils import LatencyTracker
+    tracker = LatencyTracker(window=max(1, len(values)))
+    for value in values:
+        tracker.record(value)
+    return {name: round(value, 4) for name, value in tracker.percentiles(50, 95, 99).items()}
+
+def run(options):
+    ports = multiprocessing.Queue()
+    fakes = multiprocessing.Process(target=_serve_fakes, args=(options, ports), daemon=True)
+    fakes.start()
+    slack_port, dify_port, socket_port = ports.get(timeout=10)
+
+    _configure_environment(options, slack_port, dify_port)
+    if not options.redis_port:
+        _install_fake_redis()
+    if options.ingress == "socket":
+        bot_server, url = _start_socket_mode_server(options, socket_port)
+    else:
+        bot_server, url = _start_bot_server()
+
+    sampler = _ThreadSampler()
+    sent, acks, send_elapsed = _drive(options, url)
+    calls = _wait_for_answers(options, slack_port, sent)
+    peak_threads = sampler.stop()
+    dify = _fetch_records(dify_port)
+    ok_acks = [latency for latency, status in acks if status == 200]
+    if options.ingress == "socket":
+        ok_acks = _fetch_records(socket_port)["acks"]
+    fakes.terminate()
+
+    first_seen, completed = _answer_times(calls)
+    api_calls = [call for call in calls if call[1] not in ("auth.test", "apps.connections.open")]
+    by_method = {}
+    for call in api_calls:
+        by_method[call[1]] = by_method.get(call[1], 0) + 1
+
+    return {
+        "options": {name: getattr(options, name) for name in ("ingress", "rps", "duration", "threads", "channels", "users",
+                                                                "tokens", "token_rate", "first_token_latency", "slack_rpm")},
+        "events_sent": len(sent),
+        "events_per_second": round(len(ok_acks) / send_elapsed, 2),
+        "ack_errors": len(acks) - len(ok_acks),
+        "ack_latency": _percentiles(ok_acks),
+        "answers_completed": len(completed),
+        "first_token_latency": _percentiles([first_seen[i] - sent[i] for i in first_seen if i in sent]),
+        "answer_latency": _percentiles([completed[i] - sent[i] for i in completed if i in sent]),
+        "slack_calls": len(api_calls),
+        "slack_calls_by_method": by_method,
+        "slack_rate_limited": sum(1 for call in api_calls if call[2] == 429),
+        "slack_calls_per_answer": round(len(api_calls) / len(completed), 2) if completed else None,
+        "dify_streams": dify["streams"],
+        "dify_peak_streams": dify["peak_in_flight"],
+        "peak_threads": peak_threads,
+        "worker_pool": bot_server.bot.worker_pool.stats(),
+    }
+
+def print_report(result, baseline=None):
+    rows = [
+        ("events/s", "events_per_second", None),
+        ("ack errors", "ack_errors", None),
+        ("ack p50 (ms)", "ack_latency", "p50"),
+        ("ack p99 (ms)", "ack_latency", "p99"),
+        ("answers completed", "answers_completed", None),
+        ("first token p50 (s)", "first_token_latency", "p50"),
+        ("first token p95 (s)", "first_token_latency", "p95"),
+        ("answer p50 (s)", "answer_latency", "p50"),
+        ("answer p95 (s)", "answer_latency", "p95"),
+        ("answer p99 (s)", "answer_latency", "p99"),
+        ("slack calls", "slack_calls", None),
+        ("slack calls / answer", "slack_calls_per_answer", None),
+        ("slack 429s", "slack_rate_limited", None),
+        ("dify streams", "dify_streams", None),
+        ("dify peak streams", "dify_peak_streams", None),
+        ("peak threads", "peak_threads", None),
+    ]
+
+    def value_of(data, key, sub):
+        value = data.get(key)
+        if sub is not None:
+            value = (value or {}).get(sub)
+            if value is not None and key == "ack_latency":
+                value = value * 1000
+        return value
+
+    print(f"events sent: {result['events_sent']}, options: {result['options']}")
+    header = f"{'metric':<24} {'result':>12}"
+    if baseline:
+        header += f" {'baseline':>12} {'change':>9}"
+    print(header)
+    for label, key, sub in rows:
+        value = value_of(result, key, sub)
+        line = f"{label:<24} {'-' if value is None else round(value, 3):>12}"
+        if baseline:
+            base = value_of(baseline, key, sub)
+            change = f"{(value - base) / base * 100:+.1f}%" if value is not None and base else "-"
+            line += f" {'-' if base is None else round(base, 3):>12} {change:>9}"
+        print(line)
+    print(f"slack calls by method: {result['slack_calls_by_method']}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Dify Slack 봇 오프라인 부하 테스트")
+    parser.add_argument("--ingress", choices=("http", "socket"), default="http", help="이벤트 수신 방식 (HTTP 또는 Socket Mode)")
+    parser.add_argument("--socket-connections", type=int, default=2, help="Socket Mode 연결 수")
+    parser.add_argument("--rps", type=float, default=2.0, help="초당 전송할 이벤트 수")
+    parser.add_argument("--duration", type=float, default=15.0, help="전송 시간(초)")
+    parser.add_argument("--threads", type=int, default=20, help="Slack 스레드 수 (이후 이벤트는 기존 스레드의 후속 질문)")
+    parser.add_argument("--channels", type=int, default=10)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=32, help="드라이버 동시 요청 수")
+    parser.add_argument("--tokens", type=int, default=30, help="답변당 토큰 수")
+    parser.add_argument("--token-rate", type=float, default=30.0, help="가짜 Dify의 초당 토큰 수")
+    parser.add_argument("--first-token-latency", type=float, default=0.5, help="가짜 Dify의 첫 토큰 지연(초)")
+    parser.add_argument("--slack-rpm", type=float, default=50, help="chat.update 분당 한도 (Tier 3, 0이면 제한 없음)")
+    parser.add_argument("--slack-burst", type=int, default=50, help="chat.update 순간 허용량")
+    parser.add_argument("--slack-channel-rps", type=float, default=1.0, help="chat.postMessage 채널당 초당 한도 (0이면 제한 없음)")
+    parser.add_argument("--redis-port", type=int, default=None, help="실제 redis-server 포트 (없으면 fakeredis)")
+    parser.add_argument("--drain-timeout", type=float, default=120.0, help="전송 후 답변 완료를 기다리는 최대 시간(초)")
+    parser.add_argument("--output", help="결과를 JSON으로 저장")
+    parser.add_argument("--baseline", help="비교할 이전 결과 JSON")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    options = parse_args()
+    result = run(options)
+    baseline = None
+    if options.baseline:
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(result, f, indent=2)
+    # 봇의 백그라운드 스레드(스케줄러 등)를 기다리지 않고 종료
+    sys.stdout.flush()
+    os._exit(0)
@@ -1,8 +1,11 @@
 import logging
-from logging.handlers import TimedRotatingFileHandler
+from logging.handlers import TimedRotatingFileHandler, QueueHandler, QueueListener
 import json
 import os
 import sys
+import queue
+import atexit
+import random
 from datetime import datetime
 
 class CenteredLevelFormatter(logging.Formatter):
@@ -21,12 +24,66 @@ class CenteredLevelFormatter(logging.Formatter):
 
         return " | ".join(centered_parts)
 
+class JsonLinesFormatter(logging.Formatter):
+    """한 줄에 JSON 하나 (로그 수집기에서 파싱하기 쉬운 형식). 구조화된 값은 extra의 category/data로 전달"""
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "file": f"{record.filename}:{record.lineno}",
+            "func": record.funcName,
+        }
+        category = getattr(record, "category", None)
+        if category:
+            entry["category"] = category
+        data = getattr(record, "data", None)
+        if data is not None:
+            entry["data"] = data
+        else:
+            entry["message"] = record.getMessage()
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class _LazyJson:
+    """로그 메시지의 JSON 직렬화를 실제로 포맷할 때(비동기 모드에서는 기록 스레드)까지 미룸"""
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __str__(self):
+        return json.dumps(self.data, ensure_ascii=False, default=str)
+
+class _DeferredQueueHandler(QueueHandler):
+    """기본 QueueHandler는 큐에 넣기 전에 호출 스레드에서 메시지를 포맷하므로, 같은 프로세스 큐에서는 레코드를 그대로 전달"""
+    def prepare(self, record):
+        return record
+
+def _parse_sample_rates(value):
+    """"llm_response=0.1,slack_event=0.5" → {"llm_response": 0.1, "slack_event": 0.5}"""
+    rates = {}
+    for item in (value or "").split(","):
+        name, _, rate = item.partition("=")
+        if name.strip() and rate.strip():
+            rates[name.strip()] = float(rate)
+    return rates
+
 class CustomLogger:
+    """log_async=True(기본)면 요청/스트림 스레드는 큐에 넣기만 하고 포맷과 파일 쓰기는 QueueListener 스레드에서 처리합니다.
+    log_format=json이면 JSON lines로 기록하며, log_sample_rates로 카테고리별 기록 비율을 정합니다(오류는 항상 기록)."""
     def __init__(self, log_file_prefix):
         self.logger = logging.getLogger("DifySlackBotLogger")
         self.logger.setLevel(logging.INFO)
+        self.sample_rates = _parse_sample_rates(os.getenv("log_sample_rates", ""))
+        self.json_format = os.getenv("log_format", "text").lower() == "json"
+        
+        # 여러 번 생성해도 핸들러가 중복으로 붙지 않도록 한 번만 설정
+        if getattr(self.logger, "_dify_configured", False):
+            return
+        self.logger._dify_configured = True
 
-        save_dir = './logs'
+        save_dir = os.getenv('log_dir', './logs')
         os.makedirs(save_dir, exist_ok=True)
         
         backup_limit = int(os.getenv("backup_limit", 24))
@@ -34,8 +91,11 @@ class CustomLogger:
         if not os.path.exists(save_dir):
             os.mkdir(save_dir)
 
-        log_formatter = CenteredLevelFormatter(
-            '%(asctime)s | %(levelname)s | %(filename)s :%(lineno)d | %(funcName)s |  %(message)s')
+        if self.json_format:
+            log_formatter = JsonLinesFormatter()
+        else:
+            log_formatter = CenteredLevelFormatter(
+                '%(asctime)s | %(levelname)s | %(filename)s :%(lineno)d | %(funcName)s |  %(message)s')
 
         handler = TimedRotatingFileHandler(
             filename=os.path.join(save_dir, f"{log_file_prefix}.log"),
@@ -49,8 +109,43 @@ class CustomLogger:
         console_handler = logging.StreamHandler(sys.stdout)
         console_handler.setFormatter(log_formatter)
 
-        self.logger.addHandler(handler)
-        self.logger.addHandler(console_handler)
+        if os.getenv("log_async", "True").lower() in ('true', '1', 't'):
+            log_queue = queue.SimpleQueue()
+            listener = QueueListener(log_queue, handler, console_handler, respect_handler_level=True)
+            listener.start()
+            # 종료 시 남은 기록을 모두 쓴 뒤 정지
+            atexit.register(listener.stop)
+            self.logger._dify_listener = listener
+            self.logger._dify_listener_pid = os.getpid()
+            self.logger.addHandler(_DeferredQueueHandler(log_queue))
+        else:
+            self.logger.addHandler(handler)
+            self.logger.addHandler(console_handler)
+    
+    def reset_after_fork(self):
+        """fork된 자식 프로세스에는 부모의 QueueListener 스레드가 없으므로 같은 큐로 새로 시작"""
+        listener = getattr(self.logger, "_dify_listener", None)
+        if listener is None or self.logger._dify_listener_pid == os.getpid():
+            return
+        listener = QueueListener(listener.queue, *listener.handlers, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+        self.logger._dify_listener = listener
+        self.logger._dify_listener_pid = os.getpid()
+    
+    def _sampled(self, category):
+        rate = self.sample_rates.get(category, 1.0)
+        return rate >= 1.0 or random.random() < rate
+    
+    def _log_data(self, category, title, data, level=logging.INFO):
+        """구조화된 로그. text 형식은 "title: {json}", json 형식은 data 필드로 기록 (직렬화는 포맷 시점)"""
+        if level < logging.WARNING and not self._sampled(category):
+            return
+        if not self.logger.isEnabledFor(level):
+            return
+        # stacklevel=2: 기존처럼 log_* 메서드 이름으로 기록
+        self.logger.log(level, "%s: %s", title, _LazyJson(data),
+                        extra={"category": category, "data": data}, stacklevel=2)
 
     def log_slack_event(self, event_data):
         formatted_event = {
@@ -66,7 +161,7 @@ class CustomLogger:
             "event_time": event_data.get('event_time'),
             "text": event_data['event'].get('text'),
         }
-        self.logger.info(f"Slack chat: {json.dumps(formatted_event, ensure_ascii=False)}")
+        self._log_data("slack_event", "Slack chat", formatted_event)
 
     def log_llm_response(self, response_data):
         try:
@@ -79,17 +174,28 @@ class CustomLogger:
                 "mode": response_data.get('mode'),
                 "answer": response_data.get('answer'),
             }
-            self.logger.info(f"LLM BOT: {json.dumps(formatted_response, ensure_ascii=False)}")
+            self._log_data("llm_response", "LLM BOT", formatted_response)
         except Exception as e:
             self.logger.error(f"Error in log_llm_response: {e}")
     
     
+    def log_llm_timing(self, channel_id, ts, time_to_first_token, time_to_complete):
+        formatted_timing = {
+            "channel": channel_id,
+            "ts": ts,
+            "time_to_first_token": round(time_to_first_token, 3) if time_to_first_token is not None else None,
+            "time_to_complete": round(time_to_complete, 3),
+        }
+        self._log_data("llm_timing", "LLM timing", formatted_timing)
+    
     def log_api_status(self, end_point, method, response, error=None):
         
         if error:
-            self.logger.error(f"{end_point} {method} {response.status_code} - {error}")
-        else:
-            self.logger.info(f"{end_point} {method} {response.status_code}")
+            self.logger.error("%s %s %s - %s", end_point, method, response.status_code, error,
+                              extra={"category": "api_status"})
+        elif self._sampled("api_status"):
+            self.logger.info("%s %s %s", end_point, method, response.status_code,
+                             extra={"category": "api_status"})
 
 # Usage example
 if __name__ == "__main__":
@@ -0,0 +1,130 @@
+import os
+import time
+import contextlib
+from config import *
+from utils import debug_print
+
+# prometheus_client / opentelemetry는 선택 의존성: 설치되어 있지 않으면 모든 측정이 아무 일도 하지 않습니다.
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, CONTENT_TYPE_LATEST
+except ImportError:
+    prometheus_client = None
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+try:
+    from opentelemetry import trace, propagate
+except ImportError:
+    trace = None
+
+class _NoopMetric:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def time(self):
+        return contextlib.nullcontext()
+
+def _metric(kind, name, documentation, labelnames=(), **kwargs):
+    if prometheus_client is None or not metrics_enabled:
+        return _NoopMetric()
+    if kind == "gauge" and os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        kwargs.setdefault("multiprocess_mode", "livesum")
+    cls = {"counter": Counter, "gauge": Gauge, "histogram": Histogram}[kind]
+    return cls(name, documentation, labelnames, **kwargs)
+
+# 초 단위 구간: 수 ms(Redis) ~ 수 분(LLM 응답 완료)
+_FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+_SLOW_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120, 300)
+
+SLACK_ACK_SECONDS = _metric("histogram", "slack_ack_seconds",
+                            "Time to acknowledge a Slack request", buckets=_FAST_BUCKETS)
+REDIS_SECONDS = _metric("histogram", "redis_seconds",
+                        "Redis call latency", ("operation",), buckets=_FAST_BUCKETS)
+DIFY_FIRST_TOKEN_SECONDS = _metric("histogram", "dify_first_token_seconds",
+                                   "Time from request to first Dify answer token", buckets=_SLOW_BUCKETS)
+DIFY_COMPLETE_SECONDS = _metric("histogram", "dify_complete_seconds",
+                                "Time from request to final Slack update", buckets=_SLOW_BUCKETS)
+DIFY_STREAMS_IN_FLIGHT = _metric("gauge", "dify_streams_in_flight",
+                                 "Dify streams currently being relayed to Slack")
+DIFY_STREAMS_TOTAL = _metric("counter", "dify_streams",
+                             "Finished Dify streams by outcome", ("outcome",))
+SLACK_API_SECONDS = _metric("histogram", "slack_api_seconds",
+                            "Slack Web API call latency", ("method",), buckets=_FAST_BUCKETS)
+SLACK_RATE_LIMITED_TOTAL = _metric("counter", "slack_rate_limited",
+                                   "Slack API 429 responses", ("method",))
+SLACK_RETRIES_TOTAL = _metric("counter", "slack_retries",
+                              "Slack API retries", ("method",))
+REDIS_FALLBACK_TOTAL = _metric("counter", "redis_fallback",
+                               "Redis calls served by the local fallback store", ("operation",))
+REDIS_DROPPED_WRITES_TOTAL = _metric("counter", "redis_dropped_writes",
+                                     "Redis writes lost during an outage because no fallback store is configured", ("operation",))
+REDIS_CIRCUIT_OPEN = _metric("gauge", "redis_circuit_open",
+                             "Processes whose Redis circuit breaker is open")
+WORKER_POOL_RUNNING = _metric("gauge", "worker_pool_running",
+                              "Worker pool jobs currently running", ("pool",))
+WORKER_POOL_QUEUED = _metric("gauge", "worker_pool_queued",
+                             "Worker pool jobs waiting for a free worker", ("pool",))
+WORKER_POOL_REJECTED_TOTAL = _metric("counter", "worker_pool_rejected",
+                                     "Worker pool jobs rejected because the queue was full", ("pool",))
+WORKER_POOL_WAIT_SECONDS = _metric("histogram", "worker_pool_wait_seconds",
+                                   "Time a worker pool job waited in the queue", ("pool",), buckets=_FAST_BUCKETS + (10, 30, 60))
+THREAD_SCHEDULER_ACTIVE = _metric("gauge", "thread_scheduler_active_threads",
+                                  "Slack threads with a request running or queued")
+THREAD_SCHEDULER_FOLLOW_UPS = _metric("gauge", "thread_scheduler_follow_ups",
+                                      "Follow-up messages waiting for their thread to finish")
+THREAD_SCHEDULER_REJECTED_TOTAL = _metric("counter", "thread_scheduler_rejected",
+                                          "Follow-up messages rejected because their thread was busy")
+
+def observe_stream(started_at, first_token_at, outcome):
+    """Dify 스트림 하나의 첫 토큰/완료 시간(time.monotonic 기준)과 결과(complete/error/cancelled/incomplete) 기록"""
+    if first_token_at is not None:
+        DIFY_FIRST_TOKEN_SECONDS.observe(first_token_at - started_at)
+    DIFY_COMPLETE_SECONDS.observe(time.monotonic() - started_at)
+    DIFY_STREAMS_TOTAL.labels(outcome).inc()
+
+def render_metrics():
+    """/metrics 응답 본문. gunicorn 등 다중 프로세스면 PROMETHEUS_MULTIPROC_DIR의 값을 합산"""
+    if prometheus_client is None or not metrics_enabled:
+        return b"# metrics disabled\n"
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return prometheus_client.generate_latest(registry)
+    return prometheus_client.generate_latest()
+
+_tracer = trace.get_tracer("dify_slack_bot") if trace is not None and otel_enabled else None
+
+def inject_trace():
+    """현재 span의 W3C traceparent (다른 스레드/프로세스로 넘길 때 사용). 추적하지 않으면 빈 문자열"""
+    if _tracer is None:
+        return ""
+    carrier = {}
+    propagate.inject(carrier)
+    return carrier.get("traceparent", "")
+
+@contextlib.contextmanager
+def span(name, traceparent=None, **attributes):
+    """OpenTelemetry span. traceparent가 주어지면 그 trace에 이어서 기록 (이벤트 하나 = trace 하나)"""
+    if _tracer is None:
+        yield None
+        return
+    context = propagate.extract({"traceparent": traceparent}) if traceparent else None
+    try:
+        with _tracer.start_as_current_span(name, context=context, attributes=attributes) as current:
+            yield current
+    except Exception as e:
+        debug_print(f"Tracing error in {name}: {e}")
+        raise
@@ -0,0 +1,260 @@
+import os
+import re
+import json
+import time
+import zlib
+import fcntl
+import atexit
+import tempfile
+import importlib
+import threading
+import numpy as np
+from config import *
+from utils import debug_print
+from answer_cache import AnswerCache
+
+class HashingEmbedder:
+    """오프라인 기본 임베딩: 단어와 문자 n-gram을 해시해 dim 차원에 누적 (feature hashing).
+    한국어처럼 띄어쓰기와 조사가 달라지는 문장도 문자 n-gram이 겹치면 유사도가 높게 나옵니다."""
+    def __init__(self, dim=256, ngram_range=(2, 3)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+
+    def __call__(self, text):
+        text = AnswerCache.normalize(text)
+        features = text.split()
+        compact = text.replace(" ", "")
+        for n in range(self.ngram_range[0], self.ngram_range[1] + 1):
+            features.extend(compact[i:i + n] for i in range(len(compact) - n + 1))
+
+        # crc32는 프로세스와 무관하게 같은 값이므로 저장한 인덱스를 재시작 후에도 사용 가능
+        hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in features), dtype=np.uint32, count=len(features))
+        signs = np.where(hashes & 0x80000000, 1.0, -1.0).astype(np.float32)
+        vector = np.zeros(self.dim, dtype=np.float32)
+        np.add.at(vector, hashes % self.dim, signs)
+        return vector
+
+# 질문의 대상을 바꾸지 않는 영어 기능어 (한 글자 단어는 팀/등급 이름일 수 있으므로 제외)
+STOPWORDS = frozenset("""
+about an and are can could do does for from give how in is it me my of on or please show tell that the
+this to us was what whats when where which who why with would you your
+""".split())
+
+def key_terms(text):
+    """숫자와 영문 단어 중 기능어가 아닌 것 (팀 A/B, 1번/2번 서버처럼 대상만 다른 질문 구분용)"""
+    return frozenset(t for t in re.findall(r"[a-z0-9]+", AnswerCache.normalize(text)) if t not in STOPWORDS)
+
+def load_embedder(path=semantic_cache_embedder, dim=semantic_cache_dim):
+    """"모듈:함수" 형식의 임베딩 함수를 불러오고, 없거나 실패하면 HashingEmbedder 사용"""
+    if path:
+        try:
+            module_name, _, func_name = path.partition(":")
+            return getattr(importlib.import_module(module_name), func_name)
+        except Exception as e:
+            debug_print(f"Failed to load embedder {path}, falling back to hashing: {e}")
+    return HashingEmbedder(dim)
+
+class SemanticCache:
+    """비슷한 첫 질문에 대한 답변 캐시. 정규화한 질문 벡터를 NumPy 행렬에 보관하고
+    내적(코사인 유사도)이 threshold 이상이면서 숫자/영문 핵심 단어(key_terms)가 같으면 저장된 답변을 반환합니다.
+    같은 모델/프롬프트 범위(scope) 안에서만 비교하며, 가득 차면 만료 항목 → 가장 오래 쓰지 않은 항목 순으로 교체합니다."""
+
+    def __init__(self, embedder=None, dim=semantic_cache_dim, maxsize=semantic_cache_size,
+                 ttl=semantic_cache_ttl, threshold=semantic_cache_threshold, path=semantic_cache_path):
+        self.embedder = embedder or load_embedder(dim=dim)
+        self.dim = dim
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self.path = path
+
+        self.lock = threading.Lock()
+        self.vectors = np.zeros((maxsize, dim), dtype=np.float32)
+        self.scopes = np.zeros(maxsize, dtype=np.int64)
+        self.created_at = np.zeros(maxsize, dtype=np.float64)
+        self.last_used = np.zeros(maxsize, dtype=np.float64)
+        self.entries = [None] * maxsize     # (질문, 답변, 토큰 수)
+        self.size = 0
+        self.dirty = False
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.tokens_saved = 0
+
+        if self.path:
+            self.load()
+            atexit.register(self.save)
+            threading.Thread(target=self._autosave, name="semantic-cache-save", daemon=True).start()
+
+    @staticmethod
+    def scope_of(model, prompt):
+        return zlib.crc32(f"{AnswerCache.normalize(model)}\x1f{AnswerCache.normalize(prompt)}".encode("utf-8"))
+
+    def embed(self, text):
+        vector = np.asarray(self.embedder(text), dtype=np.float32).reshape(-1)
+        if vector.shape[0] != self.dim:
+            raise ValueError(f"embedding dim {vector.shape[0]} != {self.dim}")
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, scope, query):
+        """(답변, 유사도) 또는 None"""
+        vector = self.embed(query)
+        now = time.time()
+        with self.lock:
+            if self.size:
+                similarities = self.vectors[:self.size] @ vector
+                # 임계값을 넘는 후보(대개 몇 개)만 범위/만료 확인
+                candidates = np.flatnonzero(similarities >= self.threshold)
+                candidates = candidates[(self.scopes[candidates] == scope) & (self.created_at[candidates] > now - self.ttl)]
+                terms = key_terms(query) if candidates.size else None
+                # 유사도가 높아도 대상(숫자, 이름)이 다르면 다른 질문으로 보고 다음 후보 확인
+                for best in candidates[np.argsort(similarities[candidates])[::-1]]:
+                    question, answer, tokens = self.entries[best]
+                    if key_terms(question) != terms:
+                        continue
+                    self.last_used[best] = now
+                    self.hits += 1
+                    self.tokens_saved += tokens
+                    return answer, float(similarities[best])
+            self.misses += 1
+            return None
+
+    def add(self, scope, query, answer, tokens=0):
+        if not answer:
+            return
+        vector = self.embed(query)
+        now = time.time()
+        with self.lock:
+            if self.size < self.maxsize:
+                slot = self.size
+                self.size += 1
+            else:
+                slot = self._victim(now)
+                self.evictions += 1
+            self.vectors[slot] = vector
+            self.scopes[slot] = scope
+            self.created_at[slot] = now
+            self.last_used[slot] = now
+            self.entries[slot] = (query, answer, tokens or 0)
+            self.dirty = True
+
+    def _victim(self, now):
+        expired = np.flatnonzero(self.created_at[:self.size] <= now - self.ttl)
+        if expired.size:
+            return int(expired[0])
+        return int(np.argmin(self.last_used[:self.size]))
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": self.size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "tokens_saved": self.tokens_saved,
+            }
+
+    def save(self, path=None):
+        """만료되지 않은 항목을 npz로 저장. 여러 프로세스(gunicorn 워커)가 같은 파일을 쓰므로
+        잠금 파일로 순서를 정한 뒤 파일에 있던 항목과 합쳐 프로세스별 임시 파일에 쓰고 교체합니다."""
+        path = path or self.path
+        if not path:
+            return
+        with self.lock:
+            if not self.dirty and path == self.path:
+                return
+            now = time.time()
+            keep = np.flatnonzero(self.created_at[:self.size] > now - self.ttl)
+            mine = {
+                "vectors": self.vectors[keep],
+                "scopes": self.scopes[keep],
+                "created_at": self.created_at[keep],
+                "entries": [self.entries[i] for i in keep],
+            }
+            self.dirty = False
+        tmp_path = None
+        try:
+            with open(f"{path}.lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                data = self._merge(mine, self._read(path), now)
+                fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp",
+                                                dir=os.path.dirname(os.path.abspath(path)))
+                with os.fdopen(fd, "wb") as f:
+                    np.savez(f, vectors=data["vectors"], scopes=data["scopes"], created_at=data["created_at"],
+                             entries=np.array(json.dumps(data["entries"], ensure_ascii=False)))
+                os.replace(tmp_path, path)
+                tmp_path = None
+            debug_print(f"Saved semantic cache: {len(data['entries'])} entries to {path}")
+        except Exception as e:
+            debug_print(f"Semantic cache save error: {e}")
+            self.dirty = True
+        finally:
+            if tmp_path:
+                os.unlink(tmp_path)
+
+    def _read(self, path):
+        """저장된 항목 (vectors, scopes, created_at, entries). 파일이 없거나 차원이 다르면 None"""
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            if data["vectors"].shape[1] != self.dim:
+                debug_print(f"Semantic cache dim mismatch, ignoring {path}")
+                return None
+            return {
+                "vectors": data["vectors"],
+                "scopes": data["scopes"],
+                "created_at": data["created_at"],
+                "entries": [tuple(entry) for entry in json.loads(str(data["entries"]))],
+            }
+
+    def _merge(self, mine, stored, now):
+        """두 항목 집합을 합침: 같은 범위의 같은 질문은 최신 항목만, 만료 항목 제외, 최근 maxsize개 유지"""
+        if stored is None:
+            return mine
+        created_at = np.concatenate([mine["created_at"], stored["created_at"]])
+        entries = mine["entries"] + stored["entries"]
+        scopes = np.concatenate([mine["scopes"], stored["scopes"]])
+        latest = {}
+        for index in np.argsort(created_at)[::-1]:
+            if created_at[index] <= now - self.ttl:
+                break
+            latest.setdefault((int(scopes[index]), entries[index][0]), index)
+        order = np.array(sorted(latest.values(), key=lambda index: -created_at[index])[:self.maxsize], dtype=np.int64)
+        return {
+            "vectors": np.concatenate([mine["vectors"], stored["vectors"]])[order],
+            "scopes": scopes[order],
+            "created_at": created_at[order],
+            "entries": [entries[index] for index in order],
+        }
+
+    def load(self, path=None):
+        path = path or self.path
+        if not path:
+            return
+        try:
+            data = self._read(path)
+            if data is None:
+                return
+            # 최근 항목을 우선 유지
+            count = min(len(data["entries"]), self.maxsize)
+            order = np.argsort(data["created_at"])[::-1][:count]
+            with self.lock:
+                self.vectors[:count] = data["vectors"][order]
+                self.scopes[:count] = data["scopes"][order]
+                self.created_at[:count] = data["created_at"][order]
+                self.last_used[:count] = data["created_at"][order]
+                for slot, index in enumerate(order):
+                    self.entries[slot] = data["entries"][index]
+                self.size = count
+            debug_print(f"Loaded semantic cache: {count} entries from {path}")
+        except Exception as e:
+            debug_print(f"Semantic cache load error: {e}")
+
+    def _autosave(self):
+        while True:
+            time.sleep(semantic_cache_save_interval)
+            self.save()
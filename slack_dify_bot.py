@@ -3,19 +3,31 @@ import re
 import json
 import time
 import threading
-from flask import Flask, request, g
+from flask import Flask, request, g, Response
 from slack_bolt import App
 from slack_bolt.adapter.flask import SlackRequestHandler
+from slack_sdk import WebClient
 
 from config import *
-from utils import debug_print, logger
-from dify_process import DifyClient
+from utils import debug_print, logger, LatencyTracker, run_checks
+from dify_process import DifyClient, http_pool_stats, abort_stream
 from slack_process import SlackProcess
-from db_handler import ConversationDB, UserDB
+from slack_updater import SlackUpdateScheduler
+from slack_renderer import StreamRenderer
+from sse_parser import iter_events, AnswerBuffer
+from db_handler import ConversationDB, UserDB, EventDB, get_connection_pool
 from slack_modals import ModalBuilder
+from worker_pool import BoundedWorkerPool, QueueFullError
+from job_queue import JobQueue
+from thread_scheduler import ThreadScheduler
+from answer_cache import AnswerCache
+from semantic_cache import SemanticCache
+from event_router import classify_event, MESSAGE_EVENT_TYPES, THREAD_REPLY
+from metrics import SLACK_ACK_SECONDS, DIFY_STREAMS_IN_FLIGHT, CONTENT_TYPE_LATEST, observe_stream, render_metrics, span, inject_trace
 
 default_llm_model = "exaone3.5"
 default_prompt = "You are a helpful assistant."
+available_models = ["exaone3.5", "llama3.2-vision", "deepseek-r1"]
 
 class SlackBotServer:
     def __init__(self):
@@ -33,237 +45,646 @@ class SlackBotServer:
             pw=redis_password
         )
         
+        self.event_db = EventDB(
+            host=redis_host,
+            port=redis_port,
+            db=redis_conv_db,
+            pw=redis_password
+        )
+        
+        # job_queue_enabled면 이 서버는 작업 등록만 하고 대화 처리는 slack_worker.py가 담당
+        self.job_queue = None
+        if job_queue_enabled:
+            self.job_queue = JobQueue(get_connection_pool(redis_host, redis_port, redis_conv_db, redis_password))
+        
+        # Bolt 앱과 리스너는 프로세스 시작 시 한 번만 생성하여 모든 요청이 공유합니다.
+        self.bot = SlackBot(self.user_db, self.conv_db, self.event_db, self.job_queue)
+        debug_print(f"SlackBot created")
+        
+        # Slack은 3초 안에 응답이 없으면 재전송하므로 응답(ack) 지연을 측정
+        self.ack_latency = LatencyTracker()
+        
+        @self.app.before_request
+        def start_timer():
+            g.request_started = time.perf_counter()
+        
+        @self.app.after_request
+        def record_ack_latency(response):
+            if request.path == "/slack/events" and "request_started" in g:
+                elapsed = time.perf_counter() - g.request_started
+                self.ack_latency.record(elapsed)
+                SLACK_ACK_SECONDS.observe(elapsed)
+                if self.ack_latency.count % 100 == 0:
+                    debug_print(f"Slack ack latency: {self._format_latency()}")
+            return response
+        
         @self.app.route("/slack/events", methods=["POST"])
         def handle_slack_events():
-            bot = SlackBot(self.user_db, self.conv_db)
-            debug_print(f"SlackBot created")
-            return bot.handle_request(request)
+            return self.bot.handle_request(request)
+        
+        @self.app.route("/metrics", methods=["GET"])
+        def metrics():
+            return Response(render_metrics(), mimetype=CONTENT_TYPE_LATEST)
+        
+        @self.app.route("/healthz", methods=["GET"])
+        def healthz():
+            return {"status": "ok"}
+        
+        @self.app.route("/readyz", methods=["GET"])
+        def readyz():
+            ready, checks = self.check_readiness()
+            return {"status": "ok" if ready else "unavailable", **checks}, 200 if ready else 503
+    
+    def _format_latency(self):
+        return ", ".join(f"{name}={value * 1000:.1f}ms" for name, value in self.ack_latency.percentiles().items())
+    
+    def check_readiness(self):
+        """Redis와 Dify 연결 확인. 종료 중(drain)이면 새 요청을 받지 않도록 준비되지 않은 것으로 응답"""
+        # 점검을 동시에 실행해 /readyz 응답을 health_check_timeout 안으로 제한
+        checks = run_checks({
+            "redis_conv": self.conv_db.ping,
+            "redis_user": self.user_db.ping,
+            "dify": self.bot.dify_client.ping,
+        })
+        checks = {
+            "redis": checks["redis_conv"] and checks["redis_user"],
+            # 로컬 저장소가 있으면 Redis 장애 중에도 답변 가능
+            "redis_fallback": self.conv_db.fallback is not None and self.user_db.fallback is not None,
+            "dify": checks["dify"],
+            "draining": self.bot.draining,
+        }
+        redis_ok = checks["redis"] or checks["redis_fallback"]
+        return redis_ok and checks["dify"] and not checks["draining"], checks
+    
+    def shutdown(self, timeout=shutdown_drain_timeout):
+        """진행 중인 답변을 마친 뒤 종료 (gunicorn worker_exit 등에서 호출)"""
+        self.bot.drain(timeout)
             
     def run(self, port=web_port):
+        """개발용 서버. 운영 환경에서는 gunicorn으로 wsgi.py를 실행"""
         self.app.run(port=port, debug=False)
 
-class SlackBot:
-    """각 요청을 처리하는 Slack 봇 인스턴스입니다. 각 요청마다 새로운 인스턴스가 생성됩니다."""
+def stream_deadline(started_at, first_token_at, last_event_at):
+    """스트림을 중단할 시각(monotonic)과 사유. 전체, 첫 토큰(또는 유휴) 제한 중 먼저 오는 것"""
+    total = (started_at + dify_total_timeout, f"최대 응답 시간({dify_total_timeout:.0f}초)을 넘어 답변을 중단했습니다. (부분 답변)")
+    if first_token_at is None:
+        wait = (started_at + dify_first_token_timeout, f"{dify_first_token_timeout:.0f}초 동안 응답이 시작되지 않아 중단했습니다.")
+    else:
+        wait = (last_event_at + dify_idle_timeout, f"응답이 {dify_idle_timeout:.0f}초 동안 멈춰 답변을 중단했습니다. (부분 답변)")
+    return min(total, wait, key=lambda deadline: deadline[0])
 
-    def __init__(self, user_db, conv_db):
-        self.bolt_app = App(
-            token=slack_OAuth_token,
+def create_bolt_app():
+    """Bolt 앱 생성 (auth.test 호출이 포함되므로 프로세스당 한 번만 호출)"""
+    if slack_base_url:
+        # 프록시/스텁 서버 등 별도 Slack API 주소를 사용하는 경우
+        return App(
+            client=WebClient(token=slack_OAuth_token, base_url=slack_base_url),
             signing_secret=slack_signing_secret
         )
+    return App(
+        token=slack_OAuth_token,
+        signing_secret=slack_signing_secret
+    )
+
+class SlackBot:
+    """Bolt 앱과 리스너를 보관하는 장수명 레지스트리입니다. 프로세스당 한 번 생성되어 모든 요청이 공유하며,
+    요청별 상태는 인스턴스 속성이 아닌 지역 변수로 전달합니다."""
+
+    def __init__(self, user_db, conv_db, event_db=None, job_queue=None):
+        self.bolt_app = create_bolt_app()
         
         self.handler = SlackRequestHandler(self.bolt_app)
         
         self.user_db = user_db
         self.conv_db = conv_db
+        self.event_db = event_db
+        self.job_queue = job_queue
         self.dify_client = DifyClient()
         self.slack = SlackProcess(self.bolt_app)
+        # chat.update는 스케줄러를 통해 합쳐서 전송 (속도 제한 대응)
+        self.updater = SlackUpdateScheduler(self.slack)
+        self.worker_pool = BoundedWorkerPool(
+            max_workers=worker_max_concurrency,
+            max_queue=worker_queue_size
+        )
+        # 스레드당 하나의 요청만 실행하고 그 사이 도착한 메시지는 모아서 처리
+        self.thread_scheduler = ThreadScheduler(
+            self.worker_pool,
+            self._handle_thread_batch,
+            on_busy=self._on_thread_busy
+        )
+        # 반복되는 첫 질문 답변 캐시 (answer_cache_enabled 설정 시)
+        self.answer_cache = AnswerCache() if answer_cache_enabled else None
+        self.semantic_cache = SemanticCache() if semantic_cache_enabled else None
+        
+        # 진행 중인 스트림 상태 (channel, thread_ts) -> state. 제한 시간과 중단 요청은 감시 스레드가 확인
+        self.streams = {}
+        self.streams_lock = threading.Lock()
+        threading.Thread(target=self._watch_streams, name="stream-watchdog", daemon=True).start()
+        self.draining = False
         
         # 타이핑 
         self.typing_dots = ["", ".", "..", "..."]
-        self.available_models = ["exaone3.5", "llama3.2-vision", "deepseek-r1"]
+        self.available_models = available_models
         
-        # 앱 멘션 이벤트 리스너 (일반 채널용)
-        self.bolt_app.event("app_mention")(self.handle_mention)
-        # DM 메시지 이벤트 리스너
-        self.bolt_app.message()(self.handle_dm)
+        # 메시지 이벤트(app_mention, message)는 라우터 하나에서 분류 후 한 번만 처리
+        self.bolt_app.event(MESSAGE_EVENT_TYPES)(self.handle_event)
+        # 답변 메시지에 중단 반응(:octagonal_sign: 등)을 달면 답변 중단
+        self.bolt_app.event("reaction_added")(self.handle_reaction)
         # 슬래시 커맨드 등록
         self.bolt_app.command("/bot-settings")(self.handle_settings_command)
         
-        # 모델 선택 액션 핸들러 추가
+        # 설정 액션/모달 핸들러 등록
         self.bolt_app.action("model_select")(self.handle_model_select)
-        
-        # 프롬프트 수정 액션 핸들러 추가
         self.bolt_app.action("prompt_edit")(self.handle_prompt_edit)
         self.bolt_app.action("prompt_input")(self.handle_prompt_input)
-        
-        # 액션 핸들러 등록
-        self.bolt_app.command("/bot-settings")(self.handle_settings_command)
-        self.bolt_app.action("model_select")(self.handle_model_select)
         self.bolt_app.action("open_prompt_modal")(self.handle_open_prompt_modal)
         self.bolt_app.view("prompt_edit_modal")(self.handle_prompt_submit)
         self.bolt_app.view("main_settings_modal")(self.handle_settings_submit)
         
-        self.is_complete = False  # is_complete 속성 초기화
         self.modal_builder = ModalBuilder()
         
-        # 메시지 이벤트 리스너 추가
-        self.bolt_app.event("message")(self.handle_message_events)
-        
     def handle_request(self,request):
         return self.handler.handle(request)
     
-    def handle_mention(self, event, say):
-        """일반 채널에서의 멘션 처리"""
-        bot = SlackBot(self.user_db, self.conv_db)
-        debug_print(f"SlackBot created for mention event")
-        bot._process_message(event, say)
+    def handle_event(self, event, say, context):
+        """멘션, DM, 봇이 답변 중인 스레드의 답글을 분류해 한 번만 처리"""
+        route = classify_event(event, context.bot_user_id)
+        if route is None:
+            debug_print(f"Ignored event: {event.get('type')}/{event.get('subtype')}")
+            return
+        if route == THREAD_REPLY and not self._is_bot_thread(event):
+            return
+        debug_print(f"Routed event as {route}: {event.get('channel')}/{event.get('ts')}")
+        self._process_message(event, say)
     
-    def handle_dm(self, message, say):
-        """DM 채널에서의 메시지 처리"""
-        if message.get('bot_id') or message.get('channel_type') != 'im':
+    def handle_reaction(self, event):
+        """답변 중인 메시지에 요청한 사용자가 중단 반응을 달면 답변 중단"""
+        if event.get('reaction') not in slack_stop_reactions:
             return
-        bot = SlackBot(self.user_db, self.conv_db)
-        debug_print(f"SlackBot created for DM event")
-        bot._process_message(message, say)
+        item = event.get('item', {})
+        channel_id, message_ts = item.get('channel'), item.get('ts')
+        
+        with self.streams_lock:
+            key = next((key for key, state in self.streams.items()
+                        if key[0] == channel_id and message_ts in state["renderer"].messages), None)
+            owner = self.streams[key]["user_id"] if key else None
+        if key:
+            if owner == event.get('user'):
+                self._cancel_stream(key, "요청에 따라 답변을 중단했습니다.")
+        elif job_queue_enabled and self.event_db is not None:
+            # 워커 프로세스에서 답변 중일 수 있으므로 Redis에 기록 (워커의 감시 스레드가 확인)
+            self.event_db.request_cancel(channel_id, message_ts, event.get('user'))
     
-    def handle_message_events(self, body, say):
-        """모든 메시지 이벤트 처리"""
-        event = body.get('event', {})
-        
-        # 서브타입이 명시되지 않은 경우 무시
-        if 'subtype' in event:
-            debug_print(f"Ignored event with subtype: {event['subtype']}")
-            return  # 서브타입이 있는 경우 무시
-        
-        # 일반 메시지 처리 로직
-        user_id = event.get('user')
-        if user_id:  # 사용자 ID가 있는 경우에만 처리
-            self._process_message(event, say)
-        else:
-            debug_print("Received a message without a user ID, ignoring.")
+    def _is_bot_thread(self, event):
+        """멘션 없는 스레드 답글은 봇이 대화 중인 스레드에서만 처리 (slack_thread_replies 설정 시)"""
+        return slack_thread_replies and bool(self.conv_db.get_conversation(event['channel'], event['thread_ts']))
     
     def _process_message(self, event, say):
-        """메시지 처리 로직"""
+        """메시지 처리 로직. Bolt는 Events API 요청에 먼저 응답(ack)한 뒤 리스너를 실행하므로
+        여기서는 중복 확인, 임시 메시지 전송, 작업 등록만 하고 나머지는 작업 풀에서 처리합니다."""
         if event.get('bot_id'):
             return
         
+        channel_id = event['channel']
+        thread_ts = event.get('thread_ts', event['ts'])
+        # 이벤트 하나가 trace 하나: 작업 풀/워커에서 이어 기록하도록 traceparent를 이벤트에 담아 전달
+        with span("slack.event", channel=channel_id, event_ts=event['ts']):
+            event['traceparent'] = inject_trace()
+            try:
+                # 재전송(X-Slack-Retry-Num)이나 같은 메시지의 app_mention/message 이벤트는 한 번만 처리
+                event_key = event.get('client_msg_id') or f"{channel_id}:{event['ts']}"
+                if self.event_db is not None and not self.event_db.mark_seen(event_key):
+                    return
+                
+                # 임시 메시지 전송
+                response = say(
+                    text="잠시만 기다려주세요...🤔",
+                    thread_ts=thread_ts
+                )
+                tmp_ts = response['ts']
+                
+                if self.job_queue is not None:
+                    self.job_queue.enqueue(self._make_job(event, tmp_ts, channel_id, thread_ts))
+                    return
+                
+                # 스레드별 스케줄러를 거쳐 작업 풀에 등록 (대기열이 가득 차면 부하 차단)
+                try:
+                    position = self.thread_scheduler.submit((channel_id, str(thread_ts)), (event, tmp_ts))
+                except QueueFullError as e:
+                    debug_print(f"Worker pool rejected message: {e}")
+                    self.updater.flush(channel_id, tmp_ts, "현재 요청이 많아 처리할 수 없습니다. 잠시 후 다시 시도해주세요.🙏")
+                    return
+                
+                if position is None:
+                    self.updater.submit(channel_id, tmp_ts, "이전 질문의 답변이 끝나면 이어서 답변합니다. ⏳")
+                elif position:
+                    self.updater.submit(channel_id, tmp_ts, f"요청이 많아 대기 중입니다. 대기 순번: #{position} ⏳")
+                debug_print(f"Worker pool stats: {self.worker_pool.stats()}, thread scheduler: {self.thread_scheduler.stats()}")
+                
+            except Exception as e:
+                debug_print(f"Error in message processing: {e}")
+                self.slack.post_message(channel_id, "처리 중 오류가 발생했습니다.", thread_ts)
+    
+    @staticmethod
+    def _make_job(event, tmp_ts, channel_id, thread_ts):
+        """워커로 보낼 작업 (Redis Stream 필드는 문자열)"""
+        return {
+            "channel": channel_id,
+            "thread_ts": str(thread_ts),
+            "ts": event['ts'],
+            "user": event.get('user') or "",
+            "query": re.sub(r'^<@[^>]+>\s*', '', event.get('text', '')),
+            "tmp_ts": tmp_ts,
+            "traceparent": event.get('traceparent') or "",
+        }
+    
+    def handle_job(self, job):
+        """JobQueue 작업 처리 (slack_worker.py)"""
+        event = {"channel": job['channel'], "ts": job['ts'], "thread_ts": job['thread_ts'],
+                 "user": job['user'], "text": job['query']}
+        with span("slack.conversation", traceparent=job.get('traceparent'), channel=job['channel'], thread_ts=job['thread_ts']):
+            self._handle_conversation(event, job['tmp_ts'], job['channel'], job['thread_ts'])
+    
+    def _handle_thread_batch(self, key, items):
+        """스레드 하나의 요청 처리. 여러 메시지가 모였으면 하나의 질문으로 합쳐 마지막 임시 메시지에 답변"""
+        channel_id, thread_ts = key
+        event, tmp_ts = items[-1]
+        if len(items) > 1:
+            event = dict(event)
+            event['text'] = "\n".join(re.sub(r'^<@[^>]+>\s*', '', item_event.get('text', '')) for item_event, _ in items)
+            for _, merged_ts in items[:-1]:
+                self.updater.submit(channel_id, merged_ts, "아래 답변에서 함께 답변합니다. 👇")
+            debug_print(f"Coalesced {len(items)} messages in thread {key}")
+        with span("slack.conversation", traceparent=event.get('traceparent'), channel=channel_id,
+                  thread_ts=thread_ts, coalesced=len(items)):
+            self._handle_conversation(event, tmp_ts, channel_id, thread_ts)
+    
+    def _on_thread_busy(self, key):
+        """답변 중인 스레드에 새 메시지가 오면 (thread_cancel_stale 설정 시) 이전 답변을 중단"""
+        if thread_cancel_stale:
+            self._cancel_stream(key, "새 메시지가 도착해 답변을 중단했습니다.")
+    
+    def _cancel_stream(self, key, reason, expected=None):
+        """진행 중인 스트림 취소: Dify 작업 중지를 요청하고 소켓을 끊어 작업 스레드의 읽기를 끝냄. 취소한 경우 True.
+        expected가 주어지면 그 사이 같은 스레드에서 새로 시작된 스트림은 취소하지 않습니다.
+        감시 스레드나 Bolt 리스너 스레드가 막히지 않도록 두 작업 모두 별도 스레드에서 실행합니다."""
+        with self.streams_lock:
+            state = self.streams.get(key)
+            if state is None or state["cancelled"] or (expected is not None and state is not expected):
+                return False
+            state["cancelled"] = reason
+            task_id = state["task_id"]
+        if task_id:
+            # Dify가 생성을 계속하지 않도록 중지 요청을 먼저 시작
+            threading.Thread(
+                target=self.dify_client.stop_message,
+                args=(task_id, state["user_id"]),
+                name="dify-stop",
+                daemon=True
+            ).start()
+        threading.Thread(target=abort_stream, args=(state["response"],), name="dify-abort", daemon=True).start()
+        debug_print(f"Cancelled stream {key} (task: {task_id}): {reason}")
+        return True
+    
+    def drain(self, timeout=shutdown_drain_timeout, interval=0.2):
+        """종료 전 진행 중인 답변과 Slack 업데이트가 끝날 때까지 대기.
+        timeout 안에 끝나지 않은 스트림은 중단 문구를 표시하고 종료합니다."""
+        self.draining = True
+        deadline = time.monotonic() + timeout
+        while not self._idle():
+            if time.monotonic() >= deadline:
+                with self.streams_lock:
+                    keys = list(self.streams)
+                for key in keys:
+                    self._cancel_stream(key, "서버 재시작으로 답변을 중단했습니다. 다시 질문해주세요.")
+                # 중단 문구가 전송될 시간만 추가로 대기
+                deadline = time.monotonic() + 5
+                while not self._idle() and time.monotonic() < deadline:
+                    time.sleep(interval)
+                break
+            time.sleep(interval)
+        debug_print(f"Drained (idle: {self._idle()}), worker pool: {self.worker_pool.stats()}, updates: {self.updater.stats()}")
+    
+    def _idle(self):
+        pool = self.worker_pool.stats()
+        updates = self.updater.stats()
+        return (pool["running"] == 0 and pool["queue_depth"] == 0
+                and self.thread_scheduler.stats()["active_threads"] == 0
+                and updates["pending"] == 0 and updates["in_flight"] == 0)
+    
+    def _watch_streams(self, interval=0.5):
+        while True:
+            time.sleep(interval)
+            try:
+                self._check_streams(time.monotonic())
+            except Exception as e:
+                debug_print(f"Error in stream watchdog: {e}")
+    
+    def _check_streams(self, now):
+        """제한 시간(첫 토큰, 유휴, 전체)을 넘었거나 다른 프로세스에서 중단 요청된 스트림 취소"""
+        with self.streams_lock:
+            streams = list(self.streams.items())
+        if not streams:
+            return
+        
+        for key, state in streams:
+            reason = self._deadline_exceeded(state, now)
+            if reason:
+                self._cancel_stream(key, reason, state)
+        
+        if job_queue_enabled and self.event_db is not None:
+            # 잠금 없이 self.streams를 읽지 않도록 위에서 복사한 스트림 상태의 요청자와 비교
+            messages = [(key[0], ts, key, state) for key, state in streams for ts in list(state["renderer"].messages)]
+            cancel_requests = self.event_db.get_cancel_requests([(channel_id, ts) for channel_id, ts, _, _ in messages])
+            for (_, _, key, state), requested_by in zip(messages, cancel_requests):
+                if requested_by is not None and requested_by == state["user_id"]:
+                    self._cancel_stream(key, "요청에 따라 답변을 중단했습니다.", state)
+    
+    @staticmethod
+    def _deadline_exceeded(state, now):
+        deadline, reason = stream_deadline(state["started_at"], state["first_token_at"], state["last_event_at"])
+        return reason if now > deadline else None
+    
+    def _handle_conversation(self, event, tmp_ts, channel_id, thread_ts):
+        claimed = False
+        # 답변을 표시할 메시지들 (길어지면 이어쓰기 메시지가 추가되며, 오류는 마지막 메시지에 표시)
+        renderer = StreamRenderer(self.updater, channel_id, thread_ts, tmp_ts)
         try:
-            channel_id = event['channel']
-            thread_ts = event.get('thread_ts', event['ts'])
             user_query = re.sub(r'^<@[^>]+>\s*', '', event['text'])
             user_id = event.get('user')
             
-            # load user models and prompts
-            user_model = self.user_db.get_current_model(user_id)
-            user_prompt = self.user_db.get_current_prompt(user_id)
+            # load user models, prompts and conversation_id in one round trip
+            # conversation_id가 없으면 첫 질문을 빈 conversation_id로 전송하고 스트림에서 받은 id를 저장 (지연 바인딩)
+            user_model, user_prompt, conversation_id = self.user_db.load_user_context(
+                user_id, channel_id, str(thread_ts), self.conv_db
+            )
             
-            if not user_model:
-                self.user_db.set_user_model(user_id, default_llm_model)
-            if not user_prompt:
-                self.user_db.set_user_prompt(user_id, default_prompt)
+            if not user_model or not user_prompt:
+                self.user_db.set_defaults(user_id, default_llm_model, default_prompt)
+                user_model = user_model or default_llm_model
+                user_prompt = user_prompt or default_prompt
             
             user_input = f"Model:{user_model} Prompt:{user_prompt} Query:{user_query}" 
             
-            # thread_ts에 해당하는 DifyClient 가져오기
-            conversation_id = self.conv_db.get_conversation(str(thread_ts))
-        
-            # conversation_id가 없으면 새로 생성
-            if not conversation_id:
-                conversation_id = self.dify_client.create_conversation(user_id)
-                self.conv_db.save_conversation(str(thread_ts), conversation_id)
-                debug_print(f"Created new conversation: {conversation_id} for thread: {thread_ts}")
-            else:
-                self.dify_client.set_conversation_id(conversation_id)
-                debug_print(f"Get conversation_id from redis: {conversation_id} for thread: {thread_ts}")
-                        
-            # 임시 메시지 전송
-            response = say(
-                text="잠시만 기다려주세요...🤔",
-                thread_ts=thread_ts
-            )
-            tmp_ts = response['ts']
+            # 대화 맥락이 없는 스레드 첫 질문만 캐시된 답변 사용 (후속 질문은 앞 대화에 따라 뜻이 달라짐)
+            cache_request = None
+            is_thread_root = str(event.get('ts')) == str(thread_ts)
+            if not conversation_id and is_thread_root and self._answer_cache_enabled_for(channel_id):
+                cache_request = (user_model, user_prompt, user_query)
+                cached = self._lookup_cached_answer(*cache_request)
+                if cached is not None:
+                    self._render_cached_answer(*cached, renderer)
+                    self.conv_db.save_cached_exchange(channel_id, str(thread_ts), user_query, cached[0])
+                    return
             
-            # 처리 스레드 시작
-            threading.Thread(
-                target=self._handle_conversation,
-                args=(event, tmp_ts, user_input, channel_id, thread_ts)
-            ).start()
+            if not conversation_id and not is_thread_root:
+                # 캐시된 답변 뒤의 후속 질문: 그 질문/답변을 맥락으로 함께 보내 새 conversation 시작
+                exchange = self.conv_db.get_cached_exchange(channel_id, str(thread_ts))
+                if exchange is not None:
+                    previous_query, previous_answer = exchange
+                    user_input = (f"Model:{user_model} Prompt:{user_prompt} Query:이전 질문: {previous_query}\n"
+                                  f"이전 답변: {previous_answer}\n\n{user_query}")
             
-        except Exception as e:
-            debug_print(f"Error in message processing: {e}")
-            self.slack.chat_postMessage(channel=channel_id, text="처리 중 오류가 발생했습니다.")
-    
-    def _handle_conversation(self, event, tmp_ts, user_query, channel_id, thread_ts):
-        try:
-            self._show_waiting_animation(channel_id, tmp_ts)
+            if not conversation_id:
+                # 같은 새 스레드에 동시에 도착한 메시지 중 하나만 새 conversation을 생성
+                claimed = self.conv_db.claim_conversation(channel_id, str(thread_ts))
+                if not claimed:
+                    conversation_id = self.conv_db.wait_for_conversation(channel_id, str(thread_ts)) or ""
             
-            self._process_dify_response(
-                user_query,
-                event.get('user', ''),
-                channel_id,
-                tmp_ts,
-            )
+            with span("dify.stream", conversation_id=conversation_id or ""):
+                self._process_dify_response(
+                    user_input,
+                    user_id or '',
+                    channel_id,
+                    tmp_ts,
+                    conversation_id,
+                    thread_ts,
+                    renderer,
+                    cache_request,
+                )
             
         except Exception as e:
             debug_print(f"Error in conversation handling: {e}")
-            self.slack.chat_update(channel_id, "처리 중 오류가 발생했습니다.", tmp_ts)
+            renderer.fail("처리 중 오류가 발생했습니다.")
+        finally:
+            if claimed:
+                self.conv_db.release_conversation_claim(channel_id, str(thread_ts))
+    
+    def _answer_cache_enabled_for(self, channel_id):
+        if channel_id in answer_cache_exclude_channels:
+            return False
+        return self.answer_cache is not None or self.semantic_cache is not None
+    
+    def _lookup_cached_answer(self, model, prompt, query):
+        """(답변, 안내 문구) 또는 None. 정확히 같은 질문 → 비슷한 질문 순으로 확인"""
+        if self.answer_cache is not None:
+            answer = self.answer_cache.get(self.answer_cache.key(model, prompt, query))
+            if answer is not None:
+                debug_print(f"Answer cache hit, stats: {self.answer_cache.stats()}")
+                return answer, "이전에 같은 질문에 답변한 내용입니다"
+        if self.semantic_cache is not None:
+            try:
+                hit = self.semantic_cache.lookup(SemanticCache.scope_of(model, prompt), query)
+            except Exception as e:
+                debug_print(f"Semantic cache lookup error: {e}")
+                hit = None
+            if hit is not None:
+                answer, similarity = hit
+                debug_print(f"Semantic cache hit ({similarity:.3f}), stats: {self.semantic_cache.stats()}")
+                return answer, "이전에 비슷한 질문에 답변한 내용입니다"
+        return None
     
-    def _show_waiting_animation(self, channel_id, tmp_ts):
-        start_time = time.time()
-        idx = 0
-        while time.time() - start_time < 20:
-            current_text = f"잠시만 기다려주세요{self.typing_dots[idx]}..🤔⏳"
-            self.slack.chat_update(channel_id, current_text, tmp_ts)
-            idx = (idx + 1) % len(self.typing_dots)
-            time.sleep(0.5)
+    def _store_answer(self, cache_request, answer, tokens):
+        model, prompt, query = cache_request
+        if self.answer_cache is not None:
+            self.answer_cache.set(self.answer_cache.key(model, prompt, query), answer, tokens)
+        if self.semantic_cache is not None:
+            try:
+                self.semantic_cache.add(SemanticCache.scope_of(model, prompt), query, answer, tokens)
+            except Exception as e:
+                debug_print(f"Semantic cache add error: {e}")
+    
+    def _render_cached_answer(self, answer, note, renderer):
+        """캐시된 답변을 스트리밍 답변과 같은 경로(renderer, 업데이트 스케줄러)로 표시"""
+        renderer.append(answer)
+        renderer.finish(f"\n_({note})_\n더 필요하신 부분이 있으면 말씀해주세요.")
+    
+    def _start_waiting_animation(self, channel_id, tmp_ts):
+        """첫 토큰이 도착할 때까지 대기 애니메이션을 표시하고, 중지 함수를 반환"""
+        stop_event = threading.Event()
+        lock = threading.Lock()
+        
+        def animate():
+            idx = 0
+            while True:
+                # 중지 이후에는 스트리밍 텍스트를 덮어쓰지 않도록 lock 안에서 확인
+                with lock:
+                    if stop_event.is_set():
+                        return
+                    current_text = f"잠시만 기다려주세요{self.typing_dots[idx]}..🤔⏳"
+                    self.updater.submit(channel_id, tmp_ts, current_text)
+                idx = (idx + 1) % len(self.typing_dots)
+                if stop_event.wait(0.5):
+                    return
+        
+        def stop():
+            with lock:
+                stop_event.set()
+        
+        threading.Thread(target=animate, name="waiting-animation", daemon=True).start()
+        return stop
     
-    def _process_dify_response(self, user_query, user_id, channel_id, tmp_ts):
+    def _process_dify_response(self, user_query, user_id, channel_id, tmp_ts, conversation_id, thread_ts, renderer, cache_request=None):
         
-        response = self.dify_client.chat_messages_stream(
-            user_query,
-            user_id,
+        # Dify 스트림과 대기 애니메이션을 동시에 진행
+        started_at = time.monotonic()
+        stop_waiting = self._start_waiting_animation(channel_id, tmp_ts)
+        try:
+            response = self.dify_client.chat_messages_stream(
+                user_query,
+                user_id,
+                conversation_id,
+            )
+        except Exception:
+            stop_waiting()
+            raise
+        
+        # 요청별 스트리밍 상태 (공유 인스턴스에 저장하지 않음)
+        state = {
+            "answer": AnswerBuffer(),
+            "renderer": renderer,
+            "last_update_time": 0,      # 첫 토큰은 업데이트 간격을 기다리지 않고 바로 표시
+            "update_interval": slack_update_interval,
+            "is_complete": False,
+            "error": None,
+            "thread_ts": str(thread_ts),
+            "conversation_id": conversation_id,
+            "task_id": None,
+            "message_id": None,
+            "stop_waiting": stop_waiting,
+            "first_token_at": None,
+            "user_id": user_id,
+            "cancelled": None,
+            "response": response,
+            "started_at": started_at,
+            "last_event_at": time.monotonic(),
+            "usage": {},
+        }
+        stream_key = (channel_id, str(thread_ts))
+        with self.streams_lock:
+            self.streams[stream_key] = state
+        DIFY_STREAMS_IN_FLIGHT.inc()
+        
+        try:
+            for event in iter_events(response):
+                if state["cancelled"]:
+                    break
+                state["last_event_at"] = time.monotonic()
+                self._handle_stream_event(event, channel_id, tmp_ts, state)
+        except Exception:
+            # 취소로 소켓을 끊은 경우의 읽기 오류는 무시하고 부분 답변을 표시
+            if not state["cancelled"]:
+                raise
+        finally:
+            with self.streams_lock:
+                if self.streams.get(stream_key) is state:
+                    del self.streams[stream_key]
+            DIFY_STREAMS_IN_FLIGHT.dec()
+            stop_waiting()
+            # 커넥션을 풀로 반환
+            response.close()
+            debug_print(f"Dify HTTP pool stats: {http_pool_stats()}")
+        
+        accumulated_response = state["answer"].text()
+        logger.log_llm_response({
+            "event": "message_end" if state["is_complete"] else "",
+            "task_id": state["task_id"],
+            "message_id": state["message_id"],
+            "conversation_id": state["conversation_id"],
+            "answer": accumulated_response,
+        })
+        # 답변 본문은 renderer가 이미 나눠 표시 중이므로 마지막 메시지에 상태/안내 문구만 덧붙임
+        if state["cancelled"]:
+            outcome = "cancelled"
+            suffix = f"\n⏹️ {state['cancelled']}"
+        elif state["error"]:
+            outcome = "error"
+            suffix = f"\n⚠️ 응답 생성 중 오류가 발생했습니다: {state['error']}"
+        elif state["is_complete"]:
+            outcome = "complete"
+            suffix = ""
+        else:
+            outcome = "incomplete"
+            suffix = " ⏳ ..."
+        suffix += "\n더 필요하신 부분이 있으면 말씀해주세요."
+        state["renderer"].finish(suffix)
+        
+        # 정상 완료된 첫 질문 답변만 캐시
+        if cache_request and state["is_complete"] and not state["error"] and not state["cancelled"]:
+            self._store_answer(cache_request, accumulated_response, state["usage"].get('total_tokens', 0))
+        
+        first_token_at = state["first_token_at"]
+        logger.log_llm_timing(
+            channel_id,
+            tmp_ts,
+            time_to_first_token=first_token_at - started_at if first_token_at else None,
+            time_to_complete=time.monotonic() - started_at,
         )
+        observe_stream(started_at, first_token_at, outcome)
+        debug_print(f"Slack update stats: {self.updater.stats()}")
+
+    def _handle_stream_event(self, event, channel_id, tmp_ts, state):
+        # 새 스레드라면 스트림 이벤트의 conversation_id를 저장
+        if not state["conversation_id"] and event.conversation_id:
+            state["conversation_id"] = event.conversation_id
+            self.conv_db.save_conversation(channel_id, state["thread_ts"], state["conversation_id"])
+            debug_print(f"Bound new conversation: {state['conversation_id']} for thread: {state['thread_ts']}")
+        if event.task_id:
+            state["task_id"] = event.task_id
         
-        self.accumulated_response = ""
-        self.last_update_time = time.time()
-        self.update_interval = 0.9
-        self.is_complete = False
+        if event.is_answer():
+            if state["first_token_at"] is None:
+                # 첫 토큰 도착: 대기 애니메이션 중지
+                state["first_token_at"] = time.monotonic()
+                state["stop_waiting"]()
+            state["answer"].append(event.answer)
+            state["renderer"].append(event.answer)
+            self._push_stream_update(channel_id, tmp_ts, state)
         
-        for line in response.iter_lines():
-            if not line:
-                continue   
-            try:
-                line_text = line.decode('utf-8')
-                self._handle_stream_line(
-                    line_text,
-                    channel_id,
-                    tmp_ts
-                )
-                
-            except json.JSONDecodeError as e:
-                debug_print(f"JSON decode error: {e}")
-        
-        time.sleep(0.5)
-        final_text = self.accumulated_response if self.is_complete else f"{self.accumulated_response} ⏳ ..."
-        formatted_line = self._format_line_for_logging(final_text)
-        logger.log_llm_response(formatted_line)
-        final_text += "\n더 필요하신 부분이 있으면 말씀해주세요."
-        self.slack.chat_update(channel_id, final_text, tmp_ts)
+        elif event.type == 'message_replace':
+            state["answer"].replace(event.answer)
+            state["renderer"].replace(event.answer)
+            self._push_stream_update(channel_id, tmp_ts, state, force=True)
+        
+        elif event.type == 'message_end':
+            state["is_complete"] = True
+            state["message_id"] = event.data.get('message_id') or event.data.get('id')
+            state["usage"] = (event.data.get('metadata') or {}).get('usage') or {}
+        
+        elif event.type == 'error':
+            state["error"] = event.data.get('message') or event.data.get('code') or 'unknown error'
+            debug_print(f"Dify stream error: {event.data}")
+        
+        elif event.type != 'ping' and not event.is_workflow():
+            debug_print(f"Ignored Dify stream event: {event.type}")
 
-    def _handle_stream_line(self, line, channel_id, tmp_ts):
-        if line.startswith('data: '):
-            data = json.loads(line[6:])
-            
-            if 'event' in data and data['event'] == 'message':
-                message_chunk = data.get('answer', '')
-                self.accumulated_response += message_chunk
-                
-                current_time = time.time()
-                if current_time - self.last_update_time >= self.update_interval:
-                    self.slack.chat_update(
-                        channel_id, 
-                        f"{self.accumulated_response} ⏳ ...", 
-                        tmp_ts
-                    )
-                    self.last_update_time = current_time
-                
-            elif 'event' in data and data['event'] == 'message_end':
-                self.is_complete = True
-                time.sleep(0.5)
-                self.slack.chat_update(channel_id, self.accumulated_response, tmp_ts)
+    def _push_stream_update(self, channel_id, tmp_ts, state, force=False):
+        """업데이트 간격마다 한 번만 마지막 메시지를 갱신"""
+        current_time = time.time()
+        if force or current_time - state["last_update_time"] >= state["update_interval"]:
+            state["renderer"].update()
+            state["last_update_time"] = current_time
 
 
     def handle_settings_command(self, ack, body, client):
         """메인 설정 모달"""
         ack()
-        bot = SlackBot(self.user_db, self.conv_db)
-        debug_print(f"SlackBot created")
-
-        """메인 설정 모달 구현부"""
         try:
             user_id = body['user_id']
-            current_model = self.user_db.get_current_model(user_id) or default_llm_model
-            current_prompt = self.user_db.get_current_prompt(user_id) or default_prompt
+            current_model, current_prompt = self.user_db.get_user_settings(user_id)
+            current_model = current_model or default_llm_model
+            current_prompt = current_prompt or default_prompt
             
             metadata = {
                 "current_model": current_model,
@@ -406,16 +827,6 @@ class SlackBot:
         except Exception as e:
             debug_print(f"Error in handle_settings_submit: {e}")
 
-    def _format_line_for_logging(self, line_text):
-        try:
-            line_data = json.loads(line_text[6:])  # "data: " 제거
-            return {
-                "event": line_data.get("event", ""),
-                "answer": line_data.get("answer", ""),
-            }
-        except json.JSONDecodeError:
-            return {"event": "", "answer": line_text}
-
 if __name__ == '__main__':
     server = SlackBotServer()
     server.run()
\ No newline at end of file
@@ -1,9 +1,33 @@
 from config import *
 from utils import debug_print
+from metrics import SLACK_API_SECONDS, SLACK_RATE_LIMITED_TOTAL, SLACK_RETRIES_TOTAL
 import time
+import asyncio
 
 # https://api.slack.com/methods
 
+def get_retry_after(error, default=1.0):
+    """429 응답의 Retry-After(초). 속도 제한 오류가 아니면 None"""
+    response = getattr(error, 'response', None)
+    if response is None or getattr(response, 'status_code', None) != 429:
+        return None
+    headers = response.headers or {}
+    value = headers.get('Retry-After', headers.get('retry-after', default))
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+def record_slack_call(method, started, error=None):
+    """Slack API 호출 지연과 429 응답 수 기록. 429면 Retry-After(초)를 반환"""
+    SLACK_API_SECONDS.labels(method).observe(time.perf_counter() - started)
+    if error is None:
+        return None
+    retry_after = get_retry_after(error)
+    if retry_after is not None:
+        SLACK_RATE_LIMITED_TOTAL.labels(method).inc()
+    return retry_after
+
 class SlackProcess:
     def __init__(self, bolt_app):
         self.client = bolt_app.client
@@ -11,28 +35,37 @@ class SlackProcess:
     def chat_update(self, channel_id, text, ts, retry_count=3):
         """메시지 업데이트"""
         for attempt in range(retry_count):
+            started = time.perf_counter()
             try:
                 response = self.client.chat_update(
                     channel=channel_id,
                     ts=ts,
                     text=text
                 )
+                record_slack_call("chat.update", started)
                 return response
             except Exception as e:
+                retry_after = record_slack_call("chat.update", started, e)
                 if attempt == retry_count - 1:
                     debug_print(f"Failed to update message after {retry_count} attempts: {e}")
                     raise e
-                time.sleep(0.5)
+                # 속도 제한(429)이면 Retry-After 만큼 대기
+                SLACK_RETRIES_TOTAL.labels("chat.update").inc()
+                time.sleep(retry_after if retry_after is not None else 0.5)
     
     def post_message(self, channel_id, text, thread_ts=None):
         """새 메시지 전송"""
+        started = time.perf_counter()
         try:
-            return self.client.chat_postMessage(
+            response = self.client.chat_postMessage(
                 channel=channel_id,
                 text=text,
                 thread_ts=thread_ts
             )
+            record_slack_call("chat.postMessage", started)
+            return response
         except Exception as e:
+            record_slack_call("chat.postMessage", started, e)
             debug_print(f"Failed to post message: {e}")
             raise e
     
@@ -48,6 +81,49 @@ class SlackProcess:
             raise e
 
 
+
+class AsyncSlackProcess:
+    """AsyncApp용 SlackProcess (bolt_app.client는 AsyncWebClient)"""
+    def __init__(self, bolt_app):
+        self.client = bolt_app.client
+    
+    async def chat_update(self, channel_id, text, ts, retry_count=3):
+        """메시지 업데이트"""
+        for attempt in range(retry_count):
+            started = time.perf_counter()
+            try:
+                response = await self.client.chat_update(
+                    channel=channel_id,
+                    ts=ts,
+                    text=text
+                )
+                record_slack_call("chat.update", started)
+                return response
+            except Exception as e:
+                retry_after = record_slack_call("chat.update", started, e)
+                if attempt == retry_count - 1:
+                    debug_print(f"Failed to update message after {retry_count} attempts: {e}")
+                    raise e
+                SLACK_RETRIES_TOTAL.labels("chat.update").inc()
+                await asyncio.sleep(retry_after if retry_after is not None else 0.5)
+    
+    async def post_message(self, channel_id, text, thread_ts=None):
+        """새 메시지 전송"""
+        started = time.perf_counter()
+        try:
+            response = await self.client.chat_postMessage(
+                channel=channel_id,
+                text=text,
+                thread_ts=thread_ts
+            )
+            record_slack_call("chat.postMessage", started)
+            return response
+        except Exception as e:
+            record_slack_call("chat.postMessage", started, e)
+            debug_print(f"Failed to post message: {e}")
+            raise e
+
+
 #TODO - Sending messages using incoming webhooks
 # def webhook_post(message):
 #     '''
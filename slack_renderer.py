@@ -0,0 +1,128 @@
+from config import *
+from utils import debug_print
+
+class StreamRenderer:
+    """스트리밍 답변을 Slack 스레드 메시지 여러 개로 나눠 표시합니다.
+    현재 메시지가 max_chars를 넘으면 그 부분을 고정하고 새 메시지로 이어서 출력하며,
+    갱신은 항상 마지막(tail) 메시지에만 하므로 답변 길이와 관계없이 갱신 비용이 일정합니다.
+    이어쓰기 메시지 전송과 수정은 모두 updater(속도 제한, Retry-After 처리)를 거칩니다."""
+
+    def __init__(self, updater, channel_id, thread_ts, head_ts, max_chars=slack_message_max_chars):
+        self.updater = updater
+        self.channel_id = channel_id
+        self.thread_ts = thread_ts
+        self.max_chars = max_chars
+
+        self.messages = [head_ts]   # 답변을 표시 중인 메시지 ts (마지막이 tail)
+        self.tail_chunks = []
+
+    def append(self, text):
+        if text:
+            self.tail_chunks.append(text)
+
+    def replace(self, text):
+        """message_replace: 전체 답변을 다시 배치 (기존 메시지를 순서대로 재사용)"""
+        previous = self._restart(text)
+        self._freeze_overflow(reuse=previous[1:])
+        # 새 배치에서 쓰이지 않는 이어쓰기 메시지는 비움
+        for ts in previous[len(self.messages):]:
+            self.updater.submit(self.channel_id, ts, "⋯")
+
+    def update(self, suffix=" ⏳ ..."):
+        """tail 메시지 갱신 (넘친 부분은 고정 후 새 메시지로)"""
+        self._freeze_overflow()
+        self.updater.submit(self.channel_id, self.messages[-1], self._tail_text() + suffix)
+
+    def finish(self, suffix=""):
+        """최종 텍스트 전송 후 완료까지 대기"""
+        self._freeze_overflow()
+        self.updater.flush(self.channel_id, self.messages[-1], self._tail_text() + suffix)
+
+    def fail(self, message):
+        """오류 표시. 이미 고정된 앞 메시지는 그대로 두고 tail 메시지의 부분 답변 뒤에 덧붙임"""
+        self.updater.flush(self.channel_id, self.messages[-1], self._fail_text(message))
+
+    def _freeze_overflow(self, reuse=()):
+        reuse = list(reuse)
+        while (split := self._split_overflow()) is not None:
+            part, rest = split
+            # 이어쓰기 메시지를 먼저 만든 뒤 현재 메시지를 고정 (전송에 실패하면 현재 메시지는 tail로 남음)
+            next_ts = reuse.pop(0) if reuse else self.updater.post(self.channel_id, "⏳ ...", self.thread_ts)['ts']
+            self.updater.flush(self.channel_id, self.messages[-1], part)
+            self._advance(next_ts, rest)
+
+    def _restart(self, text):
+        """답변을 text부터 다시 배치하고 이전 메시지 목록을 반환"""
+        previous = self.messages
+        self.messages = [previous[0]]
+        self.tail_chunks = [text] if text else []
+        return previous
+
+    def _tail_text(self):
+        if len(self.tail_chunks) > 1:
+            self.tail_chunks = ["".join(self.tail_chunks)]
+        return self.tail_chunks[0] if self.tail_chunks else ""
+
+    def _fail_text(self, message):
+        tail = self._tail_text()
+        if len(tail) > self.max_chars:
+            # 이어쓰기 메시지를 만들지 못한 경우: 한 메시지에 들어가는 만큼만 표시
+            tail = tail[:self._split_point(tail)] + " …"
+        return f"{tail}\n{message}" if tail else message
+
+    def _split_overflow(self):
+        """tail이 max_chars를 넘으면 (현재 메시지에 고정할 부분, 다음 메시지로 넘길 나머지), 아니면 None"""
+        tail = self._tail_text()
+        if len(tail) <= self.max_chars:
+            return None
+        cut = self._split_point(tail)
+        part, rest = tail[:cut], tail[cut:]
+        # 코드 블록이 나뉘면 현재 메시지에서 닫고 다음 메시지에서 다시 연다
+        if part.count("```") % 2:
+            part += "\n```"
+            rest = "```\n" + rest
+        return part, rest
+
+    def _advance(self, next_ts, rest):
+        """현재 메시지를 고정하고 next_ts를 새 tail로"""
+        self.messages.append(next_ts)
+        self.tail_chunks = [rest] if rest else []
+        debug_print(f"Continued answer in new message: {next_ts} ({len(self.messages)} parts)")
+
+    def _split_point(self, text):
+        """max_chars 이내에서 줄바꿈 > 공백 > 고정 길이 순으로 자를 위치 선택"""
+        limit = self.max_chars
+        cut = text.rfind("\n", 0, limit)
+        if cut < limit // 2:
+            cut = text.rfind(" ", 0, limit)
+        if cut < limit // 2:
+            return limit
+        return cut + 1
+
+class AsyncStreamRenderer(StreamRenderer):
+    """StreamRenderer의 asyncio 버전 (AsyncSlackUpdateScheduler 사용). 나누는 방식은 같고 전송만 await 합니다."""
+
+    async def replace(self, text):
+        previous = self._restart(text)
+        await self._freeze_overflow(reuse=previous[1:])
+        for ts in previous[len(self.messages):]:
+            self.updater.submit(self.channel_id, ts, "⋯")
+
+    async def update(self, suffix=" ⏳ ..."):
+        await self._freeze_overflow()
+        self.updater.submit(self.channel_id, self.messages[-1], self._tail_text() + suffix)
+
+    async def finish(self, suffix=""):
+        await self._freeze_overflow()
+        await self.updater.flush(self.channel_id, self.messages[-1], self._tail_text() + suffix)
+
+    async def fail(self, message):
+        await self.updater.flush(self.channel_id, self.messages[-1], self._fail_text(message))
+
+    async def _freeze_overflow(self, reuse=()):
+        reuse = list(reuse)
+        while (split := self._split_overflow()) is not None:
+            part, rest = split
+            next_ts = reuse.pop(0) if reuse else (await self.updater.post(self.channel_id, "⏳ ...", self.thread_ts))['ts']
+            await self.updater.flush(self.channel_id, self.messages[-1], part)
+            self._advance(next_ts, rest)
@@ -0,0 +1,72 @@
+import signal
+import threading
+from slack_bolt.adapter.socket_mode import SocketModeHandler
+
+from config import *
+from utils import debug_print
+from db_handler import ConversationDB, UserDB, EventDB, get_connection_pool
+from job_queue import JobQueue
+from slack_dify_bot import SlackBot
+
+class SlackSocketModeServer:
+    """Socket Mode(WebSocket)로 이벤트를 받는 서버. 공개 HTTP 엔드포인트와 요청별 서명 검증이 필요 없으며,
+    SlackBotServer와 같은 SlackBot 핸들러를 사용합니다. 연결을 여러 개 열어 두면 하나가 끊겨도(재연결 중에도)
+    Slack이 나머지 연결로 이벤트를 보냅니다."""
+    def __init__(self, app_token=slack_app_token, connections=socket_mode_connections, concurrency=socket_mode_concurrency):
+        self.conv_db = ConversationDB(
+            host=redis_host,
+            port=redis_port,
+            db=redis_conv_db,
+            pw=redis_password
+        )
+        self.user_db = UserDB(
+            host=redis_host,
+            port=redis_port,
+            db=redis_user_db,
+            pw=redis_password
+        )
+        self.event_db = EventDB(
+            host=redis_host,
+            port=redis_port,
+            db=redis_conv_db,
+            pw=redis_password
+        )
+        self.job_queue = None
+        if job_queue_enabled:
+            self.job_queue = JobQueue(get_connection_pool(redis_host, redis_port, redis_conv_db, redis_password))
+        self.bot = SlackBot(self.user_db, self.conv_db, self.event_db, self.job_queue)
+        
+        # 연결마다 concurrency개 스레드로 ack까지만 처리하고, 답변 생성은 SlackBot의 작업 풀(worker_max_concurrency)에서 실행
+        self.handlers = [
+            SocketModeHandler(self.bot.bolt_app, app_token, concurrency=concurrency)
+            for _ in range(connections)
+        ]
+        self.stopped = threading.Event()
+        debug_print(f"Socket Mode server created with {connections} connections")
+    
+    def connect(self):
+        for handler in self.handlers:
+            handler.connect()
+    
+    def shutdown(self, timeout=shutdown_drain_timeout):
+        """연결을 닫아 새 이벤트를 받지 않고, 진행 중인 답변을 마친 뒤 종료"""
+        for handler in self.handlers:
+            try:
+                handler.close()
+            except Exception as e:
+                debug_print(f"Error closing Socket Mode connection: {e}")
+        self.bot.drain(timeout)
+        self.stopped.set()
+    
+    def run(self):
+        def stop(signum, frame):
+            debug_print(f"Received signal {signum}, shutting down")
+            threading.Thread(target=self.shutdown, name="socket-mode-shutdown").start()
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        self.connect()
+        self.stopped.wait()
+
+if __name__ == '__main__':
+    server = SlackSocketModeServer()
+    server.run()
@@ -0,0 +1,354 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import *
+from utils import debug_print
+from slack_process import get_retry_after
+from metrics import SLACK_RETRIES_TOTAL
+
+class TokenBucket:
+    """초당 rate개, 최대 capacity개의 토큰. 429 발생 시 전송률을 낮추고(곱셈 감소) 성공 시 서서히 회복(덧셈 증가)"""
+    def __init__(self, rate, capacity, min_rate=0.05):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def delay(self, now):
+        """토큰을 얻기까지 남은 시간 (0이면 즉시 사용 가능)"""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self.tokens -= 1
+
+    def throttle(self, retry_after, now):
+        """Retry-After 동안 차단하고 전송률을 절반으로"""
+        self.blocked_until = max(self.blocked_until, now + retry_after)
+        self.rate = max(self.min_rate, self.rate * 0.5)
+        self.tokens = 0.0
+
+    def recover(self):
+        self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+class _PendingUpdate:
+    __slots__ = ("text", "final", "waiters")
+
+    def __init__(self, text, final):
+        self.text = text
+        self.final = final
+        self.waiters = []
+
+class _UpdateQueue:
+    """chat.update 스케줄러의 공통 부분 (합치기, 토큰 버킷, Retry-After 처리).
+    스레드 버전은 self.cond를 잡은 상태에서, asyncio 버전은 이벤트 루프 안에서만 호출합니다."""
+
+    def __init__(self, slack, interval, workspace_rate, workspace_burst, channel_rate, channel_burst):
+        self.slack = slack
+        self.interval = interval
+        self.channel_rate = channel_rate
+        self.channel_burst = channel_burst
+
+        self.pending = {}          # (channel, ts) -> _PendingUpdate
+        self.in_flight = set()
+        self.last_sent = {}        # (channel, ts) -> 마지막 전송 시각
+        self.workspace_bucket = TokenBucket(workspace_rate, workspace_burst)
+        self.channel_buckets = {}
+        self.last_prune = time.monotonic()
+
+        self.sent = 0
+        self.coalesced = 0
+        self.rate_limited = 0
+        self.failed = 0
+
+    def _enqueue(self, key, text, final, waiter):
+        entry = self.pending.get(key)
+        if entry is None:
+            entry = self.pending[key] = _PendingUpdate(text, final)
+        else:
+            entry.text = text
+            entry.final = entry.final or final
+            self.coalesced += 1
+        entry.waiters.append(waiter)
+
+    def _stats(self):
+        return {
+            "pending": len(self.pending),
+            "in_flight": len(self.in_flight),
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "rate_limited": self.rate_limited,
+            "failed": self.failed,
+            "workspace_rate": self.workspace_bucket.rate,
+        }
+
+    def _channel_bucket(self, channel_id):
+        bucket = self.channel_buckets.get(channel_id)
+        if bucket is None:
+            bucket = self.channel_buckets[channel_id] = TokenBucket(self.channel_rate, self.channel_burst)
+        return bucket
+
+    def _take_post_token(self, channel_id):
+        """새 메시지 전송용 채널 토큰. (버킷, 대기 시간) - 대기 시간이 0이면 토큰을 사용한 것"""
+        bucket = self._channel_bucket(channel_id)
+        delay = bucket.delay(time.monotonic())
+        if delay <= 0:
+            bucket.consume()
+        return bucket, delay
+
+    def _post_rate_limited(self, bucket, retry_after):
+        self.rate_limited += 1
+        bucket.throttle(retry_after, time.monotonic())
+        SLACK_RETRIES_TOTAL.labels("chat.postMessage").inc()
+
+    def _dispatch_ready(self, now):
+        """전송 가능한 업데이트를 발송하고 다음 확인까지의 대기 시간을 반환"""
+        if now - self.last_prune > 60:
+            self._prune(now)
+
+        next_check = None
+        for key in list(self.pending):
+            if key in self.in_flight:
+                continue
+            channel_id, _ = key
+            entry = self.pending[key]
+
+            delay = self.workspace_bucket.delay(now)
+            if delay > 0:
+                return delay
+
+            delay = self._channel_bucket(channel_id).delay(now)
+            if not entry.final:
+                delay = max(delay, self.last_sent.get(key, 0.0) + self.interval - now)
+            if delay > 0:
+                next_check = delay if next_check is None else min(next_check, delay)
+                continue
+
+            self.workspace_bucket.consume()
+            self._channel_bucket(channel_id).consume()
+            del self.pending[key]
+            self.in_flight.add(key)
+            self._start_send(key, entry)
+        return next_check
+
+    def _start_send(self, key, entry):
+        raise NotImplementedError
+
+    def _sent(self, key):
+        self.sent += 1
+        self.workspace_bucket.recover()
+        self._channel_bucket(key[0]).recover()
+
+    def _send_failed(self, key, entry, error):
+        """전송 실패 처리. 속도 제한이면 다시 예약하고 True"""
+        retry_after = get_retry_after(error)
+        if retry_after is None:
+            self.failed += 1
+            debug_print(f"Failed to update message {key}: {error}")
+            return False
+        now = time.monotonic()
+        self.rate_limited += 1
+        SLACK_RETRIES_TOTAL.labels("chat.update").inc()
+        self.workspace_bucket.throttle(retry_after, now)
+        self._channel_bucket(key[0]).throttle(retry_after, now)
+        # 그 사이 더 최신 텍스트가 들어왔으면 대기자만 넘기고, 아니면 다시 예약
+        newer = self.pending.get(key)
+        if newer is None:
+            self.pending[key] = entry
+        else:
+            newer.final = newer.final or entry.final
+            newer.waiters.extend(entry.waiters)
+        return True
+
+    def _send_done(self, key, entry, requeued):
+        self.in_flight.discard(key)
+        if not requeued:
+            if entry.final and key not in self.pending:
+                self.last_sent.pop(key, None)
+            else:
+                self.last_sent[key] = time.monotonic()
+            for waiter in entry.waiters:
+                waiter.set()
+
+    def _prune(self, now):
+        """오래된 메시지별 전송 기록과 유휴 채널 버킷 정리"""
+        self.last_prune = now
+        for key, sent_at in list(self.last_sent.items()):
+            if now - sent_at > 60 and key not in self.pending:
+                del self.last_sent[key]
+        active_channels = {channel_id for channel_id, _ in self.pending}
+        for channel_id, bucket in list(self.channel_buckets.items()):
+            if channel_id not in active_channels and bucket.delay(now) == 0 and bucket.tokens >= bucket.capacity:
+                del self.channel_buckets[channel_id]
+
+class SlackUpdateScheduler(_UpdateQueue):
+    """chat.update 스케줄러. (channel, ts)별로 대기 중인 수정은 최신 텍스트 하나로 합치고,
+    워크스페이스/채널별 토큰 버킷과 Retry-After에 맞춰 전송합니다."""
+
+    def __init__(self, slack,
+                 interval=slack_update_interval,
+                 workspace_rate=slack_update_workspace_rate,
+                 workspace_burst=slack_update_workspace_burst,
+                 channel_rate=slack_update_channel_rate,
+                 channel_burst=slack_update_channel_burst,
+                 max_senders=slack_update_senders):
+        super().__init__(slack, interval, workspace_rate, workspace_burst, channel_rate, channel_burst)
+        self.cond = threading.Condition()
+        self.senders = ThreadPoolExecutor(max_workers=max_senders, thread_name_prefix="slack-update")
+        threading.Thread(target=self._run, name="slack-update-scheduler", daemon=True).start()
+
+    def submit(self, channel_id, ts, text, final=False):
+        """업데이트 예약 후 전송(또는 더 최신 텍스트로 대체) 완료 시 set 되는 Event 반환"""
+        done = threading.Event()
+        with self.cond:
+            self._enqueue((channel_id, ts), text, final, done)
+            self.cond.notify()
+        return done
+
+    def flush(self, channel_id, ts, text, timeout=30):
+        """최종 업데이트. 메시지별 최소 간격은 건너뛰고 전송 완료까지 대기"""
+        return self.submit(channel_id, ts, text, final=True).wait(timeout)
+
+    def post(self, channel_id, text, thread_ts=None, retry_count=3):
+        """새 메시지 전송 (답변 이어쓰기 등). 수정과 같은 채널 버킷을 거치고, 429면 Retry-After 이후 재시도"""
+        for attempt in range(retry_count):
+            while True:
+                with self.cond:
+                    bucket, delay = self._take_post_token(channel_id)
+                if delay <= 0:
+                    break
+                time.sleep(delay)
+            try:
+                response = self.slack.post_message(channel_id, text, thread_ts)
+            except Exception as e:
+                retry_after = get_retry_after(e)
+                if retry_after is None or attempt == retry_count - 1:
+                    raise
+                with self.cond:
+                    self._post_rate_limited(bucket, retry_after)
+                continue
+            with self.cond:
+                bucket.recover()
+            return response
+
+    def stats(self):
+        with self.cond:
+            return self._stats()
+
+    def _run(self):
+        with self.cond:
+            while True:
+                timeout = self._dispatch_ready(time.monotonic())
+                self.cond.wait(timeout)
+
+    def _start_send(self, key, entry):
+        self.senders.submit(self._send, key, entry)
+
+    def _send(self, key, entry):
+        channel_id, ts = key
+        requeued = False
+        try:
+            self.slack.chat_update(channel_id, entry.text, ts, retry_count=1)
+            with self.cond:
+                self._sent(key)
+        except Exception as e:
+            with self.cond:
+                requeued = self._send_failed(key, entry, e)
+        finally:
+            with self.cond:
+                self._send_done(key, entry, requeued)
+                self.cond.notify()
+
+class AsyncSlackUpdateScheduler(_UpdateQueue):
+    """SlackUpdateScheduler의 asyncio 버전 (AsyncSlackProcess 사용).
+    스레드 없이 이벤트 루프의 태스크 하나가 전송 시점을 정하므로 스트림 수가 많아도 스레드가 늘지 않습니다."""
+
+    def __init__(self, slack,
+                 interval=slack_update_interval,
+                 workspace_rate=slack_update_workspace_rate,
+                 workspace_burst=slack_update_workspace_burst,
+                 channel_rate=slack_update_channel_rate,
+                 channel_burst=slack_update_channel_burst):
+        super().__init__(slack, interval, workspace_rate, workspace_burst, channel_rate, channel_burst)
+        self.wakeup = None
+        self.dispatcher = None
+        self.senders = set()
+
+    def submit(self, channel_id, ts, text, final=False):
+        """업데이트 예약 (이벤트 루프 안에서 호출). 전송 완료 시 set 되는 asyncio.Event 반환"""
+        done = asyncio.Event()
+        self._enqueue((channel_id, ts), text, final, done)
+        self._wake()
+        return done
+
+    async def flush(self, channel_id, ts, text, timeout=30):
+        """최종 업데이트. 메시지별 최소 간격은 건너뛰고 전송 완료까지 대기"""
+        try:
+            await asyncio.wait_for(self.submit(channel_id, ts, text, final=True).wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def post(self, channel_id, text, thread_ts=None, retry_count=3):
+        """새 메시지 전송. 수정과 같은 채널 버킷을 거치고, 429면 Retry-After 이후 재시도"""
+        for attempt in range(retry_count):
+            while True:
+                bucket, delay = self._take_post_token(channel_id)
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+            try:
+                response = await self.slack.post_message(channel_id, text, thread_ts)
+            except Exception as e:
+                retry_after = get_retry_after(e)
+                if retry_after is None or attempt == retry_count - 1:
+                    raise
+                self._post_rate_limited(bucket, retry_after)
+                continue
+            bucket.recover()
+            return response
+
+    def stats(self):
+        return self._stats()
+
+    def _wake(self):
+        # 루프마다 전송 태스크 하나 (루프가 바뀌면, 예: 테스트, 새로 시작)
+        if self.dispatcher is None or self.dispatcher.done():
+            self.wakeup = asyncio.Event()
+            self.dispatcher = asyncio.get_running_loop().create_task(self._run())
+        self.wakeup.set()
+
+    async def _run(self):
+        while True:
+            self.wakeup.clear()
+            timeout = self._dispatch_ready(time.monotonic())
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _start_send(self, key, entry):
+        task = asyncio.get_running_loop().create_task(self._send(key, entry))
+        self.senders.add(task)
+        task.add_done_callback(self.senders.discard)
+
+    async def _send(self, key, entry):
+        channel_id, ts = key
+        requeued = False
+        try:
+            await self.slack.chat_update(channel_id, entry.text, ts, retry_count=1)
+            self._sent(key)
+        except Exception as e:
+            requeued = self._send_failed(key, entry, e)
+        finally:
+            self._send_done(key, entry, requeued)
+            self.wakeup.set()
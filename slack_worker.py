@@ -0,0 +1,47 @@
+import signal
+
+from config import *
+from utils import debug_print
+from db_handler import ConversationDB, UserDB, EventDB, get_connection_pool
+from job_queue import JobQueue, JobWorker
+from slack_dify_bot import SlackBot
+
+class SlackWorker:
+    """JobQueue에서 작업을 받아 Dify 응답을 스트리밍하는 워커 프로세스.
+    job_queue_enabled로 실행한 SlackBotServer와 함께 사용하며, 프로세스 수를 늘려 수평 확장합니다."""
+    def __init__(self):
+        self.conv_db = ConversationDB(
+            host=redis_host,
+            port=redis_port,
+            db=redis_conv_db,
+            pw=redis_password
+        )
+        self.user_db = UserDB(
+            host=redis_host,
+            port=redis_port,
+            db=redis_user_db,
+            pw=redis_password
+        )
+        # 중단 요청(반응)은 ingress 서버가 Redis에 기록
+        self.event_db = EventDB(
+            host=redis_host,
+            port=redis_port,
+            db=redis_conv_db,
+            pw=redis_password
+        )
+        self.bot = SlackBot(self.user_db, self.conv_db, self.event_db)
+        self.queue = JobQueue(get_connection_pool(redis_host, redis_port, redis_conv_db, redis_password))
+        self.worker = JobWorker(self.queue, self.bot.handle_job)
+
+    def run(self):
+        # SIGTERM/SIGINT: 새 작업은 받지 않고 진행 중인 작업만 마친 뒤 종료
+        def stop(signum, frame):
+            debug_print(f"Received signal {signum}, stopping worker")
+            self.worker.stop()
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        self.worker.run()
+
+if __name__ == '__main__':
+    worker = SlackWorker()
+    worker.run()
@@ -0,0 +1,149 @@
+import json
+
+# https://html.spec.whatwg.org/multipage/server-sent-events.html#event-stream-interpretation
+# Dify 스트리밍 이벤트: message, agent_message, agent_thought, message_file, message_end,
+# message_replace, tts_message, tts_message_end, workflow_started, node_started, node_finished,
+# workflow_finished, error, ping
+
+ANSWER_EVENTS = ("message", "agent_message")
+
+_json_raw_decode = json.JSONDecoder().raw_decode
+
+class SSEEvent:
+    """파싱된 스트림 이벤트. type은 data의 'event' 값 (없으면 SSE event 필드)"""
+    __slots__ = ("type", "data")
+
+    def __init__(self, type, data):
+        self.type = type
+        self.data = data
+
+    @property
+    def answer(self):
+        return self.data.get("answer", "")
+
+    @property
+    def conversation_id(self):
+        return self.data.get("conversation_id")
+
+    @property
+    def task_id(self):
+        return self.data.get("task_id")
+
+    def is_answer(self):
+        return self.type in ANSWER_EVENTS
+
+    def is_workflow(self):
+        return self.type.startswith(("workflow_", "node_"))
+
+    def __repr__(self):
+        return f"SSEEvent({self.type!r}, {self.data!r})"
+
+class SSEParser:
+    """증분 SSE 파서. 네트워크에서 받은 바이트 청크를 그대로 넣으면 완성된 이벤트만 반환합니다.
+    줄 단위가 아닌 청크 단위로 한 번만 디코딩/분할하며, 여러 줄의 data 필드를 하나로 합칩니다."""
+
+    def __init__(self):
+        self.pending = []
+        self.data_lines = []
+        self.event_name = None
+
+    def feed(self, chunk):
+        """청크를 처리하고 완성된 SSEEvent 리스트를 반환"""
+        end = chunk.rfind(b"\n")
+        if end == -1:
+            # 줄이 끝나지 않은 조각은 모아 두었다가 한 번에 합침
+            self.pending.append(chunk)
+            return []
+        block = chunk[:end]
+        if self.pending:
+            self.pending.append(block)
+            block = b"".join(self.pending)
+            self.pending = []
+        if end + 1 < len(chunk):
+            self.pending.append(chunk[end + 1:])
+
+        # 마지막 줄바꿈까지는 항상 문자 경계이므로 청크 단위로 한 번에 디코딩
+        text = block.decode("utf-8", "replace")
+        if "\r" in text:
+            text = text.replace("\r\n", "\n")
+        events = []
+        data_lines = self.data_lines
+        for line in text.split("\n"):
+            if not line:
+                if data_lines or self.event_name:
+                    events.append(self._dispatch())
+                    data_lines = self.data_lines
+                continue
+            if line.startswith("data: "):
+                data_lines.append(line[6:])
+                continue
+            if line[0] == ":":  # 주석
+                continue
+            field, _, value = line.partition(":")
+            if value[:1] == " ":
+                value = value[1:]
+            if field == "data":
+                data_lines.append(value)
+            elif field == "event":
+                self.event_name = value
+        return events
+
+    def close(self):
+        """스트림 종료 시 빈 줄 없이 끝난 마지막 이벤트 처리"""
+        events = self.feed(b"\n") if self.pending else []
+        event = self._dispatch()
+        if event is not None:
+            events.append(event)
+        return events
+
+    def _dispatch(self):
+        data_lines, event_name = self.data_lines, self.event_name
+        self.data_lines = []
+        self.event_name = None
+        if not data_lines:
+            return SSEEvent(event_name, {}) if event_name else None
+
+        payload = data_lines[0] if len(data_lines) == 1 else "\n".join(data_lines)
+        try:
+            data = _json_raw_decode(payload)[0]
+        except ValueError:
+            try:
+                data = json.loads(payload)
+            except ValueError:
+                data = {"answer": payload}
+        if not isinstance(data, dict):
+            data = {"answer": data}
+        return SSEEvent(data.get("event") or event_name or "message", data)
+
+def iter_events(response, chunk_size=None):
+    """requests 스트리밍 응답에서 SSEEvent를 순서대로 반환"""
+    parser = SSEParser()
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        if chunk:
+            yield from parser.feed(chunk)
+    yield from parser.close()
+
+class AnswerBuffer:
+    """답변 조각을 리스트에 모아 두고 텍스트가 필요할 때만 합칩니다 (청크마다 문자열 재생성 방지)"""
+
+    def __init__(self):
+        self.chunks = []
+        self.length = 0
+
+    def append(self, text):
+        if text:
+            self.chunks.append(text)
+            self.length += len(text)
+
+    def replace(self, text):
+        """message_replace 이벤트: 지금까지의 답변을 교체"""
+        self.chunks = [text] if text else []
+        self.length = len(text)
+
+    def text(self):
+        if len(self.chunks) > 1:
+            self.chunks = ["".join(self.chunks)]
+        return self.chunks[0] if self.chunks else ""
+
+    def __len__(self):
+        return self.length
@@ -0,0 +1,72 @@
+import os
+import sys
+import socket
+import tempfile
+import threading
+
+import pytest
+
+# 테스트는 저장소 루트의 모듈을 그대로 import
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stubs import StubSlack, StubDify
+
+# config는 import 시점의 환경 변수를 읽으므로 봇 모듈보다 먼저 로컬 스텁 서버를 띄우고 주소를 설정
+SLACK = StubSlack()
+DIFY = StubDify()
+os.environ["slack_base_url"] = f"{SLACK.url}/api/"
+os.environ["dify_base_url"] = DIFY.url
+os.environ.setdefault("slack_OAuth_token", "xoxb-test")
+os.environ.setdefault("slack_signing_secret", "test-secret")
+os.environ.setdefault("dify_api_key", "test")
+os.environ.setdefault("log_sample_rates", "slack_event=0,llm_response=0,llm_timing=0,api_status=0")
+os.environ.setdefault("fallback_store_path", "")
+os.environ.setdefault("slack_update_interval", "0.1")
+# 테스트 로그는 저장소의 ./logs 대신 임시 디렉터리에 기록
+os.environ.setdefault("log_dir", tempfile.mkdtemp(prefix="dify-bot-logs-"))
+
+@pytest.fixture
+def slack_stub():
+    SLACK.reset()
+    return SLACK
+
+@pytest.fixture
+def dify_stub():
+    DIFY.reset()
+    yield DIFY
+    DIFY.release.set()
+
+@pytest.fixture
+def redis_pool():
+    import redis
+    import fakeredis
+    return redis.ConnectionPool(connection_class=fakeredis.FakeRedisConnection, server=fakeredis.FakeServer(),
+                                db=0, decode_responses=True)
+
+@pytest.fixture
+def bot(slack_stub, dify_stub, redis_pool):
+    """스텁 Slack/Dify와 fakeredis를 사용하는 SlackBot"""
+    from db_handler import UserDB, ConversationDB, EventDB
+    from slack_dify_bot import SlackBot
+    return SlackBot(UserDB(connection_pool=redis_pool, local_cache=False),
+                    ConversationDB(connection_pool=redis_pool, local_cache=False),
+                    EventDB(connection_pool=redis_pool, local_cache=False))
+
+@pytest.fixture
+def stuck_server():
+    """연결은 받지만 아무 응답도 하지 않는 서버의 포트 (멈춘 Redis/Dify)"""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+    clients = []
+    def accept():
+        while True:
+            try:
+                clients.append(server.accept()[0])
+            except OSError:
+                return
+    threading.Thread(target=accept, daemon=True).start()
+    yield server.getsockname()[1]
+    server.close()
+    for client in clients:
+        client.close()
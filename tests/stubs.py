@@ -0,0 +1,160 @@
+import json
+import time
+import uuid
+import threading
+import urllib.parse
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def wait_until(predicate, timeout=5, interval=0.02):
+    """predicate가 참이 될 때까지 대기 (시간 초과 시 False)"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(interval)
+    return predicate()
+
+class StubServer:
+    """테스트용 로컬 HTTP 서버 (별도 스레드). 요청은 handle(handler, method, path, body)로 전달"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                stub.handle(self, "GET", self.path, b"")
+
+            def do_POST(self):
+                stub.handle(self, "POST", self.path, self.rfile.read(int(self.headers.get("Content-Length", 0))))
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    @staticmethod
+    def reply(handler, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+class StubSlack(StubServer):
+    """Slack Web API 스텁. rate_limited[method]번은 429(Retry-After), errors[method]번은 ok=false로 응답"""
+    def __init__(self):
+        super().__init__()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.calls = []             # (method, args, status, ts)
+            self.rate_limited = Counter()
+            self.errors = Counter()
+            self.ts_counter = 0
+
+    def handle(self, handler, http_method, path, body):
+        method = path.rsplit("/", 1)[-1]
+        raw = body.decode()
+        args = json.loads(raw) if raw.startswith("{") else dict(urllib.parse.parse_qsl(raw))
+        headers = None
+        with self.lock:
+            if self.rate_limited[method] > 0:
+                self.rate_limited[method] -= 1
+                status, payload, headers = 429, {"ok": False, "error": "ratelimited"}, {"Retry-After": "1"}
+            elif self.errors[method] > 0:
+                self.errors[method] -= 1
+                status, payload = "error", {"ok": False, "error": "internal_error"}
+            else:
+                status, payload = 200, self._result(method, args)
+            self.calls.append((method, args, status, payload.get("ts")))
+            status = 200 if status == "error" else status
+        self.reply(handler, status, payload, headers)
+
+    def _result(self, method, args):
+        if method == "auth.test":
+            return {"ok": True, "user_id": "UBOT", "bot_id": "BBOT", "team_id": "T000", "user": "bot"}
+        ts = args.get("ts")
+        if method == "chat.postMessage":
+            self.ts_counter += 1
+            ts = f"{1000 + self.ts_counter}.000000"
+        return {"ok": True, "channel": args.get("channel"), "ts": ts, "message": {"text": args.get("text"), "ts": ts}}
+
+    def count(self, method, status=200):
+        with self.lock:
+            return sum(1 for name, _, call_status, _ in self.calls if name == method and call_status == status)
+
+    def successful_posts(self):
+        """전송된 메시지 ts (순서대로)"""
+        with self.lock:
+            return [ts for method, _, status, ts in self.calls if method == "chat.postMessage" and status == 200]
+
+    def texts(self):
+        """메시지 ts별 마지막으로 표시된 텍스트 (전송/수정에 성공한 호출 기준)"""
+        texts = {}
+        with self.lock:
+            for method, args, status, ts in self.calls:
+                if status == 200 and method in ("chat.postMessage", "chat.update"):
+                    texts[ts] = args.get("text")
+        return texts
+
+class StubDify(StubServer):
+    """Dify API 스텁. script의 이벤트(dict)를 SSE로 보내고(숫자는 대기 시간), hang이면 release될 때까지 연결을 유지"""
+    def __init__(self):
+        super().__init__()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.script = []
+            self.hang = False
+            self.release = threading.Event()
+            self.requests = []          # (path, json)
+            self.stopped = []           # 중지 요청된 task_id
+            self.task_id = uuid.uuid4().hex
+
+    def handle(self, handler, http_method, path, body):
+        data = json.loads(body or b"{}")
+        with self.lock:
+            self.requests.append((path, data))
+        if http_method == "GET":
+            self.reply(handler, 200, {"opening_statement": ""})
+        elif path.endswith("/stop"):
+            with self.lock:
+                self.stopped.append(path.split("/")[-2])
+            self.reply(handler, 200, {"result": "success"})
+        else:
+            self._stream(handler)
+
+    def _stream(self, handler):
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Transfer-Encoding", "chunked")
+        handler.end_headers()
+        try:
+            for item in self.script:
+                if isinstance(item, (int, float)):
+                    time.sleep(item)
+                    continue
+                payload = {"task_id": self.task_id, "conversation_id": "conv-1", **item}
+                chunk = f"data: {json.dumps(payload)}\n\n".encode()
+                handler.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                handler.wfile.flush()
+            if self.hang:
+                self.release.wait(30)
+            handler.wfile.write(b"0\r\n\r\n")
+            handler.wfile.flush()
+        except OSError:
+            pass
@@ -0,0 +1,40 @@
+from answer_cache import AnswerCache
+from slack_dify_bot import default_llm_model, default_prompt
+
+def _ask(bot, text, ts, thread_ts="10.0"):
+    tmp_ts = bot.slack.post_message("C001", "잠시만 기다려주세요...🤔", thread_ts)['ts']
+    event = {"channel": "C001", "ts": ts, "thread_ts": thread_ts, "user": "U001", "text": text}
+    bot._handle_conversation(event, tmp_ts, "C001", thread_ts)
+    return tmp_ts
+
+def test_follow_up_after_cache_hit_is_sent_with_context(bot, slack_stub, dify_stub):
+    bot.answer_cache = AnswerCache()
+    key = bot.answer_cache.key(default_llm_model, default_prompt, "서버 재시작 방법")
+    bot.answer_cache.set(key, "systemctl restart app")
+
+    # 스레드 첫 질문: 캐시된 답변
+    tmp_ts = _ask(bot, "서버 재시작 방법", "10.0")
+    assert slack_stub.texts()[tmp_ts].startswith("systemctl restart app")
+    assert dify_stub.requests == []
+
+    # 후속 질문: 캐시를 쓰지 않고 앞 질문/답변을 맥락으로 Dify에 전송
+    bot.answer_cache.set(bot.answer_cache.key(default_llm_model, default_prompt, "더 자세히"), "다른 스레드의 답변")
+    dify_stub.script = [{"event": "message", "answer": "자세한 답변"}, {"event": "message_end"}]
+    tmp_ts = _ask(bot, "더 자세히", "11.0")
+
+    assert slack_stub.texts()[tmp_ts].startswith("자세한 답변")
+    (_, request), = dify_stub.requests
+    assert "이전 질문: 서버 재시작 방법" in request["query"]
+    assert "이전 답변: systemctl restart app" in request["query"]
+    assert request["query"].endswith("더 자세히")
+    # 새로 만든 conversation을 스레드에 연결
+    assert bot.conv_db.get_conversation("C001", "10.0") == "conv-1"
+
+def test_follow_up_without_conversation_skips_cache(bot, slack_stub, dify_stub):
+    bot.answer_cache = AnswerCache()
+    bot.answer_cache.set(bot.answer_cache.key(default_llm_model, default_prompt, "더 자세히"), "다른 스레드의 답변")
+    dify_stub.script = [{"event": "message", "answer": "새 답변"}, {"event": "message_end"}]
+
+    tmp_ts = _ask(bot, "더 자세히", "11.0")
+    assert slack_stub.texts()[tmp_ts].startswith("새 답변")
+    assert len(dify_stub.requests) == 1
@@ -0,0 +1,91 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import slack_dify_bot
+import async_slack_dify_bot
+
+@pytest.fixture
+def async_bot(slack_stub, dify_stub, redis_pool):
+    """스텁 Slack/Dify와 fakeredis를 사용하는 AsyncSlackBot"""
+    from db_handler import UserDB, ConversationDB, EventDB
+    from async_slack_dify_bot import AsyncSlackBot
+    return AsyncSlackBot(UserDB(connection_pool=redis_pool, local_cache=False),
+                         ConversationDB(connection_pool=redis_pool, local_cache=False),
+                         EventDB(connection_pool=redis_pool, local_cache=False))
+
+def _run_mention(bot, timeout=5):
+    """app_mention 이벤트를 리스너에 전달하고 답변 태스크가 끝날 때까지 실행"""
+    event = {"type": "app_mention", "user": "U001", "text": "<@UBOT> 질문", "channel": "C001",
+             "ts": "10.0", "client_msg_id": "m-10", "channel_type": "channel"}
+
+    async def say(text, thread_ts):
+        return await bot.slack.post_message(event["channel"], text, thread_ts)
+
+    async def run():
+        await bot.handle_event(event, say, SimpleNamespace(bot_user_id="UBOT"))
+        started = time.monotonic()
+        await bot.drain(timeout)
+        return time.monotonic() - started
+
+    return asyncio.run(run())
+
+def _message(answer):
+    return {"event": "message", "answer": answer}
+
+def test_updates_go_through_rate_limited_updater(async_bot, slack_stub, dify_stub):
+    dify_stub.script = [1.2, _message("안녕"), 0.3, _message("하세요"), {"event": "message_end"}]
+    slack_stub.rate_limited["chat.update"] = 1
+    _run_mention(async_bot)
+
+    head_ts = slack_stub.successful_posts()[0]
+    # 429 이후 Retry-After 동안 대기 애니메이션도 다시 보내지 않음
+    assert slack_stub.count("chat.update", 429) == 1
+    assert async_bot.updater.stats()["rate_limited"] == 1
+    assert slack_stub.texts()[head_ts] == "안녕하세요\n더 필요하신 부분이 있으면 말씀해주세요."
+
+def test_long_answer_continues_in_new_message(async_bot, slack_stub, dify_stub):
+    dify_stub.script = [_message("x" * 3400 + "\n"), 0.3, _message("y" * 100), {"event": "message_end"}]
+    _run_mention(async_bot)
+
+    head_ts, continuation_ts = slack_stub.successful_posts()
+    texts = slack_stub.texts()
+    assert texts[head_ts] == "x" * 3400 + "\n"
+    assert texts[continuation_ts] == "y" * 100 + "\n더 필요하신 부분이 있으면 말씀해주세요."
+
+def test_idle_stream_is_cancelled(async_bot, slack_stub, dify_stub, monkeypatch):
+    monkeypatch.setattr(slack_dify_bot, "dify_idle_timeout", 0.5)
+    dify_stub.script = [_message("부분 답변")]
+    dify_stub.hang = True
+    elapsed = _run_mention(async_bot)
+
+    assert elapsed < 3
+    assert dify_stub.stopped == [dify_stub.task_id]
+    text = slack_stub.texts()[slack_stub.successful_posts()[0]]
+    assert "부분 답변" in text and "0초 동안 멈춰 답변을 중단했습니다" in text
+
+def test_prompt_input_action_saves_prompt(async_bot):
+    async def ack():
+        pass
+
+    body = {"user": {"id": "U001"}, "actions": [{"action_id": "prompt_input", "value": "새 프롬프트"}]}
+    asyncio.run(async_bot.handle_prompt_input(ack, body, None))
+    assert async_bot.user_db.get_current_prompt("U001") == "새 프롬프트"
+
+def test_first_token_is_shown_without_waiting_for_interval(async_bot, slack_stub, dify_stub, monkeypatch):
+    monkeypatch.setattr(async_slack_dify_bot, "slack_update_interval", 5)
+    dify_stub.script = [_message("안녕"), 1.5, {"event": "message_end"}]
+    first_shown = []
+    original_update = slack_stub._result
+    def record(method, args):
+        if method == "chat.update" and args.get("text", "").startswith("안녕 ⏳"):
+            first_shown.append(time.monotonic())
+        return original_update(method, args)
+    monkeypatch.setattr(slack_stub, "_result", record)
+    started = time.monotonic()
+    _run_mention(async_bot)
+
+    # 업데이트 간격(5초)이나 답변 완료(1.5초 후)를 기다리지 않고 첫 토큰 표시
+    assert first_shown and first_shown[0] - started < 1
@@ -0,0 +1,119 @@
+import os
+import json
+import time
+from collections import Counter
+
+import pytest
+
+import slack_dify_bot
+from stubs import wait_until
+from event_router import classify_event, MESSAGE_EVENT_TYPES, MENTION, DM, THREAD_REPLY
+
+BOT = "UBOT"
+
+def _mention(**overrides):
+    event = {"type": "app_mention", "user": "U001", "text": f"<@{BOT}> 안녕", "channel": "C001",
+             "ts": "10.0", "client_msg_id": "m-10", "channel_type": "channel"}
+    event.update(overrides)
+    return event
+
+def _message(**overrides):
+    event = {"type": "message", "user": "U001", "text": "안녕", "channel": "C001",
+             "ts": "30.0", "client_msg_id": "m-30", "channel_type": "channel"}
+    event.update(overrides)
+    return event
+
+def test_event_types_pattern():
+    assert MESSAGE_EVENT_TYPES.match("app_mention")
+    assert MESSAGE_EVENT_TYPES.match("message")
+    assert not MESSAGE_EVENT_TYPES.match("message_changed")
+    assert not MESSAGE_EVENT_TYPES.match("reaction_added")
+
+def test_channel_mention_is_handled_once():
+    # 채널 멘션은 app_mention과 message 이벤트가 함께 도착
+    assert classify_event(_mention(), BOT) == MENTION
+    assert classify_event(_mention(type="message"), BOT) is None
+
+def test_thread_mention_is_handled_as_mention():
+    event = _mention(ts="11.0", thread_ts="10.0")
+    assert classify_event(event, BOT) == MENTION
+    assert classify_event(dict(event, type="message"), BOT) is None
+
+@pytest.mark.parametrize("overrides", [
+    {"bot_id": "B000"},
+    {"user": BOT},
+    {"user": None},
+    {"subtype": "message_changed"},
+    {"subtype": "message_deleted"},
+    {"subtype": "channel_join"},
+    {"subtype": "bot_message", "bot_id": "B000"},
+])
+def test_bot_and_subtype_events_are_ignored(overrides):
+    assert classify_event(_message(channel_type="im", **overrides), BOT) is None
+    assert classify_event(_mention(**overrides), BOT) is None
+
+def test_direct_message():
+    assert classify_event(_message(channel="D001", channel_type="im"), BOT) == DM
+    # DM 스레드 답글도 DM으로 처리
+    assert classify_event(_message(channel="D001", channel_type="im", ts="31.0", thread_ts="30.0"), BOT) == DM
+
+def test_thread_reply_without_mention():
+    assert classify_event(_message(ts="31.0", thread_ts="10.0"), BOT) == THREAD_REPLY
+
+@pytest.mark.parametrize("event", [
+    _message(),                                 # 멘션 없는 채널 메시지
+    _message(thread_ts="30.0"),                 # 스레드 부모 메시지
+    {"type": "reaction_added", "user": "U001", "reaction": "x"},
+])
+def test_unrelated_messages_are_ignored(event):
+    assert classify_event(event, BOT) is None
+
+def _envelope(event, n):
+    return {"token": "t", "team_id": "T000", "api_app_id": "A000", "type": "event_callback",
+            "event_id": f"Ev{n}", "event_time": 1, "event": event}
+
+def _signed_request(body):
+    """Slack 서명 헤더를 붙인 Bolt 요청"""
+    from slack_bolt.request import BoltRequest
+    from slack_sdk.signature import SignatureVerifier
+    raw = json.dumps(body)
+    timestamp = str(int(time.time()))
+    signature = SignatureVerifier(os.environ["slack_signing_secret"]).generate_signature(timestamp=timestamp, body=raw)
+    return BoltRequest(body=raw, headers={"content-type": ["application/json"],
+                                          "x-slack-request-timestamp": [timestamp],
+                                          "x-slack-signature": [signature]})
+
+def test_replayed_events_map_to_one_handling_each(bot, monkeypatch):
+    """녹화된 이벤트를 Bolt 앱으로 재생: 중복 수신(app_mention+message, 재전송)을 포함해 메시지당 한 번만 처리"""
+    monkeypatch.setattr(slack_dify_bot, "slack_thread_replies", True)
+    bot.conv_db.save_conversation("C001", "10.0", "conv-1")
+    routed, submitted = [], []
+    process_message = bot._process_message
+    def record_process(event, say):
+        routed.append(event["ts"])
+        process_message(event, say)
+    monkeypatch.setattr(bot, "_process_message", record_process)
+    # 답변 생성 대신 스레드 스케줄러에 등록된 메시지만 기록
+    monkeypatch.setattr(bot.thread_scheduler, "submit", lambda key, item: submitted.append(item[0]["ts"]) or 0)
+
+    dm = _message(channel="D001", channel_type="im", ts="20.0", client_msg_id="m-20")
+    recorded = [
+        _mention(),
+        _mention(type="message"),
+        dm,
+        dict(dm),                               # X-Slack-Retry-Num 재전송
+        _message(channel="D001", channel_type="im", ts="21.0", subtype="message_changed", user=None),
+        _message(channel="D001", channel_type="im", ts="22.0", bot_id="B000", user=BOT),
+        _message(ts="30.0"),
+        _message(ts="31.0", thread_ts="10.0", client_msg_id="m-31"),
+    ]
+    for n, event in enumerate(recorded):
+        response = bot.bolt_app.dispatch(_signed_request(_envelope(event, n)))
+        assert response.status == 200
+
+    # Bolt는 ack 후 리스너를 별도 스레드에서 실행
+    assert wait_until(lambda: len(routed) == 4)
+    assert wait_until(lambda: len(submitted) == 3)
+    time.sleep(0.2)
+    assert Counter(routed) == {"10.0": 1, "20.0": 2, "31.0": 1}
+    assert Counter(submitted) == {"10.0": 1, "20.0": 1, "31.0": 1}
@@ -0,0 +1,59 @@
+import redis
+import fakeredis
+import pytest
+
+import db_handler
+from db_handler import ConversationDB
+from fallback_store import FallbackStore
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+@pytest.fixture
+def pool(server):
+    # 다른 테스트와 회로 차단기를 공유하지 않도록 서버마다 다른 host 사용
+    return redis.ConnectionPool(connection_class=fakeredis.FakeRedisConnection, server=server,
+                                host=f"fake-{id(server)}", db=0, decode_responses=True)
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = FallbackStore(str(tmp_path / "fallback.sqlite3"), reconcile_interval=3600)
+    monkeypatch.setattr(db_handler, "get_fallback_store", lambda: store)
+    return store
+
+def test_read_from_redis_survives_outage(server, pool, store):
+    # 다른 호스트(또는 배포 전)에서 저장한 대화
+    redis.Redis(connection_pool=pool).set("conv:C001:10.0", "conv-1", ex=60)
+    conv_db = ConversationDB(connection_pool=pool, local_cache=False, ttl=60)
+    assert conv_db.get_conversation("C001", "10.0") == "conv-1"
+
+    server.connected = False
+    assert conv_db.get_conversation("C001", "10.0") == "conv-1"
+
+def test_repeated_reads_mirror_once(pool, store, monkeypatch):
+    redis.Redis(connection_pool=pool).set("conv:C001:10.0", "conv-1", ex=60)
+    conv_db = ConversationDB(connection_pool=pool, local_cache=False, ttl=60)
+    writes = []
+    original_apply = store.apply
+    monkeypatch.setattr(store, "apply", lambda *args: writes.append(args) or original_apply(*args))
+
+    for _ in range(3):
+        assert conv_db.get_conversation("C001", "10.0") == "conv-1"
+    assert len(writes) == 1
+
+    # 값이 바뀌면 다시 복사
+    conv_db.save_conversation("C001", "10.0", "conv-2")
+    assert conv_db.get_conversation("C001", "10.0") == "conv-2"
+    assert store.get(conv_db.db, "conv:C001:10.0") == "conv-2"
+
+def test_write_without_fallback_is_counted(server, pool):
+    from prometheus_client import REGISTRY
+    def dropped():
+        return REGISTRY.get_sample_value("redis_dropped_writes_total", {"operation": "save_conversation"}) or 0
+
+    conv_db = ConversationDB(connection_pool=pool, local_cache=False, fallback=False)
+    before = dropped()
+    server.connected = False
+    conv_db.save_conversation("C001", "10.0", "conv-1")
+    assert dropped() == before + 1
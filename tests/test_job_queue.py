@@ -0,0 +1,84 @@
+import threading
+import time
+
+import pytest
+
+from job_queue import JobQueue, JobWorker
+from stubs import wait_until
+
+@pytest.fixture
+def queue(redis_pool):
+    return JobQueue(redis_pool, name="test:jobs", shards=1)
+
+def _job(thread_ts, text):
+    return {"channel": "C001", "thread_ts": thread_ts, "text": text}
+
+def _start(worker):
+    threading.Thread(target=worker.run, daemon=True).start()
+    return worker
+
+def test_threads_in_one_shard_run_concurrently(queue):
+    release = threading.Event()
+    started = []
+    def handler(job):
+        started.append(job["thread_ts"])
+        release.wait(5)
+
+    queue.ensure_groups()
+    for thread_ts in ("1.0", "2.0", "3.0"):
+        queue.enqueue(_job(thread_ts, "질문"))
+    worker = _start(JobWorker(queue, handler, concurrency=4, poll_interval=0.05))
+    try:
+        # 같은 샤드라도 서로 다른 스레드는 긴 답변을 기다리지 않음
+        assert wait_until(lambda: sorted(started) == ["1.0", "2.0", "3.0"])
+    finally:
+        release.set()
+        worker.stop()
+
+def test_same_thread_runs_in_order(queue):
+    done = []
+    def handler(job):
+        time.sleep(0.05)
+        done.append(job["text"])
+
+    queue.ensure_groups()
+    for text in ("1", "2", "3"):
+        queue.enqueue(_job("1.0", text))
+    worker = _start(JobWorker(queue, handler, concurrency=4, poll_interval=0.05))
+    try:
+        assert wait_until(lambda: len(done) == 3)
+        assert done == ["1", "2", "3"]
+        assert worker.stats()["processed"] == 3
+    finally:
+        worker.stop()
+
+def test_reclaimed_job_is_not_run_twice(queue):
+    release = threading.Event()
+    runs = []
+    def handler(job):
+        runs.append(job["text"])
+        release.wait(5)
+
+    queue.ensure_groups()
+    queue.enqueue(_job("1.0", "질문"))
+    first = _start(JobWorker(queue, handler, concurrency=2, poll_interval=0.05))
+    second = JobWorker(queue, handler, concurrency=2, poll_interval=0.05)
+    second.worker_id = "other-worker"
+    try:
+        assert wait_until(lambda: runs == ["질문"])
+        # 첫 워커의 임대가 끊긴 상황: 다른 워커가 미확인 작업을 다시 가져감
+        queue.redis_client.delete(queue.lease_key(0))
+        _start(second)
+        assert wait_until(lambda: second.stats()["reclaimed"] == 1)
+        time.sleep(0.3)
+        assert runs == ["질문"]
+
+        release.set()
+        assert wait_until(lambda: first.stats()["processed"] == 1 and second.stats()["waiting"] == 0)
+        time.sleep(0.3)
+        assert runs == ["질문"]
+        assert queue.backlog() == [0]
+    finally:
+        release.set()
+        first.stop()
+        second.stop()
@@ -0,0 +1,28 @@
+import time
+
+import db_handler
+from db_handler import ConversationDB
+from dify_process import DifyClient
+from utils import run_checks
+
+def test_pings_fail_fast_against_stuck_servers(stuck_server):
+    pool = db_handler.get_connection_pool("127.0.0.1", stuck_server, 1, None)
+    conv_db = ConversationDB(connection_pool=pool, local_cache=False, fallback=False)
+    dify_client = DifyClient(base_url=f"http://127.0.0.1:{stuck_server}")
+
+    started = time.monotonic()
+    assert conv_db.ping(timeout=0.3) is False
+    assert dify_client.ping(timeout=0.3) is False
+    # 공용 세션의 재시도(백오프 포함)를 거치지 않음
+    assert time.monotonic() - started < 1.5
+
+def test_ping_succeeds(redis_pool, dify_stub):
+    conv_db = ConversationDB(connection_pool=redis_pool, local_cache=False, fallback=False)
+    assert conv_db.ping()
+    assert DifyClient(base_url=dify_stub.url).ping()
+
+def test_run_checks_is_bounded_by_timeout():
+    started = time.monotonic()
+    checks = run_checks({"fast": lambda: True, "slow": lambda: time.sleep(2) or True, "error": lambda: 1 / 0}, timeout=0.3)
+    assert time.monotonic() - started < 1
+    assert checks == {"fast": True, "slow": False, "error": False}
@@ -0,0 +1,14 @@
+import time
+
+import db_handler
+from db_handler import ConversationDB
+
+def test_stuck_redis_falls_back_within_socket_timeout(stuck_server, monkeypatch):
+    monkeypatch.setattr(db_handler, "redis_socket_timeout", 0.3)
+    pool = db_handler.get_connection_pool("127.0.0.1", stuck_server, 0, None)
+    conv_db = ConversationDB(connection_pool=pool, local_cache=False, fallback=False)
+
+    started = time.monotonic()
+    assert conv_db.get_conversation("C001", "10.0") is None
+    assert time.monotonic() - started < 5
+    assert conv_db.breaker.failures == 1
@@ -0,0 +1,49 @@
+import os
+
+from semantic_cache import SemanticCache, key_terms
+
+SCOPE = SemanticCache.scope_of("exaone3.5", "You are a helpful assistant.")
+
+def _cache():
+    return SemanticCache(path="", maxsize=16, threshold=0.9)
+
+def test_key_terms():
+    assert key_terms("What is the on-call rotation for team A?") == {"call", "rotation", "team", "a"}
+    assert key_terms("1번 서버 재시작 방법") == {"1"}
+    assert key_terms("사내 위키에서 휴가 신청 방법") == frozenset()
+
+def test_near_duplicate_with_different_entity_is_a_miss():
+    cache = _cache()
+    cache.add(SCOPE, "what is the on-call rotation for team A", "team A: 월요일 교대", 10)
+    # 해싱 임베딩에서는 유사도가 임계값을 넘지만 대상이 다름
+    vector_a = cache.embed("what is the on-call rotation for team A")
+    vector_b = cache.embed("what is the on-call rotation for team B")
+    assert float(vector_a @ vector_b) >= cache.threshold
+
+    assert cache.lookup(SCOPE, "what is the on-call rotation for team B") is None
+    assert cache.stats()["misses"] == 1
+
+def test_rephrased_question_with_same_entity_is_a_hit():
+    cache = _cache()
+    cache.add(SCOPE, "what is the on-call rotation for team A", "team A: 월요일 교대", 10)
+    cache.add(SCOPE, "what is the on-call rotation for team B", "team B: 화요일 교대", 10)
+    answer, similarity = cache.lookup(SCOPE, "What is the on-call rotation for team B?")
+    assert answer == "team B: 화요일 교대"
+    assert similarity >= cache.threshold
+    assert cache.lookup(SemanticCache.scope_of("llama3.2-vision", ""), "what is the on-call rotation for team B") is None
+
+def test_processes_sharing_a_file_merge_on_save(tmp_path):
+    path = str(tmp_path / "semantic_cache.npz")
+    first = SemanticCache(path="", maxsize=16, threshold=0.9)
+    second = SemanticCache(path="", maxsize=16, threshold=0.9)
+    first.add(SCOPE, "what is the on-call rotation for team A", "team A: 월요일 교대", 10)
+    second.add(SCOPE, "what is the on-call rotation for team B", "team B: 화요일 교대", 10)
+    # 다른 워커가 먼저 저장한 항목을 덮어쓰지 않고 합쳐서 저장
+    first.save(path)
+    second.save(path)
+
+    restored = SemanticCache(path="", maxsize=16, threshold=0.9)
+    restored.load(path)
+    assert restored.stats()["size"] == 2
+    assert restored.lookup(SCOPE, "what is the on-call rotation for team A")[0] == "team A: 월요일 교대"
+    assert sorted(os.listdir(tmp_path)) == ["semantic_cache.npz", "semantic_cache.npz.lock"]
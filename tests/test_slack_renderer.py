@@ -0,0 +1,78 @@
+import threading
+
+import pytest
+
+import slack_dify_bot
+from slack_renderer import StreamRenderer
+from stubs import wait_until
+
+def _renderer(bot, max_chars=20):
+    head_ts = bot.slack.post_message("C001", "잠시만 기다려주세요...🤔", "10.0")['ts']
+    return StreamRenderer(bot.updater, "C001", "10.0", head_ts, max_chars=max_chars), head_ts
+
+def test_overflow_post_waits_for_retry_after(bot, slack_stub):
+    renderer, head_ts = _renderer(bot)
+    slack_stub.rate_limited["chat.postMessage"] = 1
+    renderer.append("a" * 15 + "\n" + "b" * 15)
+    renderer.finish()
+
+    assert slack_stub.count("chat.postMessage", 429) == 1
+    assert len(renderer.messages) == 2
+    texts = slack_stub.texts()
+    assert texts[head_ts] == "a" * 15 + "\n"
+    assert texts[renderer.messages[1]] == "b" * 15
+
+def test_failed_overflow_post_keeps_delivered_parts(bot, slack_stub):
+    renderer, head_ts = _renderer(bot)
+    renderer.append("a" * 15 + "\n" + "b" * 15)
+    renderer.update()
+    assert len(renderer.messages) == 2
+
+    slack_stub.errors["chat.postMessage"] = 1
+    renderer.append("\n" + "c" * 15)
+    with pytest.raises(Exception):
+        renderer.update()
+    renderer.fail("처리 중 오류가 발생했습니다.")
+
+    texts = slack_stub.texts()
+    # 이미 고정된 앞부분은 덮어쓰지 않고 마지막 메시지에 오류 표시
+    assert texts[head_ts] == "a" * 15 + "\n"
+    assert texts[renderer.messages[-1]].startswith("b" * 15)
+    assert texts[renderer.messages[-1]].endswith("\n처리 중 오류가 발생했습니다.")
+
+def test_conversation_error_is_written_to_tail(bot, slack_stub, dify_stub):
+    head_ts = bot.slack.post_message("C001", "잠시만 기다려주세요...🤔", "10.0")['ts']
+    dify_stub.script = [{"event": "message", "answer": "x" * 3400 + "\n"}, 0.3,
+                        {"event": "message", "answer": "y" * 3400 + "\n"}, 0.3,
+                        {"event": "message", "answer": "z" * 3400}, 0.3,
+                        {"event": "message_end"}]
+    # 두 번째 이어쓰기 메시지 전송부터 실패
+    original_post = bot.updater.post
+    posts = []
+    def post(*args, **kwargs):
+        posts.append(args)
+        if len(posts) > 1:
+            raise RuntimeError("post failed")
+        return original_post(*args, **kwargs)
+    bot.updater.post = post
+
+    bot._handle_conversation({"channel": "C001", "ts": "10.0", "user": "U001", "text": "질문"}, head_ts, "C001", "10.0")
+
+    texts = slack_stub.texts()
+    continuation_ts = [ts for ts in texts if ts != head_ts and float(ts) > float(head_ts)]
+    assert texts[head_ts].startswith("x" * 3400)
+    assert "오류" not in texts[head_ts]
+    assert texts[continuation_ts[-1]].endswith("처리 중 오류가 발생했습니다.")
+
+def test_first_token_is_shown_without_waiting_for_interval(bot, slack_stub, dify_stub, monkeypatch):
+    monkeypatch.setattr(slack_dify_bot, "slack_update_interval", 5)
+    head_ts = bot.slack.post_message("C001", "잠시만 기다려주세요...🤔", "10.0")['ts']
+    dify_stub.script = [{"event": "message", "answer": "안녕"}, 1.5, {"event": "message_end"}]
+    worker = threading.Thread(target=bot._handle_conversation,
+                              args=({"channel": "C001", "ts": "10.0", "user": "U001", "text": "질문"}, head_ts, "C001", "10.0"),
+                              daemon=True)
+    worker.start()
+
+    # 업데이트 간격(5초)이나 답변 완료를 기다리지 않고 첫 토큰 표시
+    assert wait_until(lambda: slack_stub.texts()[head_ts].startswith("안녕 ⏳"), timeout=1)
+    worker.join(5)
@@ -0,0 +1,87 @@
+import time
+import threading
+
+import slack_dify_bot
+from dify_process import DifyClient, abort_stream
+from sse_parser import iter_events
+from stubs import wait_until
+
+def _message(answer):
+    return {"event": "message", "answer": answer}
+
+def test_abort_stream_unblocks_reader(dify_stub):
+    """첫 이벤트 후 멈춘 스트림: 다른 스레드에서 끊으면 읽기 타임아웃(120초)을 기다리지 않고 끝남"""
+    dify_stub.script = [_message("안녕")]
+    dify_stub.hang = True
+    response = DifyClient(base_url=dify_stub.url).chat_messages_stream("질문", "U001", "")
+    events = iter_events(response)
+    assert next(events).answer == "안녕"
+
+    finished = threading.Event()
+    def read_rest():
+        try:
+            list(events)
+        except Exception:
+            pass
+        finished.set()
+    threading.Thread(target=read_rest, daemon=True).start()
+    time.sleep(0.2)
+    assert not finished.is_set()
+
+    started = time.monotonic()
+    assert abort_stream(response)
+    assert finished.wait(3)
+    assert time.monotonic() - started < 1
+    response.close()
+
+def _start_conversation(bot, slack_stub, channel_id="C001", thread_ts="10.0"):
+    tmp_ts = bot.slack.post_message(channel_id, "잠시만 기다려주세요...🤔", thread_ts)['ts']
+    event = {"channel": channel_id, "ts": thread_ts, "user": "U001", "text": "<@UBOT> 질문"}
+    worker = threading.Thread(target=bot._handle_conversation, args=(event, tmp_ts, channel_id, thread_ts), daemon=True)
+    worker.start()
+    return worker, tmp_ts, (channel_id, thread_ts)
+
+def test_cancel_stream_stops_dify_and_keeps_partial_answer(bot, slack_stub, dify_stub):
+    dify_stub.script = [_message("부분 답변")]
+    dify_stub.hang = True
+    worker, tmp_ts, key = _start_conversation(bot, slack_stub)
+    assert wait_until(lambda: key in bot.streams and bot.streams[key]["first_token_at"] is not None)
+
+    # 호출한 스레드(감시/리스너)는 바로 돌아옴
+    started = time.monotonic()
+    assert bot._cancel_stream(key, "요청에 따라 답변을 중단했습니다.")
+    assert time.monotonic() - started < 0.2
+
+    worker.join(3)
+    assert not worker.is_alive()
+    # 중지 요청은 별도 스레드에서 전송
+    assert wait_until(lambda: dify_stub.stopped == [dify_stub.task_id])
+    text = slack_stub.texts()[tmp_ts]
+    assert "부분 답변" in text and "요청에 따라 답변을 중단했습니다." in text
+
+def test_watchdog_cancels_idle_stream(bot, slack_stub, dify_stub, monkeypatch):
+    monkeypatch.setattr(slack_dify_bot, "dify_idle_timeout", 0.5)
+    dify_stub.script = [_message("부분 답변")]
+    dify_stub.hang = True
+    worker, tmp_ts, key = _start_conversation(bot, slack_stub)
+
+    # 유휴 제한(0.5초) + 감시 주기(0.5초) 안에 중단
+    worker.join(3)
+    assert not worker.is_alive()
+    # 중지 요청은 별도 스레드에서 전송
+    assert wait_until(lambda: dify_stub.stopped == [dify_stub.task_id])
+    assert "0초 동안 멈춰 답변을 중단했습니다" in slack_stub.texts()[tmp_ts]
+
+def test_cancel_request_from_stale_snapshot_keeps_newer_stream(bot, slack_stub, dify_stub):
+    """감시 스레드가 복사한 스트림이 그 사이 끝나고 같은 스레드에서 새 스트림이 시작되면 새 스트림은 취소하지 않음"""
+    dify_stub.script = [_message("부분 답변")]
+    dify_stub.hang = True
+    worker, tmp_ts, key = _start_conversation(bot, slack_stub)
+    assert wait_until(lambda: key in bot.streams)
+    stale = dict(bot.streams[key])
+
+    assert not bot._cancel_stream(key, "요청에 따라 답변을 중단했습니다.", stale)
+    assert not bot.streams[key]["cancelled"]
+    assert bot._cancel_stream(key, "요청에 따라 답변을 중단했습니다.", bot.streams[key])
+    worker.join(3)
+    assert not worker.is_alive()
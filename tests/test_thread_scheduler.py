@@ -0,0 +1,58 @@
+import threading
+
+import pytest
+from prometheus_client import REGISTRY
+
+from thread_scheduler import ThreadScheduler
+from worker_pool import BoundedWorkerPool, QueueFullError
+from stubs import wait_until
+
+def _scheduler(max_follow_ups=2):
+    release = threading.Event()
+    batches = []
+    def handler(key, items):
+        batches.append(list(items))
+        release.wait(5)
+    scheduler = ThreadScheduler(BoundedWorkerPool(max_workers=1, max_queue=1), handler,
+                                window=0, max_follow_ups=max_follow_ups)
+    return scheduler, release, batches
+
+def _sample(name):
+    return REGISTRY.get_sample_value(name) or 0
+
+def test_follow_ups_are_capped_per_thread():
+    scheduler, release, batches = _scheduler(max_follow_ups=2)
+    key = ("C001", "10.0")
+    before = {name: _sample(name) for name in ("thread_scheduler_active_threads", "thread_scheduler_follow_ups",
+                                               "thread_scheduler_rejected_total")}
+    assert scheduler.submit(key, "m1") == 0
+    assert scheduler.submit(key, "m2") is None
+    assert scheduler.submit(key, "m3") is None
+    with pytest.raises(QueueFullError):
+        scheduler.submit(key, "m4")
+    assert scheduler.stats()["rejected"] == 1
+    assert scheduler.stats()["pending_follow_ups"] == 2
+    assert _sample("thread_scheduler_active_threads") - before["thread_scheduler_active_threads"] == 1
+    assert _sample("thread_scheduler_follow_ups") - before["thread_scheduler_follow_ups"] == 2
+    assert _sample("thread_scheduler_rejected_total") - before["thread_scheduler_rejected_total"] == 1
+
+    release.set()
+    assert wait_until(lambda: scheduler.stats()["active_threads"] == 0)
+    assert batches == [["m1"], ["m2", "m3"]]
+    assert _sample("thread_scheduler_active_threads") == before["thread_scheduler_active_threads"]
+    assert _sample("thread_scheduler_follow_ups") == before["thread_scheduler_follow_ups"]
+
+def test_busy_thread_rejection_sends_busy_notice(bot, slack_stub):
+    """후속 메시지가 가득 찬 스레드에 온 메시지는 임시 메시지에 안내 문구 표시"""
+    release = threading.Event()
+    bot.thread_scheduler.handler = lambda key, items: release.wait(5)
+    bot.thread_scheduler.max_follow_ups = 1
+    try:
+        say = lambda text, thread_ts: bot.slack.post_message("C001", text, thread_ts)
+        for ts in ("10.0", "11.0", "12.0"):
+            bot._process_message({"type": "app_mention", "user": "U001", "text": "질문", "channel": "C001",
+                                  "ts": ts, "thread_ts": "10.0"}, say)
+        rejected_ts = slack_stub.successful_posts()[-1]
+        assert wait_until(lambda: "요청이 많아 처리할 수 없습니다" in slack_stub.texts()[rejected_ts])
+    finally:
+        release.set()
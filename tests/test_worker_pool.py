@@ -0,0 +1,29 @@
+import threading
+
+import pytest
+from prometheus_client import REGISTRY
+
+from worker_pool import BoundedWorkerPool, QueueFullError
+from stubs import wait_until
+
+def _sample(name, pool):
+    return REGISTRY.get_sample_value(name, {"pool": pool}) or 0
+
+def test_saturation_metrics_follow_submit_and_run():
+    pool = BoundedWorkerPool(max_workers=1, max_queue=1, name="metrics-test")
+    release = threading.Event()
+    assert pool.submit(release.wait, 5) == 0
+    assert pool.submit(release.wait, 5) == 1
+    with pytest.raises(QueueFullError):
+        pool.submit(release.wait, 5)
+
+    assert wait_until(lambda: _sample("worker_pool_running", "metrics-test") == 1)
+    assert _sample("worker_pool_queued", "metrics-test") == 1
+    assert _sample("worker_pool_rejected_total", "metrics-test") == 1
+
+    release.set()
+    assert wait_until(lambda: pool.stats()["completed"] == 2)
+    assert _sample("worker_pool_running", "metrics-test") == 0
+    assert _sample("worker_pool_queued", "metrics-test") == 0
+    assert _sample("worker_pool_wait_seconds_count", "metrics-test") == 2
+    pool.shutdown()
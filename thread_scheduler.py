@@ -0,0 +1,89 @@
+import time
+import threading
+from config import *
+from utils import debug_print
+from worker_pool import QueueFullError
+from metrics import THREAD_SCHEDULER_ACTIVE, THREAD_SCHEDULER_FOLLOW_UPS, THREAD_SCHEDULER_REJECTED_TOTAL
+
+class ThreadScheduler:
+    """Slack 스레드(channel, thread_ts)별 직렬 실행기.
+    한 스레드에서는 요청을 하나씩만 실행하고, 실행 중에 도착한 메시지는 마지막 메시지 이후 window초 동안 모아
+    하나의 후속 요청으로 합칩니다. 같은 conversation_id로 여러 스트림이 동시에 실행되지 않습니다."""
+
+    def __init__(self, worker_pool, handler, window=thread_coalesce_window, on_busy=None,
+                 max_follow_ups=thread_max_follow_ups):
+        self.worker_pool = worker_pool
+        self.handler = handler      # handler(key, items): items는 한 번에 처리할 요청 목록 (도착 순)
+        self.window = window
+        self.max_follow_ups = max_follow_ups
+        self.on_busy = on_busy      # 실행 중인 스레드에 새 요청이 오면 호출 (이전 요청 취소 등)
+
+        self.lock = threading.Lock()
+        self.active = set()
+        self.pending = {}           # key -> [item, ...]
+        self.last_arrival = {}      # key -> 마지막 후속 요청 도착 시각
+
+        self.coalesced = 0
+        self.batches = 0
+        self.rejected = 0
+
+    def submit(self, key, item):
+        """스레드가 비어 있으면 작업 풀에 등록하고 대기 순번을 반환합니다.
+        실행 중이면 후속 요청으로 모으고 None을 반환합니다.
+        작업 풀이 가득 찼거나 스레드에 모인 후속 요청이 max_follow_ups개면 QueueFullError"""
+        with self.lock:
+            if key not in self.active:
+                position = self.worker_pool.submit(self._run, key, [item])
+                self.active.add(key)
+                THREAD_SCHEDULER_ACTIVE.inc()
+                return position
+            items = self.pending.setdefault(key, [])
+            if len(items) >= self.max_follow_ups:
+                self.rejected += 1
+                THREAD_SCHEDULER_REJECTED_TOTAL.inc()
+                raise QueueFullError(f"thread follow-ups full ({len(items)}/{self.max_follow_ups})")
+            items.append(item)
+            THREAD_SCHEDULER_FOLLOW_UPS.inc()
+            self.last_arrival[key] = time.monotonic()
+            self.coalesced += 1
+        debug_print(f"Coalescing follow-up for busy thread: {key}")
+        if self.on_busy is not None:
+            self.on_busy(key)
+        return None
+
+    def stats(self):
+        with self.lock:
+            return {
+                "active_threads": len(self.active),
+                "pending_follow_ups": sum(len(items) for items in self.pending.values()),
+                "coalesced": self.coalesced,
+                "batches": self.batches,
+                "rejected": self.rejected,
+            }
+
+    def _run(self, key, items):
+        while items:
+            try:
+                self.handler(key, items)
+            except Exception as e:
+                debug_print(f"Error in thread handler {key}: {e}")
+            items = self._next_batch(key)
+
+    def _next_batch(self, key):
+        """모인 후속 요청을 반환. 없으면 스레드를 비우고 None"""
+        while True:
+            with self.lock:
+                items = self.pending.get(key)
+                if not items:
+                    self.pending.pop(key, None)
+                    self.last_arrival.pop(key, None)
+                    self.active.discard(key)
+                    THREAD_SCHEDULER_ACTIVE.dec()
+                    return None
+                wait = self.last_arrival[key] + self.window - time.monotonic()
+                if wait <= 0:
+                    del self.last_arrival[key]
+                    self.batches += 1
+                    THREAD_SCHEDULER_FOLLOW_UPS.dec(len(items))
+                    return self.pending.pop(key)
+            time.sleep(wait)
@@ -1,3 +1,6 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from collections import deque
 from config import *
 
 def debug_print(*args, **kwargs):
@@ -8,4 +11,35 @@ def get_headers(token):
         "Authorization": f"Bearer {token}",
         "Content-Type": "application/json",
     }
-    return headers
\ No newline at end of file
+    return headers
+
+def run_checks(checks, timeout=health_check_timeout):
+    """{이름: 함수}를 동시에 실행해 timeout초 안에 끝난 결과만 사용 (늦거나 예외가 나면 False)"""
+    executor = ThreadPoolExecutor(max_workers=len(checks), thread_name_prefix="readiness")
+    futures = {name: executor.submit(check) for name, check in checks.items()}
+    wait(futures.values(), timeout=timeout)
+    # 늦은 점검은 기다리지 않음 (각 점검도 자체 timeout이 있으므로 곧 끝남)
+    executor.shutdown(wait=False)
+    return {name: bool(future.done() and not future.exception() and future.result())
+            for name, future in futures.items()}
+
+class LatencyTracker:
+    """최근 window개 측정값의 백분위수 (스레드 안전)"""
+    def __init__(self, window=1000):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.lock = threading.Lock()
+    
+    def record(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+            self.count += 1
+    
+    def percentiles(self, *points):
+        """{"p50": 초, ...} 형식. 측정값이 없으면 빈 dict"""
+        with self.lock:
+            samples = sorted(self.samples)
+        if not samples:
+            return {}
+        points = points or (50, 90, 99)
+        return {f"p{p}": samples[min(len(samples) - 1, int(len(samples) * p / 100))] for p in points}
@@ -0,0 +1,79 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils import debug_print
+from metrics import WORKER_POOL_RUNNING, WORKER_POOL_QUEUED, WORKER_POOL_REJECTED_TOTAL, WORKER_POOL_WAIT_SECONDS
+
+class QueueFullError(Exception):
+    """작업 대기열이 가득 찬 경우"""
+    pass
+
+class BoundedWorkerPool:
+    """최대 동시 실행 수와 대기열 크기가 제한된 대화 처리용 작업 풀"""
+    def __init__(self, max_workers=16, max_queue=64, name="conversation"):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self.lock = threading.Lock()
+        # 포화 지표 (/metrics): 실행 중/대기 중 작업 수, 거절 수, 대기 시간
+        self.running_gauge = WORKER_POOL_RUNNING.labels(name)
+        self.queued_gauge = WORKER_POOL_QUEUED.labels(name)
+        self.rejected_counter = WORKER_POOL_REJECTED_TOTAL.labels(name)
+        self.wait_histogram = WORKER_POOL_WAIT_SECONDS.labels(name)
+
+        self.running = 0
+        self.queued = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def submit(self, fn, *args, **kwargs):
+        """작업 등록 후 대기 순번을 반환 (0이면 즉시 실행). 대기열이 가득 차면 QueueFullError"""
+        with self.lock:
+            if self.running + self.queued >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                self.rejected_counter.inc()
+                raise QueueFullError(f"queue full ({self.queued}/{self.max_queue})")
+            position = max(0, self.running + self.queued + 1 - self.max_workers)
+            self.queued += 1
+            self.queued_gauge.inc()
+
+        self.executor.submit(self._run, time.monotonic(), fn, args, kwargs)
+        return position
+
+    def _run(self, enqueued_at, fn, args, kwargs):
+        wait = time.monotonic() - enqueued_at
+        with self.lock:
+            self.queued -= 1
+            self.running += 1
+            self.queued_gauge.dec()
+            self.running_gauge.inc()
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        self.wait_histogram.observe(wait)
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            debug_print(f"Error in worker task: {e}")
+        finally:
+            with self.lock:
+                self.running -= 1
+                self.completed += 1
+                self.running_gauge.dec()
+
+    def stats(self):
+        """대기열 깊이 및 대기 시간 통계"""
+        with self.lock:
+            started = self.completed + self.running
+            return {
+                "running": self.running,
+                "queue_depth": self.queued,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_wait": self.total_wait / started if started else 0.0,
+                "max_wait": self.max_wait,
+            }
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
@@ -0,0 +1,36 @@
+"""
+운영용 WSGI 진입점 (gunicorn, 워커 프로세스 여러 개)
+
+    gunicorn -c gunicorn.conf.py 'wsgi:create_app()'
+
+SlackBotServer(Redis 풀, Bolt 앱, 작업 풀 스레드)는 fork 이후 각 워커에서 생성합니다.
+"""
+import os
+from config import *
+from utils import debug_print, logger
+
+_server = None
+
+def create_app():
+    """워커 프로세스의 Flask 앱 (프로세스당 SlackBotServer 하나)"""
+    global _server
+    if _server is None:
+        from slack_dify_bot import SlackBotServer
+        _server = SlackBotServer()
+        debug_print(f"SlackBotServer created in worker {os.getpid()}")
+    return _server.app
+
+def reset_after_fork():
+    """부모 프로세스에서 만들어진 소켓/스레드를 자식이 물려받지 않도록 초기화 (gunicorn post_fork)"""
+    from db_handler import reset_connection_pools
+    from dify_process import reset_session
+    from cache import reset_cache_invalidators
+    reset_connection_pools()
+    reset_cache_invalidators()
+    reset_session()
+    logger.reset_after_fork()
+
+def shutdown(timeout=shutdown_drain_timeout):
+    """진행 중인 Dify 스트림을 마친 뒤 종료 (gunicorn worker_exit)"""
+    if _server is not None:
+        _server.shutdown(timeout)